@@ -19,8 +19,12 @@ from ecodata.raster_utils import (
 )
 from ecodata.functions import (
     bbox2poly,  # noqa
+    cache_track_data,  # noqa
+    cache_vector_data,  # noqa
     clip_tracks_timerange,  # noqa
+    clip_tracks_windows,  # noqa
     combine_studies,  # noqa
+    distance_to_features,  # noqa
     get_crs,  # noqa
     get_extent,  # noqa
     get_file_info,  # noqa
@@ -32,9 +36,31 @@ from ecodata.functions import (
     plot_subset_interactive,  # noqa
     read_ref_data,  # noqa
     read_track_data,  # noqa
+    simplify_tracks,  # noqa
+    sort_tracks_by_time,  # noqa
     subset_data,  # noqa
+    subset_regions,  # noqa
+    track_detail,  # noqa
+)
+from ecodata.movement import (
+    clean_tracks,  # noqa
+    detect_encounters,  # noqa
+    feature_crossings,  # noqa
+    fit_step_distributions,  # noqa
+    home_ranges,  # noqa
+    interpolate_tracks,  # noqa
+    movement_metrics,  # noqa
+    random_steps,  # noqa
+    thin_tracks,  # noqa
+)
+from ecodata.spatial_index import (
+    PointIndex,  # noqa
+    track_index,  # noqa
 )
 from ecodata.xr_tools import (
+    annotate_random_steps,  # noqa
+    annotate_steps,  # noqa
+    annotate_tracks,  # noqa
     coarsen_dataset,  # noqa
     detect_varnames,  # noqa
     get_time_res,  # noqa
@@ -45,4 +71,5 @@ from ecodata.xr_tools import (
     select_time_cond,  # noqa
     select_time_range,  # noqa
     thin_dataset,  # noqa
+    track_occupancy,  # noqa
 )
@@ -13,6 +13,9 @@ from ecodata.app.config import DEFAULT_TEMPLATE
 
 # from panel_jstree.widgets.jstree import FileTree
 
+# Maximum number of track points sent to the browser when the tracks aren't datashaded
+MAX_PLOT_POINTS = 100_000
+
 
 class TracksExplorer(param.Parameterized):
     load_tracks_button = param_widget(pn.widgets.Button(button_type="primary", name="Load data"))
@@ -136,7 +139,11 @@ class TracksExplorer(param.Parameterized):
             val = self.tracksfile.value  # or self.filetree.value[0]
             # val = self.file_selector.value[0]
             self.tracksfile.expanded = False
-            tracks = eco.read_track_data(val)
+            tracks = eco.read_track_data(
+                val, columns=["individual_local_identifier", "timestamp", "location_long", "location_lat"], cache=True
+            )
+            # Levels of detail for simplifying the tracks when they aren't datashaded, computed once per file
+            tracks = eco.track_detail(tracks)
             self.status_text = "Track file loaded"
             self.tracks_extent = eco.get_tracks_extent(
                 tracks, boundary_shape=self.tracks_boundary_shape.value, buffer=self.tracks_buffer.value
@@ -207,6 +214,7 @@ class TracksExplorer(param.Parameterized):
                 c="r",
                 marker="circle",
                 alpha=0.3,
+                max_points=None if self.ds_checkbox.value else MAX_PLOT_POINTS,
             ).opts(
                 responsive=True,
             )
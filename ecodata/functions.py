@@ -2,8 +2,15 @@
 See the notebooks in the examples section for demos of how these are used."""
 from __future__ import annotations
 
+import functools
+import glob
+import hashlib
+import json
+import os
 import re
+import shutil
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import cartopy.crs as ccrs
@@ -11,11 +18,19 @@ import fiona
 import geopandas as gpd
 import geoviews as gv
 import matplotlib.pyplot as plt
+import numba
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset
+import pyarrow.parquet as pq
 import rioxarray  # noqa
+import shapely
 import xarray as xr
-from shapely.geometry import Polygon
+from pandas.api.types import union_categoricals
+from pyproj import Transformer
+from shapely.geometry import MultiPoint, Polygon
+from shapely.geometry.polygon import orient
 
 warnings.filterwarnings("ignore", message="Geometry is in a geographic CRS")
 
@@ -26,6 +41,38 @@ fiona.drvsupport.supported_drivers["LIBKML"] = "rw"
 
 TRACK_CRS = "EPSG:4326"
 
+# Mean Earth radius (m), used for great-circle distances
+EARTH_RADIUS = 6_371_008.8
+
+# Timestamp format used in Movebank exports
+MOVEBANK_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Movebank identifier columns with few unique values, which are stored as categoricals in compact track data
+TRACK_CATEGORICAL_COLUMNS = [
+    "individual_local_identifier",
+    "tag_local_identifier",
+    "study_name",
+    "individual_taxon_canonical_name",
+    "sensor_type",
+]
+
+# Number of csv rows read at a time when track data are filtered while reading
+_FILTER_CHUNKSIZE = 1_000_000
+
+# Row group size for cached track data. Smaller row groups allow more of the data to be skipped by filters.
+_TRACK_ROW_GROUP_SIZE = 100_000
+
+# Directory for cached conversions of input files. Can be changed with the ECODATA_CACHE_DIR environment variable.
+CACHE_DIR = Path(os.environ.get("ECODATA_CACHE_DIR", Path.home() / ".cache" / "ecodata"))
+
+# Minimum size (bytes) of vector datasets that are read from a cached GeoParquet conversion by subset_data and
+# subset_regions. Set to None to always read vector datasets directly.
+VECTOR_CACHE_MIN_SIZE = 10_000_000
+
+# Row group size for cached vector data, and the columns with the bounding box of each feature
+_VECTOR_ROW_GROUP_SIZE = 10_000
+_VECTOR_BBOX_COLUMNS = ["bbox_xmin", "bbox_ymin", "bbox_xmax", "bbox_ymax"]
+
 
 def subset_data(
     filename,
@@ -65,6 +112,10 @@ def subset_data(
     The newly subsetted shapefile is returned as a GeoDataFrame, and is optionally
     written out to a new shapefile.
 
+    Datasets of at least ``VECTOR_CACHE_MIN_SIZE`` bytes are converted once to a cached, spatially indexed GeoParquet
+    file (see ``cache_vector_data``), so that repeated subsets of the same dataset only read the features near the
+    boundary.
+
     Parameters
     ----------
     filename : str
@@ -120,16 +171,16 @@ def subset_data(
 
     # Subset for bbox case
     if bbox is not None:
-        gdf = gpd.read_file(filename, bbox=bbox)
+        gdf = _read_vector_data(filename, bbox=bbox)
         boundary = bbox2poly(bbox)
 
     # Subset for track_points and bounding_geom case
     else:
 
-        # Get feature geometry for track_points case
+        # Get boundary for track_points case, directly from the coordinates of the points
         if track_points is not None:
             gdf_track = read_track_data(track_points, dissolve=False)
-            feature_geom = gdf_track.dissolve()  # Dissolve points to a single geometry
+            boundary = get_tracks_extent(gdf_track.geometry.to_crs(dataset_crs), boundary_shape=boundary_type).geometry
 
         # Get feature geometry for bounding_geom case
         elif bounding_geom is not None:
@@ -137,13 +188,13 @@ def subset_data(
             gdf_features = gpd.read_file(bounding_geom)
             feature_geom = gdf_features.dissolve()  # Dissolve features to one geometry
 
-        # Get boundary for envelope, convex hull, or mask
-        if boundary_type == "rectangular":
-            boundary = feature_geom.geometry.to_crs(dataset_crs).envelope
-        elif boundary_type == "convex_hull":
-            boundary = feature_geom.geometry.to_crs(dataset_crs).convex_hull
-        elif boundary_type == "mask":
-            boundary = feature_geom.to_crs(dataset_crs)
+            # Get boundary for envelope, convex hull, or mask
+            if boundary_type == "rectangular":
+                boundary = feature_geom.geometry.to_crs(dataset_crs).envelope
+            elif boundary_type == "convex_hull":
+                boundary = feature_geom.geometry.to_crs(dataset_crs).convex_hull
+            elif boundary_type == "mask":
+                boundary = feature_geom.to_crs(dataset_crs)
 
         # Adjust boundary with the buffer
         if buffer != 0:
@@ -153,26 +204,16 @@ def subset_data(
 
         # Read and subset
         if boundary_type == "rectangular":
-            gdf = gpd.read_file(filename, bbox=boundary)
+            gdf = _read_vector_data(filename, bbox=boundary)
         elif boundary_type == "convex_hull" or boundary_type == "mask":
-            gdf = gpd.read_file(filename, mask=boundary)
+            gdf = _read_vector_data(filename, mask=boundary)
 
     if clip:
         gdf = gdf.clip(boundary.to_crs(gdf.crs))
 
     # Write new data to file if output path was specified
     if outfile is not None:
-        outfile = Path(outfile)
-        if outfile.suffix == ".shp":
-            outdir = outfile.parent / outfile.stem
-            outdir.mkdir(exist_ok=True)
-
-            # Drop any datetime columns since this isn't supported in shapefiles
-            gdf = gdf.select_dtypes(exclude=["datetime64[ns]"])
-
-            gdf.to_file(outdir / outfile.name)
-        else:
-            gdf.to_file(outfile)
+        gdf = _write_subset(gdf, outfile)
     output = dict(subset=gdf, boundary=boundary)
     if track_points:
         output["track_points"] = gdf_track
@@ -181,23 +222,485 @@ def subset_data(
     return output
 
 
-def get_tracks_extent(tracks, boundary_shape="rectangular", buffer=0):
-    # get boundary
-    if boundary_shape == "rectangular":
-        boundary = tracks.dissolve().envelope
-    if boundary_shape == "convex_hull":
-        boundary = tracks.dissolve().convex_hull
+def subset_regions(
+    filename,
+    regions,
+    boundary_type="rectangular",
+    buffer=0,
+    clip=False,
+    names=None,
+    outdir=None,
+    extension=".shp",
+):
+    """
+    Subsets a spatial dataset to many areas of interest at once.
+
+    This is the batch version of ``subset_data``: the dataset is read only once (within the bounds of all of the
+    regions), and its features are assigned to the regions with a spatial join, instead of reading the dataset again
+    for every region. A feature that intersects several regions is included in the subset of each of them.
+
+    The regions can be given as:
+        - **Boundaries**: A GeoDataFrame (or the path of a file) with one boundary per row, e.g. the polygons of study
+          areas.
+        - **Animal track data**: A list of csv files of Movebank animal track data, with one region encompassing the
+          track points of each file.
+
+    Parameters
+    ----------
+    filename : str
+        Path to data file to subset
+    regions : geopandas.GeoDataFrame, str or list of str
+        Boundaries of the regions, as a GeoDataFrame or the path of a file with one boundary per feature, or a list of
+        paths to csv files with animal track points
+    boundary_type : str, optional
+        Specifies whether the bounding shape of each region should be rectangular (``boundary_type='rectangular'``),
+        a convex hull (``boundary_type='convex_hull'``), or the exact boundary geometry (``boundary_type='mask'``).
+        ``boundary_type='mask'`` can only be used with boundaries. By default 'rectangular'.
+    buffer : float, optional
+        Buffer size around each region, relative to the extent of the region. By default 0.
+    clip : bool, optional
+        Whether or not to clip the subsets to the boundaries of their regions. By default False.
+    names : str, optional
+        Column of the boundaries with the names of the regions. By default, the regions are named by the index of the
+        boundaries, or by the names of the track files (without extension).
+    outdir : str, optional
+        Directory to write the subsets to, as ``<outdir>/<name><extension>``, if specified. Shapefiles are written as
+        with ``subset_data``. If no directory is specified, the subsets won't be written out to files.
+    extension : str, optional
+        File extension of the subsets written to ``outdir``, which sets their format, by default ".shp"
+
+    Returns
+    -------
+    dict
+        Dictionary of GeoDataFrames with the subsetted data, keyed by region name
+    geopandas GeoDataFrame
+        GeoDataFrame with the bounding geometry of each region, with a ``region`` column with the region names
+
+    Raises
+    ------
+    TypeError
+        Raised if ``boundary_type='mask'`` is used with track files
+    ValueError
+        Raised if the regions don't have unique names, or if ``outdir`` is specified and their names aren't file names
+        (e.g. contain a path separator)
+    """
+    if boundary_type not in ("rectangular", "convex_hull", "mask"):
+        raise ValueError(
+            f"subset_regions: boundary_type must be 'rectangular', 'convex_hull' or 'mask', not {boundary_type!r}"
+        )
+    dataset_crs = get_crs(filename)
+
+    # Get the boundary of each region
+    if isinstance(regions, (gpd.GeoDataFrame, gpd.GeoSeries, str, Path)):
+        if isinstance(regions, (str, Path)):
+            regions = gpd.read_file(regions)
+        labels = regions[names] if names is not None else regions.index
+        boundary = regions.geometry.to_crs(dataset_crs)
+        if boundary_type == "rectangular":
+            boundary = boundary.envelope
+        elif boundary_type == "convex_hull":
+            boundary = boundary.convex_hull
+    else:
+        if boundary_type == "mask":
+            raise TypeError("subset_regions: boundary_type mask can only be used with boundaries, not track files")
+        labels = [Path(track_file).name.split(".")[0] for track_file in regions]
+        boundary = pd.concat(
+            [
+                get_tracks_extent(
+                    read_track_data(track_file).geometry.to_crs(dataset_crs), boundary_shape=boundary_type
+                ).geometry
+                for track_file in regions
+            ],
+            ignore_index=True,
+        )
+    labels = pd.Index(labels).astype(str)
+    if labels.has_duplicates:
+        raise ValueError(
+            f"subset_regions: region names must be unique, but {sorted(set(labels[labels.duplicated()]))} are repeated"
+        )
+    if outdir is not None:
+        # The subsets are written to <outdir>/<name><extension>, so the names must not point outside of outdir
+        unsafe = [label for label in labels if label in ("", ".", "..") or "/" in label or "\\" in label]
+        if unsafe:
+            raise ValueError(
+                f"subset_regions: region names must be file names to write the subsets to outdir, but {unsafe} aren't"
+            )
+        outdir = Path(outdir)
+        outdir.mkdir(parents=True, exist_ok=True)
+    boundary = gpd.GeoDataFrame({"region": labels}, geometry=boundary.to_numpy(), crs=dataset_crs)
+
+    # Adjust each boundary with the buffer, relative to its own extent
+    if buffer != 0:
+        bounds = boundary.bounds
+        buffer_scale = np.maximum((bounds.maxx - bounds.minx).abs(), (bounds.maxy - bounds.miny).abs())
+        boundary.geometry = boundary.buffer(buffer * buffer_scale.to_numpy())
+
+    # Read the data within the regions once, and assign the features to the regions they intersect
+    gdf = _read_vector_data(filename, mask=boundary.unary_union)
+    features, region_ids = boundary.sindex.query(gdf.geometry, predicate="intersects")
+    order = np.lexsort((features, region_ids))
+    features, region_ids = features[order], region_ids[order]
+    splits = np.searchsorted(region_ids, np.arange(1, len(boundary)))
+
+    subsets = {}
+    for i, (label, rows) in enumerate(zip(labels, np.split(features, splits))):
+        subset = gdf.iloc[rows].reset_index(drop=True)
+        if clip:
+            subset = subset.clip(boundary.geometry.iloc[[i]])
+        if outdir is not None:
+            subset = _write_subset(subset, outdir / f"{label}{extension}")
+        subsets[label] = subset
+    return subsets, boundary
+
+
+def _write_subset(gdf, outfile):
+    """
+    Write a subset of a dataset to a file, and return the data as written. Shapefiles are written to a directory of
+    the same name, without datetime columns (which shapefiles don't support).
+    """
+    outfile = Path(outfile)
+    if outfile.suffix == ".shp":
+        outdir = outfile.parent / outfile.stem
+        outdir.mkdir(exist_ok=True)
+
+        # Drop any datetime columns since this isn't supported in shapefiles
+        gdf = gdf.select_dtypes(exclude=["datetime64[ns]"])
+
+        gdf.to_file(outdir / outfile.name)
+    else:
+        gdf.to_file(outfile)
+    return gdf
+
+
+def get_tracks_extent(tracks, boundary_shape="rectangular", buffer=0, by=None):
+    """
+    Get the extent of a set of track points.
+
+    The extent is computed directly from the point coordinates: the rectangular extent from the bounds of the points,
+    and the convex hull from the points that can be on the hull, after discarding the points in grid cells that are
+    inside a first approximation of the hull. The result is the same as for the envelope or convex hull of the
+    dissolved points, without building a geometry of all of the points.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame, geopandas.GeoSeries, dask_geopandas.GeoDataFrame, or iterable of GeoDataFrames
+        Track points, e.g. from ``read_track_data``. An iterable of chunks (as returned by ``read_track_data`` with
+        ``chunksize``) can also be given, in which case the extent is built up one chunk at a time. For a dask-geopandas
+        GeoDataFrame, the extents of the partitions are computed in parallel and then combined.
+    boundary_shape : str, optional
+        Shape of the extent, either ``'rectangular'`` or ``'convex_hull'``. By default 'rectangular'.
+    buffer : float, optional
+        Buffer size around the extent, relative to the size of the extent. By default 0.
+    by : str or list of str, optional
+        Column(s) to group the track points by, to get a separate extent for each group (e.g.
+        ``'individual_local_identifier'``, or ``['individual_local_identifier', 'deployment_id']``). ``'year'`` can be
+        used to group by the year of the ``timestamp`` column. The extents of all groups are computed in one pass, and
+        buffers are relative to the size of each group's extent. By default None, which gives a single extent for all
+        of the track points.
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        GeoDataFrame with the extent of the track points. If ``by`` is specified, there is one row per group, with the
+        values of the grouping columns.
+    """
+    if boundary_shape not in ("rectangular", "convex_hull"):
+        raise ValueError(
+            f"get_tracks_extent: boundary_shape must be 'rectangular' or 'convex_hull', not {boundary_shape!r}"
+        )
+    if by is not None:
+        by = [by] if isinstance(by, str) else list(by)
+
+    if _is_dask_frame(tracks):
+        import dask
+
+        partition_vertices = [
+            dask.delayed(_extent_vertices)(partition, boundary_shape, by) for partition in tracks.to_delayed()
+        ]
+        tracks = dask.compute(*partition_vertices)
+    if not isinstance(tracks, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        # Reduce each chunk to the vertices of its own extent(s), so that only one chunk is held in memory at a time
+        chunk_vertices = [_extent_vertices(chunk, boundary_shape, by) for chunk in tracks]
+        if not chunk_vertices:
+            raise ValueError("get_tracks_extent: no track points were given.")
+        tracks = _concat_tracks(chunk_vertices)
+
+    if by is not None:
+        return _grouped_tracks_extent(tracks, boundary_shape, buffer, by)
+
+    x, y = tracks.geometry.x.to_numpy(), tracks.geometry.y.to_numpy()
+    boundary = gpd.GeoSeries([_points_extent(x, y, boundary_shape)], crs=tracks.crs)
 
     # apply buffer
     if buffer != 0:
         tot_bounds = boundary.geometry.total_bounds
         buffer_scale = max([abs(tot_bounds[2] - tot_bounds[0]), abs(tot_bounds[3] - tot_bounds[1])])
         boundary = boundary.buffer(buffer * buffer_scale, cap_style=2, join_style=2)
-        return gpd.GeoDataFrame(geometry=boundary)
+    return gpd.GeoDataFrame(geometry=boundary)
+
+
+def _grouped_tracks_extent(tracks, boundary_shape, buffer, by):
+    """
+    Extent of each group of track points, for ``get_tracks_extent``.
+
+    The points are only split into their groups after all groups have been reduced to their hull candidates together.
+    """
+    keys = _group_keys(tracks, by)
+    grouped = keys.groupby(by, sort=True, dropna=False, observed=True)
+    groups = grouped.size().index.to_frame(index=False)
+    if not len(groups):
+        return gpd.GeoDataFrame(groups, geometry=gpd.GeoSeries([], crs=tracks.crs))
+    codes = grouped.ngroup().to_numpy()
+    x, y = tracks.geometry.x.to_numpy(), tracks.geometry.y.to_numpy()
+
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y, codes = x[finite], y[finite], codes[finite]
+    if boundary_shape == "convex_hull" and len(x):
+        keep = _group_hull_candidates(x, y, codes, len(groups))
+        x, y, codes = x[keep], y[keep], codes[keep]
+
+    # Split the remaining points into their groups
+    order = np.argsort(codes, kind="stable")
+    splits = np.searchsorted(codes[order], np.arange(1, len(groups)))
+    extents = [
+        _points_extent(group_x, group_y, boundary_shape)
+        for group_x, group_y in zip(np.split(x[order], splits), np.split(y[order], splits))
+    ]
+    boundary = gpd.GeoSeries(extents, crs=tracks.crs)
+
+    # apply buffer, relative to the extent of each group
+    if buffer != 0:
+        bounds = boundary.bounds
+        buffer_scale = np.maximum((bounds.maxx - bounds.minx).abs(), (bounds.maxy - bounds.miny).abs())
+        boundary = boundary.buffer(buffer * buffer_scale.to_numpy(), cap_style=2, join_style=2)
+    return gpd.GeoDataFrame(groups, geometry=boundary)
+
+
+def _group_keys(tracks, by):
+    """
+    DataFrame of the columns to group track points by. ``'year'`` is taken from the timestamps if it isn't a column.
+    """
+    keys = {}
+    for col in by:
+        if col == "year" and "year" not in tracks:
+            keys[col] = _parse_timestamps(tracks["timestamp"]).dt.year
+        else:
+            keys[col] = tracks[col]
+    return pd.DataFrame(keys, index=tracks.index)
+
+
+def _extent_vertices(tracks, boundary_shape, by=None):
+    """
+    Points at the vertices of the extent(s) of a chunk of track points, with their grouping columns.
+    """
+    extent = get_tracks_extent(tracks, boundary_shape=boundary_shape, by=by)
+    vertices = extent.geometry.get_coordinates()
+    vertices = vertices.join(extent.drop(columns="geometry"))
+    return gpd.GeoDataFrame(
+        vertices.drop(columns=["x", "y"]), geometry=gpd.points_from_xy(vertices.x, vertices.y), crs=extent.crs
+    )
+
+
+def _points_extent(x, y, boundary_shape):
+    """
+    Envelope or convex hull of points given by coordinate arrays. Points with missing coordinates are ignored.
+    """
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+    if len(x) == 0:
+        return MultiPoint().envelope
+    if boundary_shape == "rectangular":
+        return MultiPoint([(x.min(), y.min()), (x.max(), y.max())]).envelope
+    keep = _hull_candidates(x, y)
+    return shapely.multipoints(np.column_stack([x[keep], y[keep]])).convex_hull
+
+
+def _hull_candidates(x, y, min_points=1000):
+    """
+    Boolean mask of the points that can be vertices of the convex hull.
+
+    The points are binned on a grid, and the lowest, highest, leftmost and rightmost point of each grid column or row
+    are used for a first approximation of the hull. Since the approximation is inside the true hull, points in grid
+    cells that are completely inside the approximation can't be on the true hull, and are discarded.
+    """
+    n = len(x)
+    if n < min_points:
+        return np.ones(n, dtype=bool)
+
+    xmin, xmax, ymin, ymax = x.min(), x.max(), y.min(), y.max()
+    ncells = int(np.clip(np.sqrt(n / 16), 1, 512))
+    dx = (xmax - xmin) / ncells or 1.0
+    dy = (ymax - ymin) / ncells or 1.0
+    ix = np.minimum(((x - xmin) / dx).astype(np.int64), ncells - 1)
+    iy = np.minimum(((y - ymin) / dy).astype(np.int64), ncells - 1)
+
+    candidates = _group_extremes(y, ix, ncells) | _group_extremes(x, iy, ncells)
+    approx_hull = shapely.multipoints(np.column_stack([x[candidates], y[candidates]])).convex_hull
+    if approx_hull.geom_type != "Polygon":
+        return np.ones(n, dtype=bool)
+
+    # Test which grid corners are strictly inside the approximate hull, keeping a margin for rounding errors
+    hull_xy = np.asarray(orient(approx_hull, sign=1.0).exterior.coords)
+    corner_x, corner_y = np.meshgrid(
+        xmin + dx * np.arange(ncells + 1), ymin + dy * np.arange(ncells + 1), indexing="ij"
+    )
+    tol = 1e-9 * ((xmax - xmin) ** 2 + (ymax - ymin) ** 2)
+    corner_inside = np.ones(corner_x.shape, dtype=bool)
+    for (x0, y0), (x1, y1) in zip(hull_xy[:-1], hull_xy[1:]):
+        corner_inside &= (x1 - x0) * (corner_y - y0) - (y1 - y0) * (corner_x - x0) > tol
+    cell_inside = corner_inside[:-1, :-1] & corner_inside[1:, :-1] & corner_inside[:-1, 1:] & corner_inside[1:, 1:]
+
+    return candidates | ~cell_inside[ix, iy]
+
+
+def _group_hull_candidates(x, y, codes, ngroups):
+    """
+    Boolean mask of the points that can be vertices of the convex hull of their group.
+
+    For each group, the extreme points in eight directions form a convex polygon inside the group's hull, and the
+    points strictly inside that polygon are discarded (the Akl-Toussaint heuristic), for all groups at once.
+    """
+    n = len(x)
+    positions = np.arange(n)
+    directions = [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)]
+
+    # Extreme point of each group in each direction, in counterclockwise order
+    vertices = np.empty((len(directions), ngroups), dtype=np.int64)
+    for i, (dx, dy) in enumerate(directions):
+        projection = dx * x + dy * y
+        highest = np.full(ngroups, -np.inf)
+        np.maximum.at(highest, codes, projection)
+        at_max = projection == highest[codes]
+        first = np.full(ngroups, n)
+        np.minimum.at(first, codes[at_max], positions[at_max])
+        vertices[i] = first
+
+    tol = 1e-9 * (np.ptp(x) ** 2 + np.ptp(y) ** 2)
+    inside = np.ones(n, dtype=bool)
+    for i in range(len(directions)):
+        start, end = vertices[i][codes], vertices[(i + 1) % len(directions)][codes]
+        x0, y0, x1, y1 = x[start], y[start], x[end], y[end]
+        # Edges between repeated vertices are skipped
+        inside &= (start == end) | ((x1 - x0) * (y - y0) - (y1 - y0) * (x - x0) > tol)
+
+    keep = ~inside
+    keep[vertices.ravel()] = True
+    return keep
+
+
+def _group_extremes(values, groups, ngroups):
+    """
+    Boolean mask of the values that are the minimum or maximum of their group.
+    """
+    low = np.full(ngroups, np.inf)
+    high = np.full(ngroups, -np.inf)
+    np.minimum.at(low, groups, values)
+    np.maximum.at(high, groups, values)
+    return (values == low[groups]) | (values == high[groups])
+
+
+def _geom_coords(geom):
+    """
+    Coordinates of the vertices of a point, line or polygon geometry, as an array of shape (n, 2).
+    """
+    if geom.is_empty:
+        return np.empty((0, 2))
+    if geom.geom_type == "Polygon":
+        return np.asarray(geom.exterior.coords)
+    return np.asarray(geom.coords)
+
+
+def distance_to_features(
+    tracks, features, columns=None, name="feature", max_distance=None, crs=None, chunksize=1_000_000
+):
+    """
+    Find the distance from each track point to the nearest feature of a vector dataset (e.g. the nearest road of a
+    ``subset_data`` result), and the attributes of that feature.
+
+    The features are projected to a metric CRS and indexed once in an STRtree. The track points are then projected
+    and queried against the tree in chunks of ``chunksize`` points, so memory use is bounded by the chunk size and not
+    the number of track points.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``
+    features : geopandas.GeoDataFrame, str or pathlib.Path
+        Features, or the path of a file of features
+    columns : list of str, optional
+        Feature attributes to add to the track points, by default all of them
+    name : str, optional
+        Prefix of the added columns, by default "feature"
+    max_distance : float, optional
+        Maximum distance to search for features, in m. Points with no feature within this distance get missing
+        values. Limiting the distance makes the queries faster. By default None.
+    crs : Any, optional
+        Metric CRS to compute the distances in. By default the UTM zone at the center of the track points.
+    chunksize : int, optional
+        Number of track points queried at a time, by default 1,000,000
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Track points with columns ``<name>_distance`` (m), ``<name>_index`` (the index label of the nearest feature),
+        and ``<name>_<column>`` for each feature attribute
+
+    Raises
+    ------
+    KeyError
+        Raised if features do not contain the requested columns
+    """
+    if isinstance(features, (str, Path)):
+        features = gpd.read_file(features)
+    if columns is None:
+        columns = [col for col in features.columns if col != features.geometry.name]
+    else:
+        missing = set(columns).difference(features.columns)
+        if missing:
+            raise KeyError(f"distance_to_features: columns {sorted(missing)} not found in features.")
+
+    lon, lat = _track_lonlat(tracks)
+    crs = crs if crs is not None else _utm_crs(lon, lat)
+    tree = shapely.STRtree(features.geometry.to_crs(crs).to_numpy())
+    transformer = Transformer.from_crs(TRACK_CRS, crs, always_xy=True)
+
+    nearest = np.full(len(tracks), -1, dtype=np.int64)
+    distance = np.full(len(tracks), np.nan)
+    for start in range(0, len(tracks), chunksize):
+        x, y = transformer.transform(lon[start : start + chunksize], lat[start : start + chunksize])
+        valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        (points, matches), distances = tree.query_nearest(
+            shapely.points(x[valid], y[valid]), max_distance=max_distance, return_distance=True, all_matches=False
+        )
+        nearest[start + valid[points]] = matches
+        distance[start + valid[points]] = distances
+
+    result = tracks.copy(deep=False)
+    result[f"{name}_distance"] = distance
+    result[f"{name}_index"] = pd.api.extensions.take(features.index.to_numpy(), nearest, allow_fill=True)
+    for col in columns:
+        values = features[col]
+        values = values.array if pd.api.types.is_extension_array_dtype(values.dtype) else values.to_numpy()
+        result[f"{name}_{col}"] = pd.api.extensions.take(values, nearest, allow_fill=True)
+    return result
+
+
+def _utm_crs(lon, lat):
+    """
+    UTM CRS of the zone at the center of the extent of points given as longitude and latitude arrays.
+    """
+    corners = gpd.points_from_xy([np.nanmin(lon), np.nanmax(lon)], [np.nanmin(lat), np.nanmax(lat)])
+    return gpd.GeoSeries(corners, crs=TRACK_CRS).estimate_utm_crs()
 
 
 def plot_subset_interactive(
-    subset, boundary, bounding_geom=None, track_points=None, datashade_tracks=False, projection=ccrs.PlateCarree()
+    subset,
+    boundary,
+    bounding_geom=None,
+    track_points=None,
+    datashade_tracks=False,
+    projection=ccrs.PlateCarree(),
+    max_track_points=None,
 ):
     """
     Plots the results of the subset_data function in an interactive plot using
@@ -213,6 +716,14 @@ def plot_subset_interactive(
         Bounding geometry used for subsetting, by default None
     track_points : geopandas.GeoDataFrame, optional
         Track points used for subsetting, by default None
+    datashade_tracks : bool, optional
+        Whether to datashade the track points, by default False
+    projection : cartopy.crs.Projection, optional
+        Projection of the plot, by default ccrs.PlateCarree()
+    max_track_points : int, optional
+        Maximum number of track points to plot. Tracks with more points are simplified per individual (see
+        ``ecodata.simplify_tracks``), using their ``detail`` column if they have one. By default None, which
+        plots all of the track points.
 
     Returns
     -------
@@ -250,7 +761,7 @@ def plot_subset_interactive(
 
     # Plot for track points
     if track_points is not None:
-        track_plot = track_points.hvplot.points(
+        track_plot = _display_points(track_points, max_track_points).hvplot.points(
             "location_long",
             "location_lat",
             hover=False,
@@ -316,34 +827,638 @@ def bbox2poly(bbox):
     return gpd.GeoSeries(polygon, crs="EPSG:4326")
 
 
-def read_track_data(filein, dissolve=False):
+def read_track_data(
+    filein,
+    dissolve=False,
+    chunksize=None,
+    columns=None,
+    cache=False,
+    start_time=None,
+    end_time=None,
+    individuals=None,
+    bbox=None,
+    compact=False,
+    report=False,
+    dask=False,
+):
     """
     Read Movebank track data.
 
     Column headers are cleaned to snake case.
 
+    The time range, individual and bbox selections are applied while the data are read (chunk by chunk for csv
+    files, and against the file statistics for the cache), so memory use scales with the selection rather than with
+    the size of the study.
+
     Parameters
     ----------
     filein : str
         File path for track data
     dissolve : bool, optional
         Whether to dissolve track points to one multipoint geometry, by default False
+    chunksize : int, optional
+        If specified, the file is streamed in chunks of at most this many rows, and an iterator of GeoDataFrames is
+        returned instead of a single GeoDataFrame. This keeps memory use bounded for files that are too large to read
+        at once. Can't be used together with ``dissolve``. By default None.
+    columns : list of str, optional
+        Columns to read, using the cleaned column names. ``location_long`` and ``location_lat`` are always read. By
+        default all columns are read.
+    cache : bool, optional
+        If True, the track data are read from a GeoParquet cache of the csv file, which is created on first use (see
+        ``cache_track_data``). Loading from the cache is much faster than parsing the csv file, and only the requested
+        columns are read. Note that rows read from the cache are grouped by individual and year, then by the chunk of
+        the csv file that they were converted in (sorted by timestamp within each chunk, but not across chunks), and
+        timestamps are parsed to datetimes. By default False.
+    start_time : str or datetime-like, optional
+        Only read points with a timestamp at or after this time, by default None
+    end_time : str or datetime-like, optional
+        Only read points with a timestamp at or before this time, by default None
+    individuals : list, optional
+        Only read points for these values of ``individual_local_identifier``, by default None
+    bbox : list or tuple, optional
+        Only read points within this bounding box, specified as ``(long_min, lat_min, long_max, lat_max)``. By default
+        None.
+    compact : bool, optional
+        If True, use a memory-lean schema: the identifier columns in ``TRACK_CATEGORICAL_COLUMNS`` are stored as
+        categoricals, float sensor columns are downcast to float32, and timestamps are parsed to datetimes using the
+        Movebank timestamp format. Coordinates are kept as float64 to preserve their precision. Combine with
+        ``columns`` to only read the columns that are needed. By default False.
+    report : bool, optional
+        If True and ``compact`` is used, print a report of the memory saved by the compact schema. By default False.
+    dask : bool, optional
+        If True, return a lazy, partitioned ``dask_geopandas.GeoDataFrame`` instead of reading the data into memory,
+        so that studies larger than memory can be processed in parallel. Requires dask-geopandas. With ``cache``,
+        there is one partition per part file of the cache, i.e. per individual, year and converted csv chunk (see
+        ``cache_track_data``), sorted by timestamp and with known spatial bounds, and partitions that don't match the
+        filters are skipped without being read. Otherwise, the csv file is split into
+        partitions by blocks of rows. Can't be used together with ``dissolve``, ``chunksize`` or ``report``. By default
+        False.
 
     Returns
     -------
-    geopandas.GeoDataFrame
-        Geodataframe of track data
+    geopandas.GeoDataFrame, iterator of geopandas.GeoDataFrame, or dask_geopandas.GeoDataFrame
+        Geodataframe of track data, an iterator of GeoDataFrames if ``chunksize`` is specified, or a dask-geopandas
+        GeoDataFrame if ``dask`` is True
+    """
+    if chunksize is not None and dissolve:
+        raise ValueError("read_track_data: dissolve can't be used together with chunksize.")
+    if dask and (dissolve or chunksize is not None or report):
+        raise ValueError("read_track_data: dask can't be used together with dissolve, chunksize or report.")
+
+    if columns is not None:
+        columns = list(dict.fromkeys([*columns, "location_long", "location_lat"]))
+
+    filters = {
+        key: value
+        for key, value in dict(start_time=start_time, end_time=end_time, individuals=individuals, bbox=bbox).items()
+        if value is not None
+    }
+
+    if dask:
+        return _read_track_dask(filein, columns=columns, cache=cache, filters=filters, compact=compact)
+
+    if cache:
+        cache_path = cache_track_data(filein)
+        if chunksize is not None:
+            chunks = _iter_track_cache(cache_path, chunksize, columns=columns, filters=filters)
+            return _compact_chunks(chunks, report=report) if compact else chunks
+        track_gdf = _read_track_cache(cache_path, columns=columns, filters=filters)
+        if compact:
+            (track_gdf,) = _compact_chunks([track_gdf], report=report)
+    elif chunksize is not None:
+        chunks = _iter_track_chunks(filein, chunksize, columns=columns, filters=filters)
+        return _compact_chunks(chunks, report=report) if compact else chunks
+    elif filters or compact:
+        # Read chunk by chunk, so that only the selected points are ever held in memory, in their compact form
+        chunks = _iter_track_chunks(filein, _FILTER_CHUNKSIZE, columns=columns, filters=filters)
+        chunks = list(_compact_chunks(chunks, report=report) if compact else chunks)
+        if chunks:
+            track_gdf = _concat_tracks(chunks)
+        else:
+            track_gdf = _tracks_to_gdf(_read_track_csv(filein, columns=columns, nrows=0))
+            if compact:
+                track_gdf = _compact_track_dtypes(track_gdf)
+    else:
+        # read track csv
+        track_gdf = _tracks_to_gdf(_read_track_csv(filein, columns=columns))
+
+    if dissolve:
+        track_gdf = track_gdf.dissolve()
+    return track_gdf
+
+
+def _read_track_csv(filein, columns=None, **kwargs):
+    """
+    Read a Movebank track csv file with cleaned column names.
+
+    The headers are only read and cleaned once, and the cleaned names are passed on to the csv reader, so that
+    ``columns`` can be given as cleaned names. Additional keyword arguments are passed to ``pandas.read_csv``.
+    """
+    names = clean_headers(pd.read_csv(filein, nrows=0), report=False).columns.tolist()
+    if columns is not None:
+        missing = set(columns).difference(names)
+        if missing:
+            raise KeyError(f"read_track_data: columns {sorted(missing)} not found in {filein}")
+    return pd.read_csv(filein, header=0, names=names, usecols=columns, **kwargs)
+
+
+def _read_track_dask(filein, columns=None, cache=False, filters=None, compact=False):
     """
-    # read track csv
-    track_df = clean_headers(pd.read_csv(filein), report=False)
-    track_gdf = gpd.GeoDataFrame(
+    Lazily read track data as a dask-geopandas GeoDataFrame.
+
+    Filters on cached data are passed to the parquet reader, which skips the partitions and row groups that don't
+    match them. For csv files, the filters are applied to each partition as it is read.
+    """
+    import dask.dataframe as dd
+    import dask_geopandas
+
+    if cache:
+        cache_path = cache_track_data(filein)
+        if columns is not None:
+            schema = pq.read_schema(cache_path / "_common_metadata")
+            columns = list(dict.fromkeys([*columns, "geometry"]))
+            missing = set(columns).difference(schema.names)
+            if missing:
+                raise KeyError(f"read_track_data: columns {sorted(missing)} not found in track data")
+        track_ddf = dask_geopandas.read_parquet(
+            cache_path, columns=columns, filters=_track_filter_dnf(**(filters or {})) or None
+        )
+    else:
+        read_columns = columns
+        if columns is not None and filters:
+            read_columns = list(dict.fromkeys([*columns, *_track_filter_columns(filters)]))
+        names = clean_headers(pd.read_csv(filein, nrows=0), report=False).columns.tolist()
+        if read_columns is not None:
+            missing = set(read_columns).difference(names)
+            if missing:
+                raise KeyError(f"read_track_data: columns {sorted(missing)} not found in {filein}")
+        track_ddf = dd.read_csv(filein, header=0, names=names, usecols=read_columns)
+        if filters:
+            track_ddf = track_ddf.map_partitions(_filter_tracks, filters, meta=track_ddf._meta)
+        if read_columns != columns:
+            track_ddf = track_ddf.drop(columns=list(set(read_columns).difference(columns)))
+        track_ddf = dask_geopandas.from_dask_dataframe(
+            track_ddf,
+            geometry=dask_geopandas.points_from_xy(track_ddf, "location_long", "location_lat", crs=TRACK_CRS),
+        )
+
+    if compact:
+        track_ddf = track_ddf.map_partitions(_compact_track_dtypes, meta=_compact_track_dtypes(track_ddf._meta))
+    return track_ddf
+
+
+def _filter_tracks(track_df, filters):
+    return track_df.loc[_track_filter_mask(track_df, **filters)]
+
+
+def _is_dask_frame(obj):
+    """
+    Whether an object is a dask (or dask-geopandas) collection, without importing dask.
+    """
+    return hasattr(obj, "npartitions") and hasattr(obj, "to_delayed")
+
+
+def _iter_track_chunks(filein, chunksize, columns=None, filters=None):
+    """
+    Generator of track GeoDataFrames read from a csv file in chunks.
+
+    If ``filters`` are given, only the matching points of each chunk are kept and empty chunks are skipped.
+    """
+    read_columns = columns
+    if columns is not None and filters:
+        read_columns = list(dict.fromkeys([*columns, *_track_filter_columns(filters)]))
+
+    with _read_track_csv(filein, columns=read_columns, chunksize=chunksize) as reader:
+        for chunk in reader:
+            if filters:
+                chunk = chunk.loc[_track_filter_mask(chunk, **filters)]
+                if chunk.empty:
+                    continue
+            if read_columns != columns:
+                chunk = chunk.drop(columns=set(read_columns).difference(columns))
+            yield _tracks_to_gdf(chunk)
+
+
+def _compact_track_dtypes(track_df):
+    """
+    Convert track data to the compact schema described in ``read_track_data``.
+    """
+    dtypes = {}
+    for col in track_df.columns:
+        if col in TRACK_CATEGORICAL_COLUMNS:
+            dtypes[col] = "category"
+        elif col not in ("location_long", "location_lat") and track_df[col].dtype == np.float64:
+            dtypes[col] = np.float32
+    track_df = track_df.astype(dtypes)
+    if "timestamp" in track_df:
+        track_df["timestamp"] = _parse_timestamps(track_df["timestamp"])
+    return track_df
+
+
+def _compact_chunks(chunks, report=False):
+    """
+    Generator converting chunks of track data to the compact schema. If ``report`` is True, the memory saved is
+    printed once all chunks have been converted.
+    """
+    bytes_before = bytes_after = 0
+    for chunk in chunks:
+        if report:
+            bytes_before += chunk.memory_usage(deep=True).sum()
+        chunk = _compact_track_dtypes(chunk)
+        if report:
+            bytes_after += chunk.memory_usage(deep=True).sum()
+        yield chunk
+    if report:
+        _create_memory_report(bytes_before, bytes_after)
+
+
+def _concat_tracks(track_gdfs):
+    """
+    Concatenate track GeoDataFrames, unifying the categories of categorical columns so that they stay categorical.
+    Columns that are categorical in any of the GeoDataFrames are categorical in the result.
+    """
+    track_gdfs = [gdf.copy(deep=False) for gdf in track_gdfs]
+    columns = pd.Index([col for gdf in track_gdfs for col in gdf.columns]).unique()
+    for col in columns:
+        values = [gdf[col] for gdf in track_gdfs if col in gdf]
+        if any(isinstance(series.dtype, pd.CategoricalDtype) for series in values):
+            categories = union_categoricals([series.astype("category") for series in values], ignore_order=True)
+            dtype = pd.CategoricalDtype(categories.categories)
+            for gdf in track_gdfs:
+                if col in gdf:
+                    gdf[col] = gdf[col].astype(dtype)
+    return pd.concat(track_gdfs)
+
+
+def _track_filter_columns(filters):
+    """
+    Columns needed to apply track filters.
+    """
+    columns = ["location_long", "location_lat"]
+    if "start_time" in filters or "end_time" in filters:
+        columns.append("timestamp")
+    if "individuals" in filters:
+        columns.append("individual_local_identifier")
+    return columns
+
+
+def _track_filter_mask(track_df, start_time=None, end_time=None, individuals=None, bbox=None):
+    """
+    Boolean mask of the track points within a time range, for a list of individuals, and within a bounding box.
+    """
+    mask = np.ones(len(track_df), dtype=bool)
+    if start_time is not None or end_time is not None:
+        timestamps = _parse_timestamps(track_df["timestamp"])
+        if start_time is not None:
+            mask &= (timestamps >= pd.Timestamp(start_time)).to_numpy()
+        if end_time is not None:
+            mask &= (timestamps <= pd.Timestamp(end_time)).to_numpy()
+    if individuals is not None:
+        mask &= track_df["individual_local_identifier"].isin(individuals).to_numpy()
+    if bbox is not None:
+        long = track_df["location_long"].to_numpy()
+        lat = track_df["location_lat"].to_numpy()
+        mask &= (long >= bbox[0]) & (lat >= bbox[1]) & (long <= bbox[2]) & (lat <= bbox[3])
+    return mask
+
+
+def _track_filter_dnf(start_time=None, end_time=None, individuals=None, bbox=None):
+    """
+    Filters equivalent to ``_track_filter_mask`` as a list of ``(column, op, value)`` conditions, for filtering
+    cached track data while it is read.
+    """
+    conditions = []
+    if start_time is not None:
+        conditions.append(("timestamp", ">=", pd.Timestamp(start_time)))
+    if end_time is not None:
+        conditions.append(("timestamp", "<=", pd.Timestamp(end_time)))
+    if individuals is not None:
+        conditions.append(("individual_local_identifier", "in", list(individuals)))
+    if bbox is not None:
+        conditions.extend(
+            [
+                ("location_long", ">=", bbox[0]),
+                ("location_lat", ">=", bbox[1]),
+                ("location_long", "<=", bbox[2]),
+                ("location_lat", "<=", bbox[3]),
+            ]
+        )
+    return conditions
+
+
+def _track_filter_expression(**filters):
+    """
+    Pyarrow expression equivalent to ``_track_filter_mask``, for filtering cached track data while it is read.
+    """
+    conditions = _track_filter_dnf(**filters)
+    return pq.filters_to_expression(conditions) if conditions else None
+
+
+def _tracks_to_gdf(track_df):
+    """
+    Create a GeoDataFrame of track points from a DataFrame with location_long and location_lat columns.
+    """
+    return gpd.GeoDataFrame(
         track_df,
         geometry=gpd.points_from_xy(track_df["location_long"], track_df["location_lat"]),
         crs=TRACK_CRS,
     )
-    if dissolve:
-        track_gdf = track_gdf.dissolve()
-    return track_gdf
+
+
+def cache_track_data(filein, cache_dir=None, chunksize=1_000_000):
+    """
+    Convert a Movebank track csv file to a cached GeoParquet dataset, if it hasn't already been converted.
+
+    The csv file is converted in chunks, so files larger than memory can be cached. The cached dataset has a directory
+    per individual (named after the identifier, with a hash suffix) and a subdirectory per year. Each csv chunk writes
+    its own part file (``part-<chunk number>.parquet``) to the directory of every individual and year that it
+    contains, so the points of an individual and year can be spread over several part files. The rows of each part
+    file are sorted by timestamp, and timestamps are stored as parsed datetimes. The cache is keyed by the path, size
+    and modification time of the csv file, so it is rebuilt when the file changes. Outdated versions of the cache for
+    the same file are removed.
+
+    Parameters
+    ----------
+    filein : str or pathlib.Path
+        File path for track data
+    cache_dir : str or pathlib.Path, optional
+        Directory for the cache. By default, a ``tracks`` directory inside ``ecodata.functions.CACHE_DIR``
+        (``~/.cache/ecodata``, or the ``ECODATA_CACHE_DIR`` environment variable if set).
+    chunksize : int, optional
+        Number of csv rows to convert at a time, by default 1,000,000
+
+    Returns
+    -------
+    pathlib.Path
+        Path to the directory of the cached GeoParquet dataset
+    """
+    filein = Path(filein).resolve()
+    stat = filein.stat()
+    cache_dir = Path(cache_dir) if cache_dir is not None else CACHE_DIR / "tracks"
+    source_dir = cache_dir / _hash_key(str(filein))
+    cache_path = source_dir / _hash_key(f"{filein}|{stat.st_size}|{stat.st_mtime_ns}")
+    if cache_path.exists():
+        return cache_path
+
+    # Write to a temporary directory first, so that an interrupted conversion never leaves a partial cache behind
+    tmp_path = source_dir / f".tmp-{os.getpid()}-{cache_path.name}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    try:
+        schemas = []
+        for i, chunk in enumerate(_iter_track_chunks(filein, chunksize)):
+            schemas.extend(_write_track_partitions(chunk, tmp_path, f"part-{i:05d}.parquet"))
+        if not schemas:
+            raise ValueError(f"cache_track_data: no track data found in {filein}")
+
+        # Columns that are empty in some chunks are stored with a null type, so the schemas need to be unified
+        pq.write_metadata(pa.unify_schemas(schemas, promote_options="permissive"), tmp_path / "_common_metadata")
+
+        for old_path in source_dir.iterdir():
+            if old_path != tmp_path and not old_path.name.startswith("."):
+                shutil.rmtree(old_path, ignore_errors=True)
+        try:
+            tmp_path.rename(cache_path)
+        except OSError:
+            # Another process may have finished caching the same file first
+            if not cache_path.exists():
+                raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    return cache_path
+
+
+def _write_track_partitions(track_gdf, path, filename):
+    """
+    Write a chunk of track data to a GeoParquet part file named ``filename`` in the directory of each individual and
+    year in the chunk.
+
+    Returns the list of schemas of the written files.
+    """
+    if "timestamp" in track_gdf:
+        track_gdf = track_gdf.assign(timestamp=_parse_timestamps(track_gdf["timestamp"]))
+        year = track_gdf["timestamp"].dt.year
+    else:
+        year = pd.Series(np.nan, index=track_gdf.index)
+    if "individual_local_identifier" in track_gdf:
+        individual = track_gdf["individual_local_identifier"]
+    else:
+        individual = pd.Series("unknown", index=track_gdf.index)
+
+    # Store empty columns as nulls (rather than float NaN), so that they can be unified with other chunks
+    empty_cols = [col for col in track_gdf.columns if col != "geometry" and track_gdf[col].isna().all()]
+    track_gdf = track_gdf.astype({col: object for col in empty_cols})
+    track_gdf.loc[:, empty_cols] = None
+
+    schemas = []
+    for (ind, yr), part in track_gdf.groupby([individual, year], sort=False, dropna=False):
+        part_dir = path / _partition_name(ind) / (str(int(yr)) if pd.notna(yr) else "unknown")
+        part_dir.mkdir(parents=True, exist_ok=True)
+        if "timestamp" in part:
+            part = part.sort_values("timestamp", kind="stable")
+        part.to_parquet(part_dir / filename, index=False, row_group_size=_TRACK_ROW_GROUP_SIZE)
+        schemas.append(pq.read_schema(part_dir / filename))
+    return schemas
+
+
+def _partition_name(individual):
+    """
+    Directory name of the cache partition of an individual: the identifier with unsafe characters replaced, followed
+    by a hash of the identifier, so that different identifiers never share a partition.
+    """
+    safe_name = re.sub(r"[^\w.-]", "_", str(individual))[:64]
+    return f"{safe_name}-{_hash_key(str(individual))}"
+
+
+def _read_track_cache(cache_path, columns=None, filters=None):
+    """
+    Read a cached GeoParquet track dataset. Only the requested columns are read, using memory mapping, and
+    partitions and row groups that don't match the filters are skipped.
+    """
+    schema = pq.read_schema(cache_path / "_common_metadata")
+    if columns is not None:
+        columns = list(dict.fromkeys([*columns, "geometry"]))
+        missing = set(columns).difference(schema.names)
+        if missing:
+            raise KeyError(f"read_track_data: columns {sorted(missing)} not found in track data")
+    return gpd.read_parquet(
+        cache_path,
+        columns=columns,
+        schema=schema,
+        memory_map=True,
+        filters=_track_filter_expression(**(filters or {})),
+    )
+
+
+def _iter_track_cache(cache_path, chunksize, columns=None, filters=None):
+    """
+    Generator of track GeoDataFrames read from a cached GeoParquet dataset in batches.
+
+    Point geometries are rebuilt from the coordinates, which is faster than decoding the stored geometries.
+    """
+    schema = pq.read_schema(cache_path / "_common_metadata")
+    if columns is None:
+        columns = [name for name in schema.names if name != "geometry"]
+    dataset = pyarrow.dataset.dataset(cache_path, schema=schema, format="parquet")
+    start = 0
+    batches = dataset.to_batches(
+        columns=columns, filter=_track_filter_expression(**(filters or {})), batch_size=chunksize
+    )
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield _tracks_to_gdf(chunk)
+
+
+def cache_vector_data(filename, cache_dir=None):
+    """
+    Convert a vector dataset (e.g. a shapefile, GeoJSON or KML file) to a cached GeoParquet file with a spatial index,
+    if it hasn't already been converted.
+
+    The features are sorted along a Hilbert curve, so that nearby features are stored together, and the bounding box
+    of each feature is stored in bbox columns. Bounding box and mask queries of the cached file then only read the
+    row groups whose bbox column statistics overlap the query. The cache is keyed by the path, size and modification
+    time of the dataset (including the sidecar files of shapefiles), so it is rebuilt when the dataset changes.
+    Outdated versions of the cache for the same dataset are removed.
+
+    The conversion reads the whole dataset into memory once, to sort all of its features. ``get_extent`` and
+    ``get_crs`` read the metadata of the dataset directly, so they never trigger a conversion.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        Path to the vector dataset
+    cache_dir : str or pathlib.Path, optional
+        Directory for the cache. By default, a ``vectors`` directory inside ``ecodata.functions.CACHE_DIR``
+        (``~/.cache/ecodata``, or the ``ECODATA_CACHE_DIR`` environment variable if set).
+
+    Returns
+    -------
+    pathlib.Path
+        Path to the cached GeoParquet file
+    """
+    filename = Path(filename).resolve()
+    cache_dir = Path(cache_dir) if cache_dir is not None else CACHE_DIR / "vectors"
+    source_dir = cache_dir / _hash_key(str(filename))
+    stats = [(path, path.stat()) for path in _vector_source_files(filename)]
+    cache_path = source_dir / f"{_hash_key('|'.join(f'{p}|{s.st_size}|{s.st_mtime_ns}' for p, s in stats))}.parquet"
+    if cache_path.exists():
+        return cache_path
+
+    gdf = gpd.read_file(filename)
+    bounds = gdf.geometry.bounds.to_numpy()
+    located = np.isfinite(bounds).all(axis=1)
+    hilbert = np.full(len(gdf), np.iinfo(np.int64).max)
+    if located.any():
+        hilbert[located] = gdf.geometry[located].hilbert_distance().to_numpy()
+    gdf = gdf.assign(**dict(zip(_VECTOR_BBOX_COLUMNS, bounds.T))).iloc[np.argsort(hilbert, kind="stable")]
+
+    # Write to a temporary file first, so that an interrupted conversion never leaves a partial cache behind
+    source_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = source_dir / f".tmp-{os.getpid()}-{cache_path.name}"
+    try:
+        gdf.to_parquet(tmp_path, index=True, row_group_size=_VECTOR_ROW_GROUP_SIZE)
+        for old_path in source_dir.iterdir():
+            if old_path != tmp_path and not old_path.name.startswith("."):
+                old_path.unlink(missing_ok=True)
+        tmp_path.replace(cache_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return cache_path
+
+
+def _vector_source_files(filename):
+    """
+    Files of a vector dataset: the file itself, and the sidecar files (.dbf, .shx, .prj, ...) of a shapefile.
+    """
+    if filename.suffix.lower() == ".shp":
+        return sorted(path for path in filename.parent.glob(f"{glob.escape(filename.stem)}.*") if path.is_file())
+    return [filename]
+
+
+def _use_vector_cache(filename):
+    """
+    Whether a vector dataset is read from the cache, i.e. whether it's a local file of at least
+    ``VECTOR_CACHE_MIN_SIZE`` bytes that isn't already GeoParquet.
+    """
+    if not isinstance(filename, (str, Path)) or VECTOR_CACHE_MIN_SIZE is None:
+        return False
+    path = Path(filename)
+    if not path.is_file() or path.suffix.lower() == ".parquet":
+        return False
+    return sum(source.stat().st_size for source in _vector_source_files(path.resolve())) >= VECTOR_CACHE_MIN_SIZE
+
+
+def _read_vector_data(filename, bbox=None, mask=None):
+    """
+    Read a vector dataset like ``geopandas.read_file``, from the cached GeoParquet conversion of the dataset if it's
+    large enough (see ``cache_vector_data``).
+    """
+    if not _use_vector_cache(filename):
+        return gpd.read_file(filename, bbox=bbox, mask=mask)
+    cache_path = cache_vector_data(filename)
+    schema = pq.read_schema(cache_path)
+    columns = [name for name in schema.names if name not in _VECTOR_BBOX_COLUMNS and not name.startswith("__index")]
+    crs = _vector_cache_metadata(cache_path).get("crs")
+
+    # Region of interest in the CRS of the dataset, as with geopandas.read_file
+    region = None
+    if mask is not None:
+        if isinstance(mask, (gpd.GeoDataFrame, gpd.GeoSeries)):
+            mask = mask.to_crs(crs).unary_union
+        region = mask
+    elif bbox is not None:
+        if isinstance(bbox, (gpd.GeoDataFrame, gpd.GeoSeries)):
+            bbox = bbox.to_crs(crs).total_bounds
+        elif isinstance(bbox, shapely.Geometry):
+            bbox = bbox.bounds
+        region = shapely.box(*bbox)
+
+    if region is None:
+        gdf = gpd.read_parquet(cache_path, columns=columns, use_pandas_metadata=True)
+    else:
+        xmin, ymin, xmax, ymax = region.bounds
+        xmin_col, ymin_col, xmax_col, ymax_col = (pyarrow.dataset.field(name) for name in _VECTOR_BBOX_COLUMNS)
+        gdf = gpd.read_parquet(
+            cache_path,
+            columns=columns,
+            use_pandas_metadata=True,
+            filters=(xmin_col <= xmax) & (xmax_col >= xmin) & (ymin_col <= ymax) & (ymax_col >= ymin),
+        )
+        gdf = gdf[gdf.intersects(region)]
+
+    # Restore the order of the features in the dataset
+    return gdf.sort_index().reset_index(drop=True)
+
+
+def _vector_cache_metadata(cache_path):
+    """
+    GeoParquet metadata (crs, bbox, ...) of the geometry column of a cached vector dataset.
+    """
+    geo = json.loads(pq.read_schema(cache_path).metadata[b"geo"])
+    return geo["columns"][geo["primary_column"]]
+
+
+def _parse_timestamps(timestamps):
+    """
+    Parse timestamps to datetimes, if they aren't already.
+
+    The Movebank timestamp format is tried first, since parsing with a fixed format is much faster than inferring it.
+    """
+    if pd.api.types.is_datetime64_any_dtype(timestamps):
+        return timestamps
+    try:
+        return pd.to_datetime(timestamps, format=MOVEBANK_TIMESTAMP_FORMAT)
+    except ValueError:
+        return pd.to_datetime(timestamps)
+
+
+def _hash_key(key):
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
 
 
 def read_ref_data(filein):
@@ -366,75 +1481,531 @@ def read_ref_data(filein):
     return ref_data
 
 
-def merge_tracks_ref(track_data, ref_data):
+def merge_tracks_ref(track_data, ref_data, columns=None):
     """
     Merge track data and reference data on deployment_id.
 
-    Left merge is used.
+    Left merge is used. The reference data are deduplicated on deployment_id and indexed once, and each track point
+    is mapped to its row of the reference data through the codes of its deployment, so only the reference columns
+    being added are copied. The index of the track data is preserved.
 
     Parameters
     ----------
-    track_data : geopandas.GeoDataFrame
-        Geodataframe of track data. Must include 'deployment_id'
+    track_data : geopandas.GeoDataFrame or dask_geopandas.GeoDataFrame
+        Geodataframe of track data. Must include 'deployment_id'. A dask-geopandas GeoDataFrame is merged lazily,
+        partition by partition.
     ref_data : pandas.DataFrame
-        Dataframe of reference data. Must include 'deployment_id'
+        Dataframe of reference data. Must include 'deployment_id'. If a deployment_id appears more than once, its
+        first row is used.
+    columns : list of str, optional
+        Reference data columns to add to the track data. By default, all columns of the reference data that aren't
+        already in the track data are added. Columns already in the track data are kept from the track data.
 
     Returns
     -------
-    geopandas.GeoDataFrame
+    geopandas.GeoDataFrame or dask_geopandas.GeoDataFrame
         Merged GeoDataFrame containing track data and reference data
 
     Raises
     ------
     KeyError
-        Raised if track_data and/or reference data do not contain the deployment_id column
+        Raised if track_data and/or reference data do not contain the deployment_id column, or if reference data do
+        not contain the requested columns
     """
 
-    if ("deployment_id" in track_data.columns) and ("deployment_id" in ref_data.columns):
-        merged_data = pd.merge(track_data, ref_data, on="deployment_id", how="left", suffixes=(None, "_ref"))
-        cols_to_drop = [c for c in merged_data.columns if "_ref" in c]
-        merged_data = merged_data.drop(columns=cols_to_drop)
-    else:
+    if ("deployment_id" not in track_data.columns) or ("deployment_id" not in ref_data.columns):
         raise KeyError("merge_tracks_ref: both track_data and ref_data must contain deployment_id.")
+    if columns is None:
+        columns = [col for col in ref_data.columns if col != "deployment_id"]
+    else:
+        missing = set(columns).difference(ref_data.columns)
+        if missing:
+            raise KeyError(f"merge_tracks_ref: columns {sorted(missing)} not found in ref_data.")
+    columns = [col for col in dict.fromkeys(columns) if col not in track_data.columns]
+
+    ref_data = ref_data.drop_duplicates("deployment_id")[["deployment_id", *columns]]
+
+    if _is_dask_frame(track_data):
+        # Bind the reference data to the function, so that dask doesn't try to align it with the partitions
+        merge_partition = functools.partial(merge_tracks_ref, ref_data=ref_data, columns=columns)
+        return track_data.map_partitions(merge_partition, meta=merge_partition(track_data._meta))
+
+    ref = ref_data.set_index("deployment_id")
+
+    # Look up the reference row of each deployment once, rather than of each track point
+    keys = track_data["deployment_id"]
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        codes, deployments = keys.cat.codes.to_numpy(), keys.cat.categories
+    else:
+        codes, deployments = pd.factorize(keys)
+    rows = ref.index.get_indexer(deployments)
+    rows = np.where(codes >= 0, rows[codes], -1) if len(rows) else np.full(len(codes), -1)
+
+    merged_data = track_data.copy(deep=False)
+    for col in columns:
+        values = ref[col].array if pd.api.types.is_extension_array_dtype(ref[col].dtype) else ref[col].to_numpy()
+        merged_data[col] = pd.api.extensions.take(values, rows, allow_fill=True)
     return merged_data
 
 
-def combine_studies(studies):
+def combine_studies(studies, max_workers=None, **kwargs):
+    """
+    Combine track data from multiple studies into one GeoDataFrame.
 
+    Studies given as file paths are read concurrently in a process pool. The studies are then concatenated once,
+    with the categories of any categorical columns unified (e.g. when ``compact=True`` is used, or when some of the
+    GeoDataFrames have categorical columns), so that they stay categorical. The geometries of studies given as
+    GeoDataFrames are kept, and reprojected to the CRS of the first of them if needed. Point geometries are only
+    built from ``location_long`` and ``location_lat`` for studies read from files, in ``TRACK_CRS``.
+
+    Parameters
+    ----------
+    studies : list of str, pathlib.Path, or geopandas.GeoDataFrame
+        Studies to combine, given as file paths of track data or as GeoDataFrames of track data
+    max_workers : int, optional
+        Maximum number of processes used to read the studies. By default None, which uses the number of processors on
+        the machine. Use 1 to read the studies sequentially in the current process.
+    **kwargs :
+        Additional arguments to be passed to ``read_track_data`` for studies given as file paths
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Combined track data, in the CRS of the first study given as a GeoDataFrame, or in ``TRACK_CRS`` if all of the
+        studies are file paths
+
+    Raises
+    ------
+    TypeError
+        Raised if a study is not a file path or a GeoDataFrame
+    """
+    paths = []
+    for study in studies:
+        if isinstance(study, (str, Path)):
+            paths.append(study)
+        elif not isinstance(study, gpd.GeoDataFrame):
+            raise TypeError(f"combine_studies: studies must be file paths or GeoDataFrames, not {type(study)}.")
+
+    read_study = functools.partial(_read_track_frame, **kwargs)
+    if len(paths) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            read_studies = iter(list(executor.map(read_study, paths)))
+    else:
+        read_studies = map(read_study, paths)
+
+    # Keep the studies in their original order. The studies read from files are passed between processes without
+    # geometries, so their points are built here
+    crs = next((study.crs for study in studies if isinstance(study, gpd.GeoDataFrame)), TRACK_CRS)
     studies_to_concat = []
     for study in studies:
-        if isinstance(study, str) | isinstance(study, Path):
-            studies_to_concat.append(read_track_data(study))
-        elif isinstance(study, gpd.GeoDataFrame):
-            studies_to_concat.append(study)
+        study = _tracks_to_gdf(next(read_studies)) if isinstance(study, (str, Path)) else study
+        if study.geometry.name != "geometry":
+            study = study.rename_geometry("geometry")
+        if study.crs is not None and crs is not None and study.crs != crs:
+            study = study.to_crs(crs)
+        studies_to_concat.append(study)
+    return gpd.GeoDataFrame(_concat_tracks(studies_to_concat), geometry="geometry", crs=crs)
 
-        all_studies = pd.concat(studies_to_concat)
-        all_studies = gpd.GeoDataFrame(all_studies, geometry=all_studies.geometry, crs=TRACK_CRS)
 
-    return all_studies
+def _read_track_frame(filein, **kwargs):
+    """
+    Read track data as a DataFrame without geometries, which is cheaper to pass between processes.
+    """
+    track_gdf = read_track_data(filein, **kwargs)
+    return pd.DataFrame(track_gdf.drop(columns=track_gdf.geometry.name))
 
 
 def clip_tracks_timerange(df, df2):
     """
     Clip tracks dataset to include only points within the time range of another study
 
+    Timestamps are parsed to datetimes before they are compared. If the tracks are sorted by timestamp (e.g. with
+    ``sort_tracks_by_time``), the time range is found by binary search and a slice of the tracks is returned without
+    copying them.
+
     Parameters
     ----------
-    df : geopandas.GeoDataFrame
-        Track dataset to clip
-    df2 : geopandas.GeoDataFrame
+    df : geopandas.GeoDataFrame or dask_geopandas.GeoDataFrame
+        Track dataset to clip. A dask-geopandas GeoDataFrame is clipped lazily, partition by partition.
+    df2 : geopandas.GeoDataFrame or dask_geopandas.GeoDataFrame
         Other study that will be used to determine the time window of interest
 
     Returns
     -------
-    geopandas.GeoDataFrame
+    geopandas.GeoDataFrame or dask_geopandas.GeoDataFrame
         Track dataset containing only points within the time range of the other study
     """
-    tmin = df2.timestamp.min()
-    tmax = df2.timestamp.max()
-    mask = (df.timestamp >= tmin) & (df.timestamp <= tmax)
+    if _is_dask_frame(df2):
+        import dask
+
+        # Compute the time range once, rather than as part of the graph of every partition of df
+        timestamps2 = df2.timestamp.map_partitions(_parse_timestamps, meta=("timestamp", "datetime64[ns]"))
+        tmin, tmax = dask.compute(timestamps2.min(), timestamps2.max())
+    else:
+        timestamps2 = _parse_timestamps(df2.timestamp)
+        tmin, tmax = timestamps2.min(), timestamps2.max()
+
+    if _is_dask_frame(df):
+        timestamps = df.timestamp.map_partitions(_parse_timestamps, meta=("timestamp", "datetime64[ns]"))
+        return df.loc[(timestamps >= tmin) & (timestamps <= tmax)]
+
+    if pd.isna(tmin):
+        return df.iloc[:0]
+    times = _track_times(df)
+    if _is_sorted(times):
+        start = np.searchsorted(times, tmin.to_datetime64(), side="left")
+        end = np.searchsorted(times, tmax.to_datetime64(), side="right")
+        return df.iloc[start:end]
+    return df.loc[(times >= tmin.to_datetime64()) & (times <= tmax.to_datetime64())]
+
+
+def clip_tracks_windows(df, windows, by="deployment_id", start="deploy_on_timestamp", end="deploy_off_timestamp"):
+    """
+    Clip tracks to a batch of time windows, each applying to the points of one group (e.g. one deployment).
+
+    The windows are typically taken from Movebank reference data, to keep only the points recorded between the
+    deployment on and off times of each deployment. The tracks are grouped and sorted by timestamp once (or not at
+    all, if they are already sorted, e.g. with ``sort_tracks_by_time(df, by=by)``), and then each window is found by
+    binary search within its group.
+
+    Parameters
+    ----------
+    df : geopandas.GeoDataFrame
+        Track dataset to clip. Must include the ``by`` column and 'timestamp'.
+    windows : pandas.DataFrame
+        Time windows, with the ``by``, ``start`` and ``end`` columns. A missing start or end time leaves the window
+        open on that side.
+    by : str, optional
+        Column identifying the group each window applies to, by default "deployment_id"
+    start : str, optional
+        Column of the window start times, by default "deploy_on_timestamp"
+    end : str, optional
+        Column of the window end times, by default "deploy_off_timestamp"
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Points within the time window of their group, ordered by window and then by timestamp. Points of groups
+        without a window, and points without a timestamp, are dropped. Points within several windows are repeated.
+
+    Raises
+    ------
+    KeyError
+        Raised if df or windows do not contain the required columns
+    """
+    if by not in df.columns or "timestamp" not in df.columns:
+        raise KeyError(f"clip_tracks_windows: df must contain {by} and timestamp.")
+    missing = {by, start, end}.difference(windows.columns)
+    if missing:
+        raise KeyError(f"clip_tracks_windows: windows must contain {sorted(missing)}.")
+
+    codes, groups = pd.factorize(df[by], sort=True)
+    times = _track_times(df)
+    positions = np.flatnonzero((codes >= 0) & ~np.isnat(times))
+    codes, times = codes[positions], times[positions]
+
+    # Sort by group and then by timestamp, unless the points already are
+    dcodes = np.diff(codes)
+    if not np.all((dcodes > 0) | ((dcodes == 0) & (times[1:] >= times[:-1]))):
+        order = np.lexsort((times, codes))
+        positions, codes, times = positions[order], codes[order], times[order]
+    offsets = np.searchsorted(codes, np.arange(len(groups) + 1))
+
+    window_codes = groups.get_indexer(windows[by])
+    starts = _parse_timestamps(windows[start]).to_numpy(dtype="datetime64[ns]")
+    ends = _parse_timestamps(windows[end]).to_numpy(dtype="datetime64[ns]")
+    slices = []
+    for code, window_start, window_end in zip(window_codes, starts, ends):
+        if code < 0:
+            continue
+        first, last = offsets[code], offsets[code + 1]
+        group_times = times[first:last]
+        lo = first if np.isnat(window_start) else first + np.searchsorted(group_times, window_start, side="left")
+        hi = last if np.isnat(window_end) else first + np.searchsorted(group_times, window_end, side="right")
+        slices.append(positions[lo:hi])
+    return df.iloc[np.concatenate(slices) if slices else []]
+
+
+def sort_tracks_by_time(df, by=None):
+    """
+    Parse the timestamps of track data to datetimes and sort the points by timestamp.
+
+    Sorted tracks can be clipped by binary search in ``clip_tracks_timerange`` and ``clip_tracks_windows``, instead of
+    comparing every timestamp. The sort is stable, so points with equal timestamps keep their order.
+
+    Parameters
+    ----------
+    df : geopandas.GeoDataFrame
+        Track dataset. Must include 'timestamp'.
+    by : str or list of str, optional
+        Column(s) to group the points by before sorting by timestamp (e.g. 'deployment_id', for use with
+        ``clip_tracks_windows``), by default None
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Sorted track dataset, with timestamps as datetimes
+    """
+    by = [] if by is None else [by] if isinstance(by, str) else list(by)
+    df = df.assign(timestamp=_parse_timestamps(df["timestamp"]))
+    return df.sort_values([*by, "timestamp"], kind="stable")
 
-    return df.loc[mask]
+
+def track_detail(tracks, by="individual_local_identifier"):
+    """
+    Compute the level of detail of each track point, for simplifying tracks at any tolerance.
+
+    The detail of a point is the largest Douglas-Peucker tolerance at which the point is kept when the track of its
+    group (e.g. individual) is simplified. It is computed once for all tolerances, in a single compiled pass over all
+    groups, so tracks can then be simplified for display or export by comparing the detail with a tolerance (see
+    ``simplify_tracks``).
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``. Must include 'timestamp'.
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, by default
+        "individual_local_identifier". If None, all points are treated as one track.
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Track points sorted by group and timestamp, with timestamps as datetimes and a ``detail`` column, in degrees.
+        The detail is infinite for the first and last points of each group, and missing for points without a
+        location.
+    """
+    tracks, offsets = _sorted_tracks(tracks, by)
+    lon, lat = _track_lonlat(tracks)
+    idx = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+    group_ids = _group_ids(offsets, len(tracks))[idx]
+
+    detail = np.full(len(tracks), np.nan)
+    detail[idx] = _douglas_peucker_detail(lon[idx], lat[idx], np.flatnonzero(np.diff(group_ids, prepend=-1)))
+    tracks = tracks.copy(deep=False)
+    tracks["detail"] = detail
+    return tracks
+
+
+def simplify_tracks(tracks, tolerance=None, max_points=None, by="individual_local_identifier"):
+    """
+    Simplify tracks with the Douglas-Peucker algorithm, applied to the track of each group (e.g. individual).
+
+    The kept points are a subset of the track points, with all of their columns. If the tracks have a ``detail``
+    column (from ``track_detail``), it is used instead of being computed again, so simplifying at several tolerances
+    (e.g. for the zoom levels of a plot) only costs a comparison.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data`` or ``track_detail``. Must include 'timestamp' if they don't
+        include 'detail'.
+    tolerance : float, optional
+        Douglas-Peucker tolerance, in degrees. Points that are closer than this to the simplified track are removed.
+    max_points : int, optional
+        Maximum number of points to keep. If specified instead of ``tolerance``, the smallest tolerance that keeps at
+        most this many points is used. If both are specified, the larger of the two tolerances is used.
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, by default
+        "individual_local_identifier". If None, all points are treated as one track. Not used if the tracks have a
+        ``detail`` column.
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Simplified track points
+    """
+    if tolerance is None and max_points is None:
+        raise ValueError("simplify_tracks: tolerance and/or max_points must be specified.")
+    if "detail" not in tracks.columns:
+        tracks = track_detail(tracks, by=by)
+    detail = tracks["detail"].to_numpy()
+
+    keep = ~np.isnan(detail)
+    if tolerance is not None:
+        keep &= detail > tolerance
+    if max_points is not None and keep.sum() > max_points:
+        candidates = np.flatnonzero(keep)
+        most_detail = np.argpartition(-detail[candidates], max_points - 1)[:max_points] if max_points > 0 else []
+        keep[:] = False
+        keep[candidates[most_detail]] = True
+    return tracks.iloc[np.flatnonzero(keep)]
+
+
+def _track_times(track_df):
+    """
+    Timestamps of track data as a datetime64[ns] array.
+    """
+    return _parse_timestamps(track_df["timestamp"]).to_numpy(dtype="datetime64[ns]")
+
+
+def _is_sorted(values):
+    """
+    Whether an array is sorted in ascending order. Arrays with missing values (NaN or NaT) are not sorted.
+    """
+    return bool(np.all(values[1:] >= values[:-1]))
+
+
+def _sorted_tracks(tracks, by):
+    """
+    Tracks sorted by group and timestamp (if they aren't already), with timestamps parsed to datetimes, and the
+    offsets of the first point of each group.
+
+    Groups are ordered by their first appearance in the tracks, and points without a timestamp are placed at the end
+    of their group.
+    """
+    if "timestamp" not in tracks.columns:
+        raise KeyError("tracks must contain timestamp.")
+    if by is not None and by not in tracks.columns:
+        raise KeyError(f"tracks must contain {by}.")
+
+    codes = pd.factorize(tracks[by], use_na_sentinel=False)[0] if by is not None else np.zeros(len(tracks), int)
+    times = _track_times(tracks)
+    times = np.where(np.isnat(times), np.iinfo(np.int64).max, times.view(np.int64))
+
+    dcodes = np.diff(codes)
+    if not np.all((dcodes > 0) | ((dcodes == 0) & (times[1:] >= times[:-1]))):
+        order = np.lexsort((times, codes))
+        tracks, codes = tracks.iloc[order], codes[order]
+
+    if not pd.api.types.is_datetime64_any_dtype(tracks["timestamp"]):
+        tracks = tracks.copy(deep=False)
+        tracks["timestamp"] = _parse_timestamps(tracks["timestamp"])
+    offsets = np.flatnonzero(np.diff(codes, prepend=-2))
+    return tracks, offsets
+
+
+def _track_lonlat(tracks):
+    """
+    Longitudes and latitudes of track points as arrays.
+
+    The location_long and location_lat columns are used if the tracks have them, since they are faster to read than
+    the coordinates of the point geometries.
+    """
+    if {"location_long", "location_lat"}.issubset(tracks.columns):
+        return tracks["location_long"].to_numpy(dtype=float), tracks["location_lat"].to_numpy(dtype=float)
+    geometry = tracks.geometry
+    if geometry.crs is not None and not geometry.crs.is_geographic:
+        geometry = geometry.to_crs(TRACK_CRS)
+    return geometry.x.to_numpy(), geometry.y.to_numpy()
+
+
+def _track_seconds(tracks):
+    """
+    Timestamps of track points as float seconds since the epoch, with NaN for missing timestamps.
+    """
+    times = _track_times(tracks)
+    return np.where(np.isnat(times), np.nan, times.view(np.int64) / 1e9)
+
+
+def _group_ids(offsets, n):
+    """
+    Group number of each of n sorted points, from the offsets of the first point of each group.
+    """
+    starts = np.zeros(n, dtype=np.int64)
+    starts[offsets[1:]] = 1
+    return np.cumsum(starts)
+
+
+def _display_points(tracks, max_points):
+    """
+    At most ``max_points`` of the track points, for plotting. Tracks with timestamps (or a ``detail`` column) are
+    simplified, so that the shape of the tracks is kept, and other points are subsampled evenly.
+    """
+    if max_points is None or len(tracks) <= max_points:
+        return tracks
+    if "detail" in tracks.columns or "timestamp" in tracks.columns:
+        by = "individual_local_identifier" if "individual_local_identifier" in tracks.columns else None
+        return simplify_tracks(tracks, max_points=max_points, by=by)
+    return tracks.iloc[:: -(-len(tracks) // max_points)]
+
+
+@numba.njit(cache=True)
+def _douglas_peucker_detail(x, y, offsets):
+    """
+    Level of detail of each point, as described in ``track_detail``, for groups of points starting at ``offsets``.
+
+    Each segment of the recursive Douglas-Peucker simplification is split at its farthest point, whose detail is its
+    distance from the segment, capped by the detail of the point that created the segment.
+    """
+    n = len(x)
+    detail = np.full(n, np.inf)
+    ends = np.empty(len(offsets), dtype=np.int64)
+    ends[:-1] = offsets[1:]
+    if len(offsets):
+        ends[-1] = n
+
+    stack_start = np.empty(n, dtype=np.int64)
+    stack_end = np.empty(n, dtype=np.int64)
+    stack_cap = np.empty(n)
+    for g in range(len(offsets)):
+        size = 0
+        if ends[g] - offsets[g] > 2:
+            stack_start[0], stack_end[0], stack_cap[0] = offsets[g], ends[g] - 1, np.inf
+            size = 1
+        while size:
+            size -= 1
+            a, b, cap = stack_start[size], stack_end[size], stack_cap[size]
+            dx, dy = x[b] - x[a], y[b] - y[a]
+            length2 = dx * dx + dy * dy
+            farthest, max_dist = a + 1, -1.0
+            for i in range(a + 1, b):
+                px, py = x[i] - x[a], y[i] - y[a]
+                if length2 > 0:
+                    t = min(max((px * dx + py * dy) / length2, 0.0), 1.0)
+                    px, py = px - t * dx, py - t * dy
+                dist = np.sqrt(px * px + py * py)
+                if dist > max_dist:
+                    farthest, max_dist = i, dist
+            detail[farthest] = min(max_dist, cap)
+            if farthest - a > 1:
+                stack_start[size], stack_end[size], stack_cap[size] = a, farthest, detail[farthest]
+                size += 1
+            if b - farthest > 1:
+                stack_start[size], stack_end[size], stack_cap[size] = farthest, b, detail[farthest]
+                size += 1
+    return detail
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """
+    Great-circle distance between points, using the haversine formula.
+
+    Parameters
+    ----------
+    lon1, lat1 : float or numpy.ndarray
+        Longitudes and latitudes of the start points, in degrees
+    lon2, lat2 : float or numpy.ndarray
+        Longitudes and latitudes of the end points, in degrees
+
+    Returns
+    -------
+    float or numpy.ndarray
+        Distances in m
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(a) for a in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _great_circle_points(lon1, lat1, lon2, lat2, fraction, steps):
+    """
+    Points at a fraction of the way along the great circles of steps from start points to end points, in degrees.
+    ``steps`` gives the step of each point, so the start and end points are only converted to vectors once.
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(a) for a in (lon1, lat1, lon2, lat2))
+    start = np.stack([np.cos(lat1) * np.cos(lon1), np.cos(lat1) * np.sin(lon1), np.sin(lat1)])
+    end = np.stack([np.cos(lat2) * np.cos(lon2), np.cos(lat2) * np.sin(lon2), np.sin(lat2)])
+    angle = np.arccos(np.clip((start * end).sum(axis=0), -1, 1))
+
+    # Spherical linear interpolation, which becomes linear interpolation for very short steps
+    angle = angle[steps]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        short = np.sin(angle) < 1e-12
+        start_weight = np.where(short, 1 - fraction, np.sin((1 - fraction) * angle) / np.sin(angle))
+        end_weight = np.where(short, fraction, np.sin(fraction * angle) / np.sin(angle))
+    x, y, z = start_weight * start[:, steps] + end_weight * end[:, steps]
+    return np.degrees(np.arctan2(y, x)), np.degrees(np.arctan2(z, np.hypot(x, y)))
 
 
 def get_extent(filepath):
@@ -624,3 +2195,14 @@ def _create_report(stats: dict[str, int], ncols: int) -> None:
         nclnd = stats["cleaned"]
         pclnd = round(nclnd / ncols * 100, 2)
         print(f"\t{nclnd} values cleaned ({pclnd}%)")
+
+
+def _create_memory_report(bytes_before, bytes_after):
+    """
+    Describe the memory saved by converting data to a more compact schema.
+    """
+    print("Memory Usage Report:")
+    saved = bytes_before - bytes_after
+    psaved = round(saved / bytes_before * 100, 2) if bytes_before else 0
+    print(f"\t{bytes_before / 1e6:.2f} MB before, {bytes_after / 1e6:.2f} MB after")
+    print(f"\t{saved / 1e6:.2f} MB saved ({psaved}%)")
@@ -0,0 +1,1220 @@
+"""
+Movement metrics and processing for track data.
+
+The functions in this module work on tracks sorted by individual and timestamp, with the points of each individual
+stored contiguously. The boundaries between individuals are handled with the offsets of their first points, so that
+all individuals are processed together in vectorized passes over the coordinate and time arrays.
+"""
+from __future__ import annotations
+
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import geopandas as gpd
+import numba
+import numpy as np
+import pandas as pd
+import rasterio.features
+import shapely
+from affine import Affine
+from pyproj import Transformer
+from shapely.geometry import shape
+from shapely.ops import unary_union
+
+from ecodata.functions import (
+    EARTH_RADIUS,
+    TRACK_CRS,
+    _group_hull_candidates,
+    _group_ids,
+    _sorted_tracks,
+    _track_lonlat,
+    _track_seconds,
+    _track_times,
+    _tracks_to_gdf,
+    _utm_crs,
+    get_tracks_extent,
+    haversine,
+)
+
+# Filters of clean_tracks, in the order they are applied
+DROP_REASONS = ["missing_location", "duplicate", "spike", "speed"]
+
+# Radius of the KDE kernels, in bandwidths
+KDE_KERNEL_RADIUS = 4
+
+# Odd 64-bit multipliers for hashing the space-time cells of detect_encounters, when there are too many to pack
+_CELL_HASH_MULTIPLIERS = [0x9E3779B97F4A7C15, 0xBF58476D1CE4E5B9, 0x94D049BB133111EB, 0xD6E8FEB86659FD93]
+
+
+def movement_metrics(tracks, by="individual_local_identifier", max_workers=None):
+    """
+    Compute the step length, duration, speed, heading and turning angle of each track point.
+
+    The step of a point is the move from the previous point of the same group (e.g. individual) to the point. Step
+    lengths are great-circle distances, and headings are initial great-circle bearings. The metrics are computed for
+    all groups at once with vectorized NumPy operations, and are missing for the first point of each group (and the
+    turning angle also for the second point, and for points after a step of length zero, which has no heading).
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``. Must include 'timestamp'. Tracks sorted by group and timestamp
+        (e.g. with ``sort_tracks_by_time(tracks, by=by)``) are used as they are, otherwise they are sorted first.
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, by default
+        "individual_local_identifier". If None, all points are treated as one track.
+    max_workers : int, optional
+        If specified, the groups are split into this many blocks of whole groups, which are processed in parallel
+        threads. By default None, which processes all groups in one pass.
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Track points sorted by group and timestamp, with timestamps as datetimes and additional columns
+        ``step_length`` (m), ``step_duration`` (s), ``speed`` (m/s), ``heading`` (degrees clockwise from north, in
+        [0, 360)) and ``turning_angle`` (degrees, in [-180, 180), positive for turns to the right).
+    """
+    tracks, offsets = _sorted_tracks(tracks, by)
+    lon, lat = _track_lonlat(tracks)
+    seconds = _track_seconds(tracks)
+
+    metrics = {
+        name: np.full(len(tracks), np.nan)
+        for name in ("step_length", "step_duration", "speed", "heading", "turning_angle")
+    }
+
+    def compute_block(block):
+        start, end = block
+        block_offsets = offsets[(offsets >= start) & (offsets < end)] - start
+        block_metrics = _step_metrics(lon[start:end], lat[start:end], seconds[start:end], block_offsets)
+        for name, values in block_metrics.items():
+            metrics[name][start:end] = values
+
+    blocks = _group_blocks(offsets, len(tracks), max_workers or 1)
+    if len(blocks) > 1:
+        # NumPy releases the GIL in its array operations, so threads run the blocks in parallel without copying them
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(compute_block, blocks))
+    else:
+        for block in blocks:
+            compute_block(block)
+
+    tracks = tracks.copy(deep=False)
+    for name, values in metrics.items():
+        tracks[name] = values
+    return tracks
+
+
+def clean_tracks(
+    tracks,
+    by="individual_local_identifier",
+    max_speed=None,
+    spike_speed=None,
+    spike_angle=15,
+    max_iterations=10,
+    report=True,
+    return_dropped=False,
+):
+    """
+    Remove points with missing locations, duplicate timestamps, GPS spikes and implausible speeds from track data.
+
+    The filters are applied to all groups (e.g. individuals) at once, in this order:
+
+    - ``missing_location``: points without a location.
+    - ``duplicate``: points with the same timestamp as an earlier point of the same group. The first point is kept.
+    - ``spike``: points where the track goes out and comes back at a sharp angle, with speeds above ``spike_speed``
+      both into and out of the point. This is applied repeatedly (up to ``max_iterations`` times), since removing a
+      spike can reveal another one next to it. Each pass is vectorized over all points.
+    - ``speed``: points that can't be reached from the previous kept point of the group without exceeding
+      ``max_speed``, unless the track carries on from them (the next point can be reached from the point, but not
+      from the previous kept point), in which case they are kept as a relocation. A first point of a group that can't
+      reach the next point is removed if the track carries on normally from the next point. Each point is judged
+      against both of its neighbours, so one bad fix doesn't remove the points after it. Since this depends on which
+      earlier points were kept, it is a sequential pass, which is compiled with numba.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``. Must include 'timestamp'.
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, by default
+        "individual_local_identifier". If None, all points are treated as one track.
+    max_speed : float, optional
+        Maximum plausible speed (m/s) for the speed filter. By default None, which skips the speed filter.
+    spike_speed : float, optional
+        Minimum speed (m/s) into and out of a point for it to be a spike. By default None, which skips the spike
+        filter.
+    spike_angle : float, optional
+        Maximum angle (degrees) between the steps into and out of a point for it to be a spike, by default 15
+    max_iterations : int, optional
+        Maximum number of passes of the spike filter, by default 10
+    report : bool, optional
+        If True, print a report of the number of points removed by each filter, by default True
+    return_dropped : bool, optional
+        If True, also return the removed points, with the filter that removed them in a ``drop_reason`` column. By
+        default False.
+
+    Returns
+    -------
+    geopandas.GeoDataFrame or tuple of geopandas.GeoDataFrame
+        Cleaned track points, sorted by group and timestamp, with timestamps as datetimes. If ``return_dropped`` is
+        True, a tuple of the cleaned and removed points.
+    """
+    tracks, offsets = _sorted_tracks(tracks, by)
+    lon, lat = _track_lonlat(tracks)
+    seconds = _track_seconds(tracks)
+    group_ids = _group_ids(offsets, len(tracks))
+
+    # Index in DROP_REASONS of the filter that removed each point
+    reasons = np.full(len(tracks), -1, dtype=np.int8)
+    kept = np.isfinite(lon) & np.isfinite(lat)
+    reasons[~kept] = DROP_REASONS.index("missing_location")
+
+    # Duplicates follow the first point with the same timestamp, since the points are sorted
+    idx = np.flatnonzero(kept)
+    duplicate = idx[1:][(group_ids[idx[1:]] == group_ids[idx[:-1]]) & (seconds[idx[1:]] == seconds[idx[:-1]])]
+    reasons[duplicate] = DROP_REASONS.index("duplicate")
+    kept[duplicate] = False
+
+    if spike_speed is not None:
+        idx = np.flatnonzero(kept)
+        candidates = np.arange(len(idx))
+        for _ in range(max_iterations):
+            spikes = _spikes(lon[idx], lat[idx], seconds[idx], group_ids[idx], candidates, spike_speed, spike_angle)
+            spikes = idx[spikes]
+            if not len(spikes):
+                break
+            reasons[spikes] = DROP_REASONS.index("spike")
+            kept[spikes] = False
+            # Only the neighbours of the removed spikes can become spikes in the next pass
+            idx = np.flatnonzero(kept)
+            after = np.searchsorted(idx, spikes)
+            candidates = np.unique(np.concatenate([after - 1, after]))
+
+    if max_speed is not None:
+        idx = np.flatnonzero(kept)
+        too_fast = ~_speed_filter(lon[idx], lat[idx], seconds[idx], group_ids[idx], max_speed)
+        reasons[idx[too_fast]] = DROP_REASONS.index("speed")
+        kept[idx[too_fast]] = False
+
+    dropped_reasons = pd.Categorical.from_codes(reasons[~kept], categories=DROP_REASONS)
+    if report:
+        _create_cleaning_report(dropped_reasons.value_counts(), len(tracks))
+
+    cleaned = tracks.iloc[np.flatnonzero(kept)]
+    if return_dropped:
+        dropped = tracks.iloc[np.flatnonzero(~kept)].copy()
+        dropped["drop_reason"] = dropped_reasons
+        return cleaned, dropped
+    return cleaned
+
+
+def _spikes(lon, lat, seconds, group_ids, candidates, spike_speed, spike_angle):
+    """
+    Positions of the candidate points that are spikes, i.e. with a sharp angle between fast steps into and out of
+    them.
+    """
+    i = candidates[(candidates > 0) & (candidates < len(lon) - 1)]
+    i = i[(group_ids[i - 1] == group_ids[i]) & (group_ids[i + 1] == group_ids[i])]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        i = i[haversine(lon[i - 1], lat[i - 1], lon[i], lat[i]) / (seconds[i] - seconds[i - 1]) > spike_speed]
+        i = i[haversine(lon[i], lat[i], lon[i + 1], lat[i + 1]) / (seconds[i + 1] - seconds[i]) > spike_speed]
+
+    # Angle between the step back to the previous point and the step on to the next point
+    angle = bearing(lon[i], lat[i], lon[i + 1], lat[i + 1]) - bearing(lon[i], lat[i], lon[i - 1], lat[i - 1])
+    angle = np.abs((angle + 180) % 360 - 180)
+    return i[angle < spike_angle]
+
+
+@numba.njit(cache=True)
+def _speed_filter(lon, lat, seconds, group_ids, max_speed):
+    """
+    Boolean mask of the points kept by the speed filter described in ``clean_tracks``.
+    """
+    n = len(lon)
+    kept = np.ones(n, dtype=np.bool_)
+    last = -1
+    for i in range(n):
+        has_next = i + 1 < n and group_ids[i + 1] == group_ids[i]
+        if i == 0 or group_ids[i] != group_ids[i - 1]:
+            # The first point of a group is an outlier if it can't reach the next point, but the track carries on
+            # normally from the next point
+            if (
+                has_next
+                and i + 2 < n
+                and group_ids[i + 2] == group_ids[i]
+                and _too_fast(lon, lat, seconds, i, i + 1, max_speed)
+                and not _too_fast(lon, lat, seconds, i + 1, i + 2, max_speed)
+            ):
+                kept[i] = False
+                last = -1
+            else:
+                last = i
+        elif last < 0 or not _too_fast(lon, lat, seconds, last, i, max_speed):
+            last = i
+        elif (
+            has_next
+            and not _too_fast(lon, lat, seconds, i, i + 1, max_speed)
+            and _too_fast(lon, lat, seconds, last, i + 1, max_speed)
+        ):
+            # The track carries on from the point, and not from the previous kept point, so it is a relocation
+            last = i
+        else:
+            kept[i] = False
+    return kept
+
+
+@numba.njit(cache=True)
+def _too_fast(lon, lat, seconds, i, j, max_speed):
+    """
+    Whether the step from point i to point j is faster than ``max_speed``.
+    """
+    lat1 = np.radians(lat[i])
+    lat2 = np.radians(lat[j])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(np.radians(lon[j] - lon[i]) / 2) ** 2
+    distance = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(min(max(a, 0.0), 1.0)))
+    return distance > max_speed * (seconds[j] - seconds[i])
+
+
+def _create_cleaning_report(counts, npoints):
+    """
+    Describe the points removed by ``clean_tracks``.
+    """
+    print("Track Cleaning Report:")
+    for reason, count in counts[counts > 0].items():
+        print(f"\t{count} points removed as {reason} ({round(count / npoints * 100, 2)}%)")
+    print(f"\t{npoints - counts.sum()} of {npoints} points kept")
+
+
+def interpolate_tracks(tracks, freq="1h", max_gap=None, by="individual_local_identifier", columns=None):
+    """
+    Resample tracks to regular time steps by linear interpolation between fixes. Longitudes are interpolated the shorter
+    way around, so steps across the antimeridian are interpolated across it.
+
+    All groups (e.g. individuals) are interpolated together: the regular times of all groups are generated at once,
+    and the fixes before and after each of them are found with a single binary search over the sorted tracks.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``. Must include 'timestamp'.
+    freq : str or pandas.Timedelta, optional
+        Time step, e.g. "1h" or "15min", by default "1h". The regular times are multiples of the time step (e.g. on the
+        hour), between the first and last fix of each group.
+    max_gap : str or pandas.Timedelta, optional
+        Longest time between fixes to interpolate across. Regular times within longer gaps are left out of the
+        result. By default None, which interpolates across all gaps.
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, by default
+        "individual_local_identifier". If None, all points are treated as one track.
+    columns : list of str, optional
+        Additional numeric columns to interpolate (e.g. ``['height_above_ellipsoid']``), by default None
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Interpolated track points, with the ``by`` column, 'timestamp', 'location_long', 'location_lat' and the
+        interpolated columns. Points without a location or timestamp are not used.
+    """
+    step = pd.to_timedelta(freq).value
+    if step <= 0:
+        raise ValueError(f"interpolate_tracks: freq must be a positive time step, not {freq!r}")
+    columns = [] if columns is None else list(columns)
+    missing = set(columns).difference(tracks.columns)
+    if missing:
+        raise KeyError(f"interpolate_tracks: columns {sorted(missing)} not found in tracks")
+
+    tracks, offsets = _sorted_tracks(tracks, by)
+    lon, lat = _track_lonlat(tracks)
+    times = _track_times(tracks)
+    idx = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat) & ~np.isnat(times))
+    lon, lat, times = lon[idx], lat[idx], times[idx].view(np.int64)
+    group_ids = _group_ids(offsets, len(tracks))[idx]
+    values = [tracks[col].to_numpy(dtype=float)[idx] for col in columns]
+
+    # First and last fix of each group, and the regular times in between
+    starts = np.flatnonzero(np.diff(group_ids, prepend=-1))
+    ends = np.append(starts[1:], len(idx))
+    first, last = times[starts], times[ends - 1]
+    first_step = -(-first // step) * step
+    counts = np.maximum((last - first_step) // step + 1, 0)
+    out_groups = np.repeat(np.arange(len(starts)), counts)
+    out_offsets = np.cumsum(counts) - counts
+    out_times = first_step[out_groups] + (np.arange(counts.sum()) - out_offsets[out_groups]) * step
+
+    # Times relative to the start of each group, shifted so that they increase across groups, for a single search
+    spans = (last - first) / 1e9 + 1
+    shifts = np.cumsum(spans) - spans
+    point_groups = np.repeat(np.arange(len(starts)), ends - starts)
+    keys = (times - first[point_groups]) / 1e9 + shifts[point_groups]
+    out_keys = (out_times - first[out_groups]) / 1e9 + shifts[out_groups]
+    before = np.clip(np.searchsorted(keys, out_keys, side="right") - 1, starts[out_groups], ends[out_groups] - 1)
+    after = np.minimum(before + 1, ends[out_groups] - 1)
+
+    duration = times[after] - times[before]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(duration > 0, (out_times - times[before]) / duration, 0)
+    if max_gap is not None:
+        keep = (duration <= pd.to_timedelta(max_gap).value) | (out_times == times[before]) | (out_times == times[after])
+        before, after, fraction, out_times, out_groups = (
+            a[keep] for a in (before, after, fraction, out_times, out_groups)
+        )
+
+    def interpolate(a):
+        return a[before] + fraction * (a[after] - a[before])
+
+    # Longitudes are interpolated the shorter way around, so that steps across the antimeridian stay near it
+    out_lon = lon[before] + fraction * ((lon[after] - lon[before] + 180) % 360 - 180)
+    out_lon = np.where(out_lon > 180, out_lon - 360, np.where(out_lon < -180, out_lon + 360, out_lon))
+
+    interpolated = {}
+    if by is not None:
+        interpolated[by] = tracks[by].to_numpy()[idx[starts]][out_groups]
+    interpolated["timestamp"] = out_times.astype("datetime64[ns]")
+    interpolated["location_long"] = out_lon
+    interpolated["location_lat"] = interpolate(lat)
+    for col, a in zip(columns, values):
+        interpolated[col] = interpolate(a)
+    return _tracks_to_gdf(pd.DataFrame(interpolated))
+
+
+def thin_tracks(tracks, interval, by="individual_local_identifier"):
+    """
+    Thin tracks in time, by keeping the first point of each group (e.g. individual) in each time interval.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``. Must include 'timestamp'.
+    interval : str or pandas.Timedelta
+        Length of the time intervals, e.g. "1h". The intervals start at multiples of their length (e.g. on the hour).
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, by default
+        "individual_local_identifier". If None, all points are treated as one track.
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Thinned track points, sorted by group and timestamp, with timestamps as datetimes. Points without a timestamp
+        are removed.
+    """
+    step = pd.to_timedelta(interval).value
+    if step <= 0:
+        raise ValueError(f"thin_tracks: interval must be a positive time step, not {interval!r}")
+    tracks, offsets = _sorted_tracks(tracks, by)
+    times = _track_times(tracks)
+    bins = times.view(np.int64) // step
+
+    keep = ~np.isnat(times)
+    keep[1:] &= bins[1:] != bins[:-1]
+    keep[offsets] = ~np.isnat(times[offsets])
+    return tracks.iloc[np.flatnonzero(keep)]
+
+
+def fit_step_distributions(tracks, by="individual_local_identifier"):
+    """
+    Fit step length and turning angle distributions to tracks, for generating random steps.
+
+    Step lengths are fitted with a gamma distribution (by maximum likelihood, with Minka's approximation of the shape)
+    and turning angles with a von Mises distribution (with the approximation of the concentration of Best and Fisher).
+    Steps of length zero, which have no heading, are left out.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``. Must include 'timestamp'.
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, by default
+        "individual_local_identifier". If None, all points are treated as one track.
+
+    Returns
+    -------
+    dict
+        Fitted parameters, as ``{"step_length": {"shape": ..., "scale": ...}, "turning_angle": {"mean": ...,
+        "kappa": ...}}``, with the scale in m and the mean turning angle in degrees.
+
+    Raises
+    ------
+    ValueError
+        Raised if there are fewer than two consecutive steps, or if all step lengths are equal (e.g. a simulated
+        track), since the gamma distribution of the step lengths would then be degenerate
+    """
+    tracks, offsets = _sorted_tracks(tracks, by)
+    lon, lat = _track_lonlat(tracks)
+    metrics = _step_metrics(lon, lat, _track_seconds(tracks), offsets)
+    return _fit_step_distributions(metrics["step_length"], metrics["turning_angle"])
+
+
+def random_steps(
+    tracks,
+    n_random=10,
+    by="individual_local_identifier",
+    distributions=None,
+    batch_size=100_000,
+    seed=None,
+    geometry=True,
+):
+    """
+    Generate random available steps for step-selection analyses, in batches.
+
+    Each observed step with a turning angle (i.e. every step after the first step of a group with non-zero length) is
+    matched with ``n_random`` random steps from the same start point, with step lengths and turning angles drawn from
+    gamma and von Mises distributions. The random steps of a batch of observed steps are drawn and projected along
+    great circles at once, so a batch of ``batch_size * (n_random + 1)`` steps is built with a few vectorized
+    operations. Batches are generated one at a time, so they can be annotated and written out without holding all
+    of the steps in memory (see ``ecodata.annotate_random_steps``).
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``. Must include 'timestamp'.
+    n_random : int, optional
+        Number of random steps per observed step, by default 10
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, by default
+        "individual_local_identifier". If None, all points are treated as one track.
+    distributions : dict, optional
+        Step length and turning angle distributions, as returned by ``fit_step_distributions``. By default fitted to
+        the tracks.
+    batch_size : int, optional
+        Number of observed steps per batch, by default 100,000
+    seed : int or numpy.random.Generator, optional
+        Seed for the random number generator, by default None
+    geometry : bool, optional
+        If True (default), the batches are GeoDataFrames with the end points of the steps as geometries. Creating the
+        point geometries takes most of the time of generating the steps, so set to False if they aren't needed (e.g.
+        for annotation with ``annotate_tracks``, which only uses the coordinate columns).
+
+    Yields
+    ------
+    geopandas.GeoDataFrame or pandas.DataFrame
+        Observed and random steps, with the end point of each step as ``location_long``, ``location_lat`` (and the
+        geometry), and ``timestamp`` (the time of the end of the observed step). The other columns are
+        ``step_id`` (the same for an observed step and its random steps), ``case`` (True for observed steps),
+        ``start_long``, ``start_lat``, ``step_length`` (m), ``turning_angle`` (degrees) and the ``by`` column.
+    """
+    if n_random < 1:
+        raise ValueError(f"random_steps: n_random must be at least 1, not {n_random!r}")
+    if batch_size < 1:
+        raise ValueError(f"random_steps: batch_size must be at least 1, not {batch_size!r}")
+
+    tracks, offsets = _sorted_tracks(tracks, by)
+    lon, lat = _track_lonlat(tracks)
+    metrics = _step_metrics(lon, lat, _track_seconds(tracks), offsets)
+    if distributions is None:
+        distributions = _fit_step_distributions(metrics["step_length"], metrics["turning_angle"])
+    shape, scale = distributions["step_length"]["shape"], distributions["step_length"]["scale"]
+    mean_angle, kappa = np.radians(distributions["turning_angle"]["mean"]), distributions["turning_angle"]["kappa"]
+
+    rng = np.random.default_rng(seed)
+    ends = np.flatnonzero(np.isfinite(metrics["turning_angle"]))
+    times = tracks["timestamp"].to_numpy()
+    groups = tracks[by].to_numpy() if by is not None else None
+
+    for batch_start in range(0, len(ends), batch_size):
+        batch = ends[batch_start : batch_start + batch_size]
+        starts = batch - 1
+
+        # The first column of each row is the observed step, the others are its random steps
+        step_length = np.empty((len(batch), n_random + 1))
+        turning_angle = np.empty((len(batch), n_random + 1))
+        step_length[:, 0] = metrics["step_length"][batch]
+        turning_angle[:, 0] = metrics["turning_angle"][batch]
+        step_length[:, 1:] = rng.gamma(shape, scale, size=(len(batch), n_random))
+        turning_angle[:, 1:] = np.degrees(rng.vonmises(mean_angle, kappa, size=(len(batch), n_random)))
+
+        end_lon, end_lat = _destination_points(
+            lon[starts, None], lat[starts, None], metrics["heading"][starts, None] + turning_angle, step_length
+        )
+        end_lon[:, 0], end_lat[:, 0] = lon[batch], lat[batch]
+
+        steps = pd.DataFrame(
+            {
+                "step_id": np.repeat(np.arange(batch_start, batch_start + len(batch)), n_random + 1),
+                "case": np.tile(np.arange(n_random + 1) == 0, len(batch)),
+                "timestamp": np.repeat(times[batch], n_random + 1),
+                "start_long": np.repeat(lon[starts], n_random + 1),
+                "start_lat": np.repeat(lat[starts], n_random + 1),
+                "location_long": end_lon.ravel(),
+                "location_lat": end_lat.ravel(),
+                "step_length": step_length.ravel(),
+                "turning_angle": turning_angle.ravel(),
+            }
+        )
+        if by is not None:
+            steps.insert(0, by, np.repeat(groups[batch], n_random + 1))
+        yield _tracks_to_gdf(steps) if geometry else steps
+
+
+def _fit_step_distributions(step_length, turning_angle):
+    """
+    Gamma and von Mises distribution parameters fitted to arrays of step lengths (m) and turning angles (degrees).
+    """
+    step_length = step_length[np.isfinite(step_length) & (step_length > 0)]
+    turning_angle = np.radians(turning_angle[np.isfinite(turning_angle)])
+    if not len(step_length) or not len(turning_angle):
+        raise ValueError("fit_step_distributions: tracks need at least two consecutive steps to fit distributions")
+
+    # Gamma maximum likelihood, with Minka's closed-form approximation of the shape
+    mean_length = step_length.mean()
+    s = np.log(mean_length) - np.log(step_length).mean()
+    if np.ptp(step_length) == 0 or not s > 0:
+        raise ValueError(
+            "fit_step_distributions: all step lengths are equal, so a gamma distribution can't be fitted to them. "
+            "Pass the step length distribution to random_steps instead."
+        )
+    shape = (3 - s + np.sqrt((s - 3) ** 2 + 24 * s)) / (12 * s)
+
+    # von Mises mean direction, and the concentration from the mean resultant length
+    sin, cos = np.sin(turning_angle).mean(), np.cos(turning_angle).mean()
+    r = np.hypot(sin, cos)
+    if r < 0.53:
+        kappa = 2 * r + r**3 + 5 * r**5 / 6
+    elif r < 0.85:
+        kappa = -0.4 + 1.39 * r + 0.43 / (1 - r)
+    else:
+        kappa = 1 / (r**3 - 4 * r**2 + 3 * r)
+
+    return {
+        "step_length": {"shape": float(shape), "scale": float(mean_length / shape)},
+        "turning_angle": {"mean": float(np.degrees(np.arctan2(sin, cos))), "kappa": float(kappa)},
+    }
+
+
+def detect_encounters(tracks, distance, time_window, by="individual_local_identifier", merge=True):
+    """
+    Find encounters between individuals: fixes of different individuals within a distance and time window of each
+    other.
+
+    The fixes are hashed into space-time cells, with time bins as long as the time window and spatial cells (of unit
+    vectors on the sphere) as wide as the distance, so that every pair of fixes in contact is in the same cell or in
+    neighbouring cells. Only the pairs of fixes in neighbouring occupied cells are compared, instead of all pairs of
+    fixes, and the comparisons are vectorized over all pairs of cells at once. Distances are great-circle distances,
+    and the spatial cells have no seam at the antimeridian or the poles.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``. Must include 'timestamp'.
+    distance : float
+        Maximum distance between the fixes of an encounter, in m
+    time_window : str or pandas.Timedelta
+        Maximum time difference between the fixes of an encounter, e.g. "15min"
+    by : str, optional
+        Column identifying the individual of each point, by default "individual_local_identifier"
+    merge : bool, optional
+        If True (default), contacts between the same two individuals are merged into encounter events, which continue
+        as long as the contacts are no more than ``time_window`` apart. If False, every pair of fixes in contact is
+        returned.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Encounter events, with columns ``<by>_1`` and ``<by>_2`` (the two individuals, in order of their first
+        appearance in the tracks), ``start`` and ``end`` (the first and last timestamp of the fixes in contact),
+        ``contacts`` (the number of pairs of fixes in contact) and ``min_distance`` (m). If ``merge`` is False, the
+        pairs of fixes in contact instead, with columns ``<by>_1``, ``<by>_2``, ``index_1`` and ``index_2`` (the
+        index labels of the fixes in the tracks), ``timestamp_1``, ``timestamp_2`` and ``distance`` (m).
+    """
+    if distance <= 0:
+        raise ValueError(f"detect_encounters: distance must be positive, not {distance!r}")
+    window = pd.to_timedelta(time_window).total_seconds()
+    if window <= 0:
+        raise ValueError(f"detect_encounters: time_window must be a positive time step, not {time_window!r}")
+    if by not in tracks.columns:
+        raise KeyError(f"tracks must contain {by}.")
+
+    codes, individuals = pd.factorize(tracks[by])
+    lon, lat = _track_lonlat(tracks)
+    seconds = _track_seconds(tracks)
+    fixes = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat) & np.isfinite(seconds) & (codes >= 0))
+    codes, seconds = codes[fixes], seconds[fixes]
+    lon, lat = np.radians(lon[fixes]), np.radians(lat[fixes])
+    xyz = np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    # Space-time cells, with the fixes sorted by cell. The chord length of the distance is the cell size, so fixes in
+    # contact are at most one cell apart in each dimension.
+    cell_size = 2 * np.sin(min(distance / EARTH_RADIUS, np.pi) / 2)
+    cell_keys = [np.floor(seconds / window).astype(np.int64), *np.floor(xyz / cell_size).astype(np.int64)]
+    cell_ids, neighbours, exact = _space_time_cells(cell_keys)
+    order = np.argsort(cell_ids, kind="stable")
+    cell_sizes = np.bincount(cell_ids)
+    cell_starts = np.cumsum(cell_sizes) - cell_sizes
+
+    first, second = [], []
+    for offset in _encounter_cell_offsets():
+        if any(offset):
+            neighbour = neighbours(offset)
+            cell_a = np.flatnonzero(neighbour >= 0)
+            cell_b = neighbour[cell_a]
+        else:
+            cell_a = cell_b = np.flatnonzero(cell_sizes > 1)
+        for i, j in _cell_pairs(cell_starts[cell_a], cell_sizes[cell_a], cell_starts[cell_b], cell_sizes[cell_b]):
+            i, j = order[i], order[j]
+            keep = (codes[i] != codes[j]) & (np.abs(seconds[i] - seconds[j]) <= window)
+            if not any(offset):
+                keep &= i < j
+            i, j = i[keep], j[keep]
+            close = ((xyz[:, i] - xyz[:, j]) ** 2).sum(axis=0) <= cell_size**2
+            first.append(i[close])
+            second.append(j[close])
+
+    # Order each pair by individual, and then by time
+    i, j = np.concatenate(first), np.concatenate(second)
+    swap = codes[i] > codes[j]
+    i, j = np.where(swap, j, i), np.where(swap, i, j)
+    if not exact:
+        pairs = np.unique(i.astype(np.int64) * len(codes) + j)
+        i, j = pairs // len(codes), pairs % len(codes)
+    chord = np.sqrt(((xyz[:, i] - xyz[:, j]) ** 2).sum(axis=0))
+    order = np.lexsort((np.minimum(seconds[i], seconds[j]), codes[j], codes[i]))
+    i, j, chord = i[order], j[order], chord[order]
+
+    times = _track_times(tracks)[fixes]
+    contacts = pd.DataFrame(
+        {
+            f"{by}_1": individuals.take(codes[i]),
+            f"{by}_2": individuals.take(codes[j]),
+            "index_1": tracks.index.take(fixes[i]),
+            "index_2": tracks.index.take(fixes[j]),
+            "timestamp_1": times[i],
+            "timestamp_2": times[j],
+            "distance": 2 * EARTH_RADIUS * np.arcsin(np.clip(chord / 2, 0, 1)),
+        }
+    )
+    if not merge:
+        return contacts
+
+    # A new event starts when the pair changes, or after a gap of more than the time window since the pair's last
+    # contact
+    start, end = np.minimum(seconds[i], seconds[j]), np.maximum(seconds[i], seconds[j])
+    pair = codes[i].astype(np.int64) * len(individuals) + codes[j]
+    new_pair = np.diff(pair, prepend=-1) != 0
+    latest_end = pd.Series(end).groupby(pair).cummax().to_numpy()
+    gap = np.ones(len(end), dtype=bool)
+    gap[1:] = start[1:] - latest_end[:-1] > window
+    event_ids = np.cumsum(new_pair | gap) - 1
+
+    start_times = np.where(seconds[i] <= seconds[j], contacts["timestamp_1"], contacts["timestamp_2"])
+    end_times = np.where(seconds[i] <= seconds[j], contacts["timestamp_2"], contacts["timestamp_1"])
+    events = pd.DataFrame(
+        {
+            f"{by}_1": contacts[f"{by}_1"],
+            f"{by}_2": contacts[f"{by}_2"],
+            "start": start_times,
+            "end": end_times,
+            "distance": contacts["distance"],
+            "event": event_ids,
+        }
+    )
+    return (
+        events.groupby("event", sort=True)
+        .agg(
+            **{
+                f"{by}_1": (f"{by}_1", "first"),
+                f"{by}_2": (f"{by}_2", "first"),
+                "start": ("start", "min"),
+                "end": ("end", "max"),
+                "contacts": ("distance", "size"),
+                "min_distance": ("distance", "min"),
+            }
+        )
+        .reset_index(drop=True)
+    )
+
+
+def _encounter_cell_offsets():
+    """
+    Offsets (time, x, y, z) of the neighbouring cells to compare each space-time cell with, for ``detect_encounters``.
+
+    Only half of the neighbours are included (the cell itself, and the neighbours after it in lexicographic order), so
+    each pair of neighbouring cells is compared once.
+    """
+    offsets = [np.array(offset) - [0, 1, 1, 1] for offset in np.ndindex(2, 3, 3, 3)]
+    return [tuple(offset) for offset in offsets if tuple(offset) >= (0, 0, 0, 0)]
+
+
+def _space_time_cells(keys):
+    """
+    Cell number of each point from its integer cell coordinates, a function giving the number of the neighbouring
+    cell of each cell at an offset (or -1 if that cell is empty), and whether the cells are exact.
+
+    The cell coordinates are packed into a single integer, so the neighbours are found with a binary search of the
+    sorted cells. If the grid has too many cells to pack, the coordinates are hashed linearly instead (so the hash of a
+    neighbour is still the hash of the cell plus the hash of the offset). Cells with the same hash are then merged,
+    which only adds pairs of points to compare, but can also repeat pairs.
+    """
+    # Pad each dimension by a cell, so the neighbours of every cell are inside the packed grid
+    mins = [k.min() - 1 if len(k) else 0 for k in keys]
+    sizes = [int(k.max() - k.min()) + 3 if len(k) else 1 for k in keys]
+    exact = np.prod(sizes, dtype=float) < 2**63
+    if exact:
+        strides = np.cumprod([1, *sizes[:0:-1]])[::-1].astype(np.uint64)
+    else:
+        strides = np.array(_CELL_HASH_MULTIPLIERS[: len(keys)], dtype=np.uint64)
+
+    # Unsigned integers wrap around on overflow, which makes the packing a hash for large grids
+    packed = np.zeros(len(keys[0]), dtype=np.uint64)
+    for k, k_min, stride in zip(keys, mins, strides):
+        packed += (k - k_min).astype(np.uint64) * stride
+    cells, cell_ids = np.unique(packed, return_inverse=True)
+
+    def neighbours(offset):
+        shifted = cells + (np.array(offset, dtype=np.int64).astype(np.uint64) * strides).sum(dtype=np.uint64)
+        idx = np.minimum(np.searchsorted(cells, shifted), max(len(cells) - 1, 0))
+        return np.where(cells[idx] == shifted, idx, -1) if len(cells) else idx
+
+    return cell_ids, neighbours, exact
+
+
+def _cell_pairs(starts_a, sizes_a, starts_b, sizes_b, batch_size=10_000_000):
+    """
+    Positions of all pairs of points between pairs of cells, given the start and size of the (sorted) points of each
+    cell. The pairs are yielded in batches of whole pairs of cells, of about ``batch_size`` pairs of points.
+    """
+    npairs = sizes_a * sizes_b
+    ends = np.cumsum(npairs)
+    bounds = np.unique(np.searchsorted(ends, np.arange(batch_size, ends[-1] if len(ends) else 0, batch_size)))
+    for first, last in zip([0, *(bounds + 1)], [*(bounds + 1), len(npairs)]):
+        batch_pairs = npairs[first:last]
+        pair_cells = first + np.repeat(np.arange(len(batch_pairs)), batch_pairs)
+        k = np.arange(batch_pairs.sum()) - np.repeat(np.cumsum(batch_pairs) - batch_pairs, batch_pairs)
+        batch_sizes_b = sizes_b[pair_cells]
+        yield starts_a[pair_cells] + k // batch_sizes_b, starts_b[pair_cells] + k % batch_sizes_b
+
+
+def home_ranges(
+    tracks,
+    method="kde",
+    levels=(50, 95),
+    by="individual_local_identifier",
+    bandwidth=None,
+    cell_size=None,
+    crs=None,
+    max_workers=None,
+    grid="individual",
+):
+    """
+    Estimate the home range of each individual, as minimum convex polygons (MCP) or kernel density (KDE) isopleths.
+
+    The points are projected to a metric CRS first. MCPs at a level of p% are the convex hulls of the p% of the points
+    of each individual closest to its centroid, computed for all individuals at once with ``get_tracks_extent``.
+
+    KDEs use Gaussian kernels with a bandwidth per individual. The points of each individual are binned on a grid, and
+    the binned counts are convolved with the kernel by FFT. By default, each individual has a grid with a cell size
+    that resolves its own kernel. With ``grid='shared'``, all individuals are evaluated on windows of one grid, so
+    that their utilisation distributions can be compared cell by cell, at the cost of coarser kernels for the
+    individuals with the smallest bandwidths if the home ranges differ a lot in size. The isopleth at a level of p% is
+    the smallest area containing p% of the density. The individuals are processed in parallel in a process pool.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``
+    method : str, optional
+        Either 'kde' or 'mcp', by default 'kde'
+    levels : float or list of float, optional
+        Percentages of the points (MCP) or of the density (KDE) included in the home ranges, by default (50, 95)
+    by : str, optional
+        Column identifying the individual of each point, by default "individual_local_identifier"
+    bandwidth : float, optional
+        KDE bandwidth (standard deviation of the kernel) in m, for all individuals. By default, the reference bandwidth
+        of each individual, ``sqrt((var(x) + var(y)) / 2) * n ** (-1 / 6)``. Individuals with a bandwidth of zero
+        (e.g. all points at the same location) have no KDE home range.
+    cell_size : float, optional
+        KDE grid cell size in m, for all individuals. By default, a quarter of the bandwidth of each individual, but not
+        less than 1/2000 of the extent of its grid window. With ``grid='shared'``, a quarter of the smallest
+        bandwidth, but not less than 1/2000 of the largest extent of an individual's grid window.
+    crs : Any, optional
+        Metric CRS to compute the home ranges in. By default the UTM zone at the center of the tracks. For tracks that
+        span several UTM zones, an equal-area CRS for the region is better.
+    max_workers : int, optional
+        Maximum number of processes for KDE. By default None, which uses the number of processors on the machine. Use 1
+        to process the individuals sequentially in the current process.
+    grid : str, optional
+        KDE grid, either 'individual' (a cell size per individual) or 'shared' (one grid, aligned to multiples of the
+        cell size, for all individuals). By default 'individual'.
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Home ranges in the track CRS (EPSG:4326), with columns ``by``, ``method``, ``level`` and ``area_km2`` (the area
+        in the metric CRS, in km²), sorted by individual and level
+    """
+    if method not in ("kde", "mcp"):
+        raise ValueError(f"home_ranges: method must be 'kde' or 'mcp', not {method!r}")
+    if grid not in ("individual", "shared"):
+        raise ValueError(f"home_ranges: grid must be 'individual' or 'shared', not {grid!r}")
+    levels = np.atleast_1d(np.asarray(levels, dtype=float))
+    if np.any((levels <= 0) | (levels > 100)):
+        raise ValueError(f"home_ranges: levels must be percentages in (0, 100], not {levels.tolist()}")
+    if by not in tracks.columns:
+        raise KeyError(f"tracks must contain {by}.")
+
+    codes, individuals = pd.factorize(tracks[by])
+    lon, lat = _track_lonlat(tracks)
+    valid = np.isfinite(lon) & np.isfinite(lat) & (codes >= 0)
+    lon, lat, codes = lon[valid], lat[valid], codes[valid]
+    crs = crs if crs is not None else _utm_crs(lon, lat)
+    x, y = Transformer.from_crs(TRACK_CRS, crs, always_xy=True).transform(lon, lat)
+
+    if method == "mcp":
+        result = _mcp_home_ranges(x, y, codes, len(individuals), levels, crs)
+    else:
+        result = _kde_home_ranges(x, y, codes, len(individuals), levels, bandwidth, cell_size, grid, max_workers)
+
+    home_range = gpd.GeoDataFrame(
+        {
+            by: individuals.take(result["codes"]),
+            "method": method,
+            "level": result["levels"],
+            "area_km2": result["geometry"].area.to_numpy() / 1e6,
+        },
+        geometry=result["geometry"].set_crs(crs, allow_override=True).to_crs(TRACK_CRS).to_numpy(),
+        crs=TRACK_CRS,
+    )
+    return home_range.iloc[np.lexsort((home_range.level, result["codes"]))].reset_index(drop=True)
+
+
+def _mcp_home_ranges(x, y, codes, ngroups, levels, crs):
+    """
+    Minimum convex polygons of groups of projected points, at each level.
+    """
+    counts = np.bincount(codes, minlength=ngroups)
+    with np.errstate(invalid="ignore"):
+        centroid_x = np.bincount(codes, x, minlength=ngroups) / counts
+        centroid_y = np.bincount(codes, y, minlength=ngroups) / counts
+    distance = np.hypot(x - centroid_x[codes], y - centroid_y[codes])
+
+    # Rank of each point by its distance from the centroid of its group
+    order = np.lexsort((distance, codes))
+    rank = np.empty(len(x), dtype=np.int64)
+    rank[order] = np.arange(len(x)) - (np.cumsum(counts) - counts)[codes[order]]
+
+    result = {"codes": [], "levels": [], "geometry": []}
+    for level in levels:
+        keep = rank < np.ceil(level / 100 * counts[codes])
+        # Only the points that can be on the hulls need point geometries
+        keep[keep] = _group_hull_candidates(x[keep], y[keep], codes[keep], ngroups)
+        points = gpd.GeoDataFrame({"group": codes[keep]}, geometry=gpd.points_from_xy(x[keep], y[keep]), crs=crs)
+        extent = get_tracks_extent(points, boundary_shape="convex_hull", by="group")
+        result["codes"].append(extent["group"].to_numpy())
+        result["levels"].append(np.full(len(extent), level))
+        result["geometry"].append(extent.geometry.to_numpy())
+    return {
+        "codes": np.concatenate(result["codes"]),
+        "levels": np.concatenate(result["levels"]),
+        "geometry": gpd.GeoSeries(np.concatenate(result["geometry"]), crs=crs),
+    }
+
+
+def _kde_home_ranges(x, y, codes, ngroups, levels, bandwidth, cell_size, grid, max_workers):
+    """
+    Kernel density isopleths of groups of projected points, at each level, each on a grid of its own cell size or on
+    a shared grid.
+    """
+    order = np.argsort(codes, kind="stable")
+    splits = np.searchsorted(codes[order], np.arange(1, ngroups))
+    group_x, group_y = np.split(x[order], splits), np.split(y[order], splits)
+
+    if bandwidth is None:
+        # Reference bandwidths of all groups at once
+        counts = np.bincount(codes, minlength=ngroups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            dx = x - (np.bincount(codes, x, minlength=ngroups) / counts)[codes]
+            dy = y - (np.bincount(codes, y, minlength=ngroups) / counts)[codes]
+            variance = np.bincount(codes, dx**2 + dy**2, minlength=ngroups) / counts
+            bandwidths = np.nan_to_num(np.sqrt(variance / 2) * counts ** (-1 / 6))
+    else:
+        bandwidths = np.full(ngroups, float(bandwidth))
+    groups = np.flatnonzero(bandwidths > 0)
+    if not len(groups):
+        return {"codes": np.zeros(0, dtype=np.int64), "levels": np.zeros(0), "geometry": gpd.GeoSeries([])}
+
+    if cell_size is None:
+        # Each group gets a grid that resolves its own kernel, without growing beyond a bounded number of cells
+        extents = [max(np.ptp(group_x[g]), np.ptp(group_y[g])) + 2 * KDE_KERNEL_RADIUS * bandwidths[g] for g in groups]
+        cell_sizes = np.maximum(bandwidths[groups] / 4, np.array(extents) / 2000)
+        if grid == "shared":
+            cell_sizes[:] = max(bandwidths[groups].min() / 4, max(extents) / 2000)
+    else:
+        cell_sizes = np.full(len(groups), float(cell_size))
+
+    isopleths = functools.partial(_kde_isopleths, levels=levels)
+    args = ([group_x[g] for g in groups], [group_y[g] for g in groups], bandwidths[groups], cell_sizes)
+    if len(groups) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            geometries = list(executor.map(isopleths, *args))
+    else:
+        geometries = list(map(isopleths, *args))
+
+    return {
+        "codes": np.repeat(groups, len(levels)),
+        "levels": np.tile(levels, len(groups)),
+        "geometry": gpd.GeoSeries([geometry for group in geometries for geometry in group]),
+    }
+
+
+def _kde_isopleths(x, y, bandwidth, cell_size, levels):
+    """
+    Kernel density isopleths of a set of projected points, at each level.
+
+    The density is computed on the window of the grid of cells (aligned to multiples of ``cell_size``) that covers the
+    points and their kernels.
+    """
+    radius = KDE_KERNEL_RADIUS * bandwidth
+    x0 = np.floor((x.min() - radius) / cell_size) * cell_size
+    y0 = np.floor((y.min() - radius) / cell_size) * cell_size
+    nx = int(np.ceil((x.max() + radius - x0) / cell_size)) + 1
+    ny = int(np.ceil((y.max() + radius - y0) / cell_size)) + 1
+    ix = ((x - x0) / cell_size).astype(np.int64)
+    iy = ((y - y0) / cell_size).astype(np.int64)
+    counts = np.bincount(iy * nx + ix, minlength=ny * nx).reshape(ny, nx).astype(float)
+
+    # Gaussian kernel sampled at the cell centers, convolved with the counts by FFT
+    k = int(np.ceil(radius / cell_size))
+    kernel_1d = np.exp(-0.5 * (np.arange(-k, k + 1) * cell_size / bandwidth) ** 2)
+    kernel = np.outer(kernel_1d, kernel_1d)
+    fft_shape = (ny + 2 * k, nx + 2 * k)
+    density = np.fft.irfft2(np.fft.rfft2(counts, fft_shape) * np.fft.rfft2(kernel, fft_shape), fft_shape)
+    density = np.clip(density[k : k + ny, k : k + nx], 0, None)
+    density /= density.sum()
+
+    # The isopleth of each level contains the cells of highest density, up to that fraction of the total density
+    sorted_density = np.sort(density.ravel())[::-1]
+    cumulative = np.cumsum(sorted_density)
+    transform = Affine(cell_size, 0, x0, 0, -cell_size, y0 + ny * cell_size)
+    geometries = []
+    for level in levels:
+        threshold = sorted_density[min(np.searchsorted(cumulative, level / 100), len(cumulative) - 1)]
+        mask = (density >= threshold)[::-1]
+        cells = rasterio.features.shapes(mask.astype(np.uint8), mask=mask, transform=transform)
+        geometries.append(unary_union([shape(cell) for cell, _ in cells]))
+    return geometries
+
+
+def feature_crossings(
+    tracks, features, by="individual_local_identifier", columns=None, name="feature", chunksize=1_000_000
+):
+    """
+    Find where and when the steps of the tracks cross line features (e.g. roads, fences or rivers from
+    ``subset_data``), and count the crossings of each feature.
+
+    Each step (between consecutive points of an individual) is a straight segment in longitude and latitude. The
+    segments are queried against a spatial index (``shapely.STRtree``) of the features, so that only the segments and
+    features with overlapping bounding boxes are tested for intersection, and the intersections are computed in
+    vectorized shapely calls over all candidate pairs at once. The time of a crossing is interpolated linearly along the
+    step.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``read_track_data``. Must include 'timestamp'.
+    features : geopandas.GeoDataFrame, str or pathlib.Path
+        Line features, or the path of a file to read them from
+    by : str, optional
+        Column identifying the individual of each point, by default "individual_local_identifier". If None, all points
+        are one track.
+    columns : list of str, optional
+        Feature attributes to add to the crossings, by default all of them
+    name : str, optional
+        Prefix of the feature columns added to the crossings, by default "feature"
+    chunksize : int, optional
+        Number of steps queried at a time, by default 1,000,000
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Crossings, one point per crossing of a step and a feature, sorted by individual and time, with columns ``by``,
+        ``index_1`` and ``index_2`` (the index labels of the points at the start and end of the step), ``timestamp``,
+        ``location_long``, ``location_lat``, ``<name>_index`` (the index label of the feature) and ``<name>_<column>``
+        for each feature attribute
+    geopandas.GeoDataFrame
+        The features, with columns ``crossings`` (the number of crossings) and ``individuals`` (the number of
+        individuals crossing the feature)
+
+    Raises
+    ------
+    KeyError
+        Raised if features do not contain the requested columns
+    """
+    if isinstance(features, (str, Path)):
+        features = gpd.read_file(features)
+    if columns is None:
+        columns = [col for col in features.columns if col != features.geometry.name]
+    else:
+        missing = set(columns).difference(features.columns)
+        if missing:
+            raise KeyError(f"feature_crossings: columns {sorted(missing)} not found in features.")
+    if chunksize < 1:
+        raise ValueError(f"feature_crossings: chunksize must be at least 1, not {chunksize!r}")
+
+    tracks, offsets = _sorted_tracks(tracks, by)
+    lon, lat = _track_lonlat(tracks)
+    codes = _group_ids(offsets, len(tracks))
+
+    # Steps between consecutive located points of the same individual
+    valid = np.isfinite(lon) & np.isfinite(lat)
+    is_step = valid[:-1] & valid[1:]
+    is_step[offsets[1:] - 1] = False
+    steps = np.flatnonzero(is_step)
+
+    lines = features.geometry
+    if lines.crs is not None and not lines.crs.equals(TRACK_CRS):
+        lines = lines.to_crs(TRACK_CRS)
+    lines = lines.to_numpy()
+    tree = shapely.STRtree(lines)
+
+    step_ids, feature_ids = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    fractions, crossing_lon, crossing_lat = [np.empty(0)], [np.empty(0)], [np.empty(0)]
+    for start in range(0, len(steps), chunksize):
+        chunk = steps[start : start + chunksize]
+        x0, y0, x1, y1 = lon[chunk], lat[chunk], lon[chunk + 1], lat[chunk + 1]
+        segments = shapely.linestrings(np.stack([np.column_stack([x0, y0]), np.column_stack([x1, y1])], axis=1))
+        candidates, feature = tree.query(segments, predicate="intersects")
+
+        # A step can cross a feature several times. Each crossing is located at the first point of the part of the
+        # intersection (a point, or a segment where the step runs along the feature).
+        intersections = shapely.intersection(segments[candidates], lines[feature])
+        parts, part_ids = shapely.get_parts(intersections, return_index=True)
+        coords, coord_ids = shapely.get_coordinates(parts, return_index=True)
+        first = np.unique(coord_ids, return_index=True)[1]
+        coords, part_ids = coords[first], part_ids[coord_ids[first]]
+        candidates = candidates[part_ids]
+
+        dx, dy = x1[candidates] - x0[candidates], y1[candidates] - y0[candidates]
+        length2 = dx**2 + dy**2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = ((coords[:, 0] - x0[candidates]) * dx + (coords[:, 1] - y0[candidates]) * dy) / length2
+        fraction = np.where(length2 > 0, np.clip(fraction, 0, 1), 0)
+
+        step_ids.append(chunk[candidates])
+        feature_ids.append(feature[part_ids])
+        fractions.append(fraction)
+        crossing_lon.append(coords[:, 0])
+        crossing_lat.append(coords[:, 1])
+
+    step_ids, feature_ids, fraction = np.concatenate(step_ids), np.concatenate(feature_ids), np.concatenate(fractions)
+    crossing_lon, crossing_lat = np.concatenate(crossing_lon), np.concatenate(crossing_lat)
+    order = np.lexsort((feature_ids, fraction, step_ids))
+    step_ids, feature_ids, fraction = step_ids[order], feature_ids[order], fraction[order]
+
+    times = _track_times(tracks)
+    duration = pd.to_timedelta(times[step_ids + 1] - times[step_ids])
+    crossings = pd.DataFrame(
+        {
+            "index_1": tracks.index.take(step_ids),
+            "index_2": tracks.index.take(step_ids + 1),
+            "timestamp": times[step_ids] + (duration * fraction).round("ns"),
+            "location_long": crossing_lon[order],
+            "location_lat": crossing_lat[order],
+            f"{name}_index": features.index.take(feature_ids),
+        }
+    )
+    if by is not None:
+        crossings.insert(0, by, tracks[by].to_numpy()[step_ids])
+    for col in columns:
+        crossings[f"{name}_{col}"] = features[col].take(feature_ids).array
+
+    counts = features.copy(deep=False)
+    counts["crossings"] = np.bincount(feature_ids, minlength=len(features))
+    ngroups = len(offsets)
+    individuals = np.unique(feature_ids * ngroups + codes[step_ids]) // max(ngroups, 1)
+    counts["individuals"] = np.bincount(individuals, minlength=len(features))
+    return _tracks_to_gdf(crossings), counts
+
+
+def _step_metrics(lon, lat, seconds, offsets):
+    """
+    Step metrics of points given as coordinate and time arrays, with groups starting at ``offsets``.
+    """
+    step_length = np.full(len(lon), np.nan)
+    step_duration = np.full(len(lon), np.nan)
+    heading = np.full(len(lon), np.nan)
+
+    # Haversine distances and initial bearings, sharing the trigonometric functions of the coordinates
+    lat = np.radians(lat)
+    cos_lat, sin_lat = np.cos(lat), np.sin(lat)
+    dlon = np.diff(np.radians(lon))
+    a = np.sin(np.diff(lat) / 2) ** 2 + cos_lat[:-1] * cos_lat[1:] * np.sin(dlon / 2) ** 2
+    step_length[1:] = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    step_duration[1:] = np.diff(seconds)
+    heading[1:] = (
+        np.degrees(
+            np.arctan2(
+                np.sin(dlon) * cos_lat[1:],
+                cos_lat[:-1] * sin_lat[1:] - sin_lat[:-1] * cos_lat[1:] * np.cos(dlon),
+            )
+        )
+        % 360
+    )
+
+    # The first point of each group has no step
+    step_length[offsets] = np.nan
+    step_duration[offsets] = np.nan
+    heading[offsets] = np.nan
+    heading[step_length == 0] = np.nan
+
+    turning_angle = np.full(len(lon), np.nan)
+    turning_angle[1:] = (heading[1:] - heading[:-1] + 180) % 360 - 180
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = step_length / step_duration
+    speed[step_duration <= 0] = np.nan
+
+    return dict(
+        step_length=step_length,
+        step_duration=step_duration,
+        speed=speed,
+        heading=heading,
+        turning_angle=turning_angle,
+    )
+
+
+def bearing(lon1, lat1, lon2, lat2):
+    """
+    Initial great-circle bearing from start points to end points.
+
+    Parameters
+    ----------
+    lon1, lat1 : float or numpy.ndarray
+        Longitudes and latitudes of the start points, in degrees
+    lon2, lat2 : float or numpy.ndarray
+        Longitudes and latitudes of the end points, in degrees
+
+    Returns
+    -------
+    float or numpy.ndarray
+        Bearings in degrees clockwise from north, in [0, 360)
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(a) for a in (lon1, lat1, lon2, lat2))
+    dlon = lon2 - lon1
+    y = np.sin(dlon) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+def _destination_points(lon, lat, heading, distance):
+    """
+    End points of great-circle moves from start points (degrees) with initial headings (degrees) and distances (m).
+    """
+    lon, lat, heading = np.radians(lon), np.radians(lat), np.radians(heading)
+    angle = distance / EARTH_RADIUS
+    end_lat = np.arcsin(np.sin(lat) * np.cos(angle) + np.cos(lat) * np.sin(angle) * np.cos(heading))
+    end_lon = lon + np.arctan2(
+        np.sin(heading) * np.sin(angle) * np.cos(lat), np.cos(angle) - np.sin(lat) * np.sin(end_lat)
+    )
+    return (np.degrees(end_lon) + 180) % 360 - 180, np.degrees(end_lat)
+
+
+def _group_blocks(offsets, n, nblocks):
+    """
+    Split n points into at most ``nblocks`` contiguous blocks of about equal size, without splitting groups.
+    """
+    if nblocks <= 1 or not len(offsets):
+        return [(0, n)]
+    targets = np.linspace(0, n, nblocks + 1)[1:-1]
+    starts = offsets[np.minimum(np.searchsorted(offsets, targets), len(offsets) - 1)]
+    bounds = np.unique(np.concatenate([[0], starts, [n]]))
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
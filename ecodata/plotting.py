@@ -3,6 +3,7 @@ import hvplot.xarray  # noqa
 import param
 import panel as pn
 from ecodata.panel_utils import param_widget
+from ecodata.functions import _display_points
 import geoviews as gv
 
 map_tile_options = list(gv.tile_sources.tile_sources.keys())
@@ -25,13 +26,16 @@ map_tile_options = list(gv.tile_sources.tile_sources.keys())
 
 
 def plot_tracks_with_tiles(
-    tracks, tiles="StamenTerrain", datashade=True, cmap="fire", c="r", marker="circle", alpha=0.3
+    tracks, tiles="StamenTerrain", datashade=True, cmap="fire", c="r", marker="circle", alpha=0.3, max_points=None
 ):
     """
     Hvplot map of tracks with background map tiles
-    """
 
-    plot = tracks.hvplot.points(
+    If ``max_points`` is specified, at most that many points are plotted: tracks are simplified per individual (see
+    ``ecodata.simplify_tracks``), using their ``detail`` column if they have one, or evenly subsampled if
+    they have no timestamps.
+    """
+    plot = _display_points(tracks, max_points).hvplot.points(
         "location_long",
         "location_lat",
         geo=True,
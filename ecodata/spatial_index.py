@@ -0,0 +1,354 @@
+"""
+Spatial index for track points.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pyarrow.parquet as pq
+from pyproj.crs import CRS
+
+from ecodata.functions import TRACK_CRS, cache_track_data
+
+# Average number of points per grid cell when the cell size isn't specified
+POINTS_PER_CELL = 16
+
+
+class PointIndex:
+    """
+    Packed grid index of points, for fast bounding box, polygon and nearest neighbour queries.
+
+    The points are binned on a regular grid and stored sorted by grid cell, with the offset of the first point of each
+    cell. The points of a row of cells are then stored contiguously, so a bounding box query only reads one slice of
+    the points per row of cells.
+
+    Queries return the positions of the points in the original input (e.g. for use with ``GeoDataFrame.iloc``).
+    Points with missing coordinates are not indexed.
+
+    Parameters
+    ----------
+    x : array-like
+        x coordinates (e.g. longitudes) of the points
+    y : array-like
+        y coordinates (e.g. latitudes) of the points
+    cell_size : float, optional
+        Size of the grid cells, in the units of the coordinates. By default, the cell size is chosen so that there are
+        about ``POINTS_PER_CELL`` points per cell on average.
+    crs : Any, optional
+        Coordinate reference system of the points, by default None
+    """
+
+    def __init__(self, x, y, cell_size=None, crs=None):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        valid = np.isfinite(x) & np.isfinite(y)
+        positions = np.flatnonzero(valid)
+        x, y = x[valid], y[valid]
+
+        if len(x):
+            xmin, ymin, xmax, ymax = x.min(), y.min(), x.max(), y.max()
+        else:
+            xmin = ymin = xmax = ymax = 0.0
+        if cell_size is None:
+            cell_size = _default_cell_size(xmax - xmin, ymax - ymin, len(x))
+
+        self.crs = crs
+        self.bounds = (float(xmin), float(ymin), float(xmax), float(ymax))
+        self.cell_size = float(cell_size)
+        self.origin = (float(xmin), float(ymin))
+        self.shape = (int((xmax - xmin) // self.cell_size) + 1, int((ymax - ymin) // self.cell_size) + 1)
+
+        cells = self._cell_ids(x, y)
+        order = np.argsort(cells, kind="stable")
+        self.x = x[order]
+        self.y = y[order]
+        self.positions = positions[order]
+        self.offsets = np.searchsorted(cells[order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def __len__(self):
+        return len(self.x)
+
+    def __repr__(self):
+        return f"PointIndex({len(self)} points, {self.shape[0]}x{self.shape[1]} cells of size {self.cell_size:g})"
+
+    @classmethod
+    def from_tracks(cls, tracks, cell_size=None):
+        """
+        Create an index of the points of a GeoDataFrame of track data.
+
+        Parameters
+        ----------
+        tracks : geopandas.GeoDataFrame or geopandas.GeoSeries
+            Track points
+        cell_size : float, optional
+            Size of the grid cells, in the units of the track CRS. By default chosen from the number of points.
+
+        Returns
+        -------
+        PointIndex
+            Index of the track points
+        """
+        return cls(tracks.geometry.x.to_numpy(), tracks.geometry.y.to_numpy(), cell_size=cell_size, crs=tracks.crs)
+
+    def query_bbox(self, bbox):
+        """
+        Find the points within a bounding box (including its edges).
+
+        Parameters
+        ----------
+        bbox : list or tuple
+            Bounding box, specified as ``(xmin, ymin, xmax, ymax)``
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted positions of the points within the bounding box
+        """
+        return np.sort(self.positions[self._query_bbox(bbox)])
+
+    def query_polygon(self, polygon):
+        """
+        Find the points within a polygon (including its boundary).
+
+        Parameters
+        ----------
+        polygon : shapely.geometry.Polygon or shapely.geometry.MultiPolygon
+            Polygon, in the CRS of the index
+
+        Returns
+        -------
+        numpy.ndarray
+            Sorted positions of the points within the polygon
+        """
+        idx = self._query_bbox(polygon.bounds)
+        points = gpd.GeoSeries(gpd.points_from_xy(self.x[idx], self.y[idx]))
+        return np.sort(self.positions[idx[points.intersects(polygon).to_numpy()]])
+
+    def nearest(self, x, y, k=1):
+        """
+        Find the k nearest points to each of a set of query points, using planar distances in the units of the CRS.
+
+        Parameters
+        ----------
+        x : float or array-like
+            x coordinates of the query points
+        y : float or array-like
+            y coordinates of the query points
+        k : int, optional
+            Number of nearest points to find, by default 1
+
+        Returns
+        -------
+        numpy.ndarray
+            Positions of the nearest points, with shape ``(n_queries, k)``, ordered by distance. Positions are -1 if
+            there are fewer than k indexed points.
+        numpy.ndarray
+            Distances to the nearest points, with shape ``(n_queries, k)``. Distances are inf if there are fewer than k
+            indexed points.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        positions = np.full((len(x), k), -1, dtype=np.int64)
+        distances = np.full((len(x), k), np.inf)
+        if not len(self):
+            return positions, distances
+
+        # Search a box around each query, starting from a radius expected to contain about k points (from the number of
+        # points in the query's cell), and double the radius of the queries with fewer than k points within it. All of
+        # the unresolved queries are searched together in each round.
+        queries = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        cells = self._cell_ids(x[queries], y[queries])
+        cell_counts = np.diff(self.offsets)[cells]
+        radius = self.cell_size * np.minimum(np.sqrt(2 * k / np.maximum(cell_counts, 1)), 1)
+        while len(queries):
+            query_ids, idx = self._query_boxes(x[queries], y[queries], radius)
+            dist = np.hypot(self.x[idx] - x[queries][query_ids], self.y[idx] - y[queries][query_ids])
+
+            # Only the points within the radius are certain to include the k nearest points, unless every point was
+            # searched
+            searched_all = np.bincount(query_ids, minlength=len(queries)) == len(self)
+            keep = (dist <= radius[query_ids]) | searched_all[query_ids]
+            query_ids, idx, dist = query_ids[keep], idx[keep], dist[keep]
+            order = np.lexsort((dist, query_ids))
+            query_ids, idx, dist = query_ids[order], idx[order], dist[order]
+
+            counts = np.bincount(query_ids, minlength=len(queries))
+            starts = np.cumsum(counts) - counts
+            done = (counts >= k) | searched_all
+
+            # Nearest points of the resolved queries, in order of distance
+            n_nearest = np.minimum(counts[done], k)
+            rank = np.arange(n_nearest.sum()) - np.repeat(np.cumsum(n_nearest) - n_nearest, n_nearest)
+            rows = np.repeat(queries[done], n_nearest)
+            taken = np.repeat(starts[done], n_nearest) + rank
+            positions[rows, rank] = self.positions[idx[taken]]
+            distances[rows, rank] = dist[taken]
+
+            queries, radius = queries[~done], radius[~done] * 2
+        return positions, distances
+
+    def save(self, path):
+        """
+        Save the index to a ``.npz`` file.
+
+        Parameters
+        ----------
+        path : str or pathlib.Path
+            Output file path
+        """
+        np.savez(
+            path,
+            x=self.x,
+            y=self.y,
+            positions=self.positions,
+            offsets=self.offsets,
+            grid=np.array([*self.bounds, self.cell_size, *self.shape], dtype=float),
+            crs=np.array("" if self.crs is None else CRS.from_user_input(self.crs).to_wkt()),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with ``PointIndex.save``.
+
+        Parameters
+        ----------
+        path : str or pathlib.Path
+            Path to the ``.npz`` file
+
+        Returns
+        -------
+        PointIndex
+            The loaded index
+        """
+        index = cls.__new__(cls)
+        with np.load(path) as data:
+            index.x = data["x"]
+            index.y = data["y"]
+            index.positions = data["positions"]
+            index.offsets = data["offsets"]
+            xmin, ymin, xmax, ymax, cell_size, nx, ny = data["grid"]
+            crs = str(data["crs"])
+        index.bounds = (xmin, ymin, xmax, ymax)
+        index.origin = (xmin, ymin)
+        index.cell_size = cell_size
+        index.shape = (int(nx), int(ny))
+        index.crs = CRS.from_wkt(crs) if crs else None
+        return index
+
+    def _cell_indices(self, x, y):
+        ix = np.clip(np.floor((np.asarray(x) - self.origin[0]) / self.cell_size), 0, self.shape[0] - 1)
+        iy = np.clip(np.floor((np.asarray(y) - self.origin[1]) / self.cell_size), 0, self.shape[1] - 1)
+        return ix.astype(np.int64), iy.astype(np.int64)
+
+    def _cell_ids(self, x, y):
+        ix, iy = self._cell_indices(x, y)
+        return iy * self.shape[0] + ix
+
+    def _query_bbox(self, bbox, exact=True):
+        """
+        Internal (sorted) indices of the points in the cells overlapping a bounding box. If ``exact`` is True, only the
+        points within the bounding box are returned.
+        """
+        xmin, ymin, xmax, ymax = bbox
+        if (
+            not len(self)
+            or xmax < self.bounds[0]
+            or ymax < self.bounds[1]
+            or xmin > self.bounds[2]
+            or ymin > self.bounds[3]
+        ):
+            return np.empty(0, dtype=np.int64)
+        (ix0, ix1), (iy0, iy1) = self._cell_indices([xmin, xmax], [ymin, ymax])
+
+        # The cells of each row of the grid are stored contiguously
+        rows = np.arange(iy0, iy1 + 1)
+        starts = self.offsets[rows * self.shape[0] + ix0]
+        ends = self.offsets[rows * self.shape[0] + ix1 + 1]
+        idx = _concat_ranges(starts, ends)
+
+        if exact:
+            x, y = self.x[idx], self.y[idx]
+            idx = idx[(x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)]
+        return idx
+
+    def _query_boxes(self, x, y, radius):
+        """
+        Internal (sorted) indices of the points in the cells overlapping the boxes of half-width ``radius`` around a
+        set of query points, as arrays of (query number, point index) pairs.
+        """
+        (ix0, iy0), (ix1, iy1) = self._cell_indices(x - radius, y - radius), self._cell_indices(x + radius, y + radius)
+
+        # The cells of each row of the grid are stored contiguously, so each box is one slice of the points per row
+        nrows = iy1 - iy0 + 1
+        query_rows = np.repeat(np.arange(len(x)), nrows)
+        rows = np.repeat(iy0, nrows) + np.arange(nrows.sum()) - np.repeat(np.cumsum(nrows) - nrows, nrows)
+        starts = self.offsets[rows * self.shape[0] + ix0[query_rows]]
+        ends = self.offsets[rows * self.shape[0] + ix1[query_rows] + 1]
+        return np.repeat(query_rows, ends - starts), _concat_ranges(starts, ends)
+
+
+def track_index(filein, cell_size=None):
+    """
+    Get a spatial index of the points in a Movebank track file.
+
+    The index is built once and saved with the GeoParquet cache of the track file (see
+    ``ecodata.functions.cache_track_data``), so later calls only load it. Positions returned by queries of the index
+    refer to the rows of ``read_track_data(filein, cache=True)``.
+
+    Parameters
+    ----------
+    filein : str or pathlib.Path
+        File path for track data
+    cell_size : float, optional
+        Size of the grid cells, in degrees. By default chosen from the number of points. If specified, the index is
+        rebuilt.
+
+    Returns
+    -------
+    PointIndex
+        Index of the track points
+    """
+    cache_path = cache_track_data(filein)
+    index_path = Path(cache_path) / "_point_index.npz"
+    if index_path.exists() and cell_size is None:
+        return PointIndex.load(index_path)
+
+    coords = pq.read_table(
+        cache_path,
+        columns=["location_long", "location_lat"],
+        schema=pq.read_schema(cache_path / "_common_metadata"),
+        memory_map=True,
+    )
+    index = PointIndex(
+        coords["location_long"].to_numpy(zero_copy_only=False),
+        coords["location_lat"].to_numpy(zero_copy_only=False),
+        cell_size=cell_size,
+        crs=TRACK_CRS,
+    )
+    index.save(index_path)
+    return index
+
+
+def _default_cell_size(width, height, n):
+    """
+    Cell size giving about ``POINTS_PER_CELL`` points per cell, for points spread over an area of width x height.
+    """
+    ncells = max(n / POINTS_PER_CELL, 1)
+    if width > 0 and height > 0:
+        return float(np.sqrt(width * height / ncells))
+    return float(max(width, height) / ncells) or 1.0
+
+
+def _concat_ranges(starts, ends):
+    """
+    Concatenation of ``np.arange(start, end)`` for each pair of starts and ends, without a Python loop.
+    """
+    lengths = ends - starts
+    total = lengths.sum()
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return offsets + np.arange(total)
@@ -1,8 +1,12 @@
 import shutil
 import time
 
+import geopandas as gpd
+import numpy as np
+import pandas as pd
 import panel as pn
 import pytest
+from shapely.geometry import LineString
 
 import ecodata
 from ecodata.app.apps import applications
@@ -76,3 +80,55 @@ def gridded_data_explorer():
 @pytest.fixture
 def subsetter():
     return Subsetter()
+
+
+@pytest.fixture
+def track_csv(tmp_path):
+    """
+    Small synthetic Movebank track export with three individuals spanning two years
+    """
+    rng = np.random.default_rng(42)
+    n = 200
+    dfs = []
+    for i, (lon0, lat0) in enumerate([(-120.0, 55.0), (-118.0, 56.0), (-121.0, 54.0)]):
+        timestamps = pd.date_range("2009-12-20", periods=n, freq="3H") + pd.Timedelta(minutes=7 * i)
+        dfs.append(
+            pd.DataFrame(
+                {
+                    "event-id": np.arange(n) + i * n,
+                    "visible": True,
+                    "timestamp": timestamps.strftime("%Y-%m-%d %H:%M:%S.000"),
+                    "location-long": lon0 + np.cumsum(rng.normal(0, 0.01, n)),
+                    "location-lat": lat0 + np.cumsum(rng.normal(0, 0.01, n)),
+                    "gps:hdop": rng.uniform(0.5, 5, n).round(1),
+                    "sensor-type": "gps",
+                    "individual-taxon-canonical-name": "Rangifer tarandus",
+                    "tag-local-identifier": f"tag{i}",
+                    "individual-local-identifier": f"animal{i}",
+                    "study-name": "Synthetic caribou",
+                    "deployment-id": 100 + i,
+                }
+            )
+        )
+    path = tmp_path / "synthetic_tracks.csv"
+    pd.concat(dfs, ignore_index=True).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def roads_file(tmp_path):
+    """
+    Synthetic road network (GeoJSON) around the tracks of ``track_csv``, with a highway attribute
+    """
+    rng = np.random.default_rng(7)
+    n = 300
+    start = np.column_stack([rng.uniform(-122, -117, n), rng.uniform(53, 57, n)])
+    end = start + rng.normal(0, 0.1, (n, 2))
+    roads = gpd.GeoDataFrame(
+        {"road_id": np.arange(n), "highway": rng.choice(["primary", "secondary", "track"], n)},
+        geometry=[LineString([a, b]) for a, b in zip(start, end)],
+        crs="EPSG:4326",
+    )
+    path = tmp_path / "roads.geojson"
+    roads.to_file(path, driver="GeoJSON")
+    return path
@@ -6,8 +6,14 @@ import pytest
 import requests
 
 import geopandas as gpd
+import holoviews as hv
+import numpy as np
 import panel as pn
 import xarray as xr
+from pyproj import Transformer
+
+import ecodata
+from ecodata.app.apps import tracks_explorer_app
 from ecodata.tests.conftest import test_data_dir
 
 
@@ -32,6 +38,22 @@ def test_track_explorer_load_data(install_test_data, track_explorer):
     assert track_explorer.plot_pane.object is not None
 
 
+def test_track_explorer_plots_simplified_tracks(track_explorer, track_csv, tmp_path, monkeypatch):
+    monkeypatch.setattr(ecodata.functions, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(tracks_explorer_app, "MAX_PLOT_POINTS", 100)
+    track_explorer.ds_checkbox.value = False
+    track_explorer.map_tile.value = "OSM"
+    track_explorer.tracksfile.value = str(track_csv)
+    track_explorer.load_data()
+
+    # The plotted points are the most detailed points of the tracks, in web mercator
+    points = track_explorer.plot_pane.object.traverse(lambda element: element, [hv.Points])[0].data
+    expected = ecodata.simplify_tracks(ecodata.read_track_data(track_csv), max_points=100)
+    x, y = Transformer.from_crs(4326, 3857, always_xy=True).transform(expected.location_long, expected.location_lat)
+    np.testing.assert_allclose(np.sort(points.location_long), np.sort(x))
+    np.testing.assert_allclose(np.sort(points.location_lat), np.sort(y))
+
+
 def test_gridded_data_explorer_load_data(install_test_data, gridded_data_explorer):
     gridded_data_explorer.filein.value = str(test_data_dir / "NASA_public_caribou.nc")
     gridded_data_explorer.load_data()
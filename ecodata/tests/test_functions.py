@@ -0,0 +1,407 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+
+import ecodata
+
+
+def test_read_track_data_chunks_match_full_read(track_csv):
+    tracks = ecodata.read_track_data(track_csv)
+    chunks = list(ecodata.read_track_data(track_csv, chunksize=150))
+
+    assert len(chunks) == 4
+    assert all(isinstance(chunk, gpd.GeoDataFrame) and len(chunk) <= 150 for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks), tracks)
+
+
+def test_read_track_data_chunks_with_dissolve_raises(track_csv):
+    with pytest.raises(ValueError):
+        ecodata.read_track_data(track_csv, dissolve=True, chunksize=100)
+
+
+@pytest.mark.parametrize("boundary_shape", ["rectangular", "convex_hull"])
+def test_get_tracks_extent_from_chunks(track_csv, boundary_shape):
+    extent = ecodata.get_tracks_extent(ecodata.read_track_data(track_csv), boundary_shape=boundary_shape)
+    extent_chunked = ecodata.get_tracks_extent(
+        ecodata.read_track_data(track_csv, chunksize=100), boundary_shape=boundary_shape
+    )
+
+    assert len(extent) == 1
+    assert extent.geometry[0].equals(extent_chunked.geometry[0])
+
+
+def test_read_track_data_from_cache(track_csv, tmp_path, monkeypatch):
+    monkeypatch.setattr(ecodata.functions, "CACHE_DIR", tmp_path / "cache")
+    tracks = ecodata.read_track_data(track_csv)
+    cache_path = ecodata.cache_track_data(track_csv)
+    cached = ecodata.read_track_data(track_csv, cache=True)
+
+    assert ecodata.cache_track_data(track_csv) == cache_path
+    assert cached.crs == tracks.crs
+    assert set(cached.columns) == set(tracks.columns)
+    cached = cached.set_index("event_id").loc[tracks.event_id]
+    assert (cached.location_long.values == tracks.location_long.values).all()
+    assert (cached.timestamp.values == pd.to_datetime(tracks.timestamp).values).all()
+
+    projected = ecodata.read_track_data(track_csv, cache=True, columns=["timestamp"])
+    assert set(projected.columns) == {"timestamp", "location_long", "location_lat", "geometry"}
+
+
+def test_track_cache_is_rebuilt_when_file_changes(track_csv, tmp_path):
+    cache_path = ecodata.cache_track_data(track_csv, cache_dir=tmp_path)
+    pd.read_csv(track_csv).iloc[:10].to_csv(track_csv, index=False)
+    new_cache_path = ecodata.cache_track_data(track_csv, cache_dir=tmp_path)
+
+    assert new_cache_path != cache_path
+    assert not cache_path.exists()
+
+
+def test_track_cache_keeps_similar_individuals_apart(track_csv, tmp_path, monkeypatch):
+    monkeypatch.setattr(ecodata.functions, "CACHE_DIR", tmp_path / "cache")
+    tracks = pd.read_csv(track_csv)
+    tracks["individual-local-identifier"] = np.where(tracks.index % 2, "bird 1", "bird_1")
+    tracks.to_csv(track_csv, index=False)
+
+    cached = ecodata.read_track_data(track_csv, cache=True)
+
+    assert len(cached) == len(tracks)
+    assert cached.individual_local_identifier.value_counts().to_dict() == {"bird 1": 300, "bird_1": 300}
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_read_track_data_with_filters(track_csv, tmp_path, monkeypatch, cache):
+    monkeypatch.setattr(ecodata.functions, "CACHE_DIR", tmp_path / "cache")
+    tracks = ecodata.read_track_data(track_csv)
+    timestamps = pd.to_datetime(tracks.timestamp)
+    bbox = (-121, 54, -118.5, 56)
+    expected = tracks[
+        (timestamps >= "2010-01-01")
+        & (timestamps <= "2010-01-10")
+        & tracks.individual_local_identifier.isin(["animal0", "animal2"])
+        & tracks.location_long.between(bbox[0], bbox[2])
+        & tracks.location_lat.between(bbox[1], bbox[3])
+    ]
+    filters = dict(start_time="2010-01-01", end_time="2010-01-10", individuals=["animal0", "animal2"], bbox=bbox)
+
+    filtered = ecodata.read_track_data(track_csv, cache=cache, **filters)
+    chunks = list(ecodata.read_track_data(track_csv, cache=cache, chunksize=50, columns=["event_id"], **filters))
+
+    assert 0 < len(expected) < len(tracks)
+    assert sorted(filtered.event_id) == sorted(expected.event_id)
+    assert sorted(pd.concat(chunks).event_id) == sorted(expected.event_id)
+    assert set(chunks[0].columns) == {"event_id", "location_long", "location_lat", "geometry"}
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_read_track_data_compact(track_csv, tmp_path, monkeypatch, capsys, cache):
+    monkeypatch.setattr(ecodata.functions, "CACHE_DIR", tmp_path / "cache")
+    tracks = ecodata.read_track_data(track_csv)
+    compact = ecodata.read_track_data(track_csv, cache=cache, compact=True, report=True)
+
+    assert "MB saved" in capsys.readouterr().out
+    assert isinstance(compact.individual_local_identifier.dtype, pd.CategoricalDtype)
+    assert compact.gps_hdop.dtype == "float32"
+    assert compact.location_long.dtype == "float64"
+    assert pd.api.types.is_datetime64_any_dtype(compact.timestamp)
+    assert compact.memory_usage(deep=True).sum() < tracks.memory_usage(deep=True).sum()
+    assert set(compact.individual_local_identifier) == set(tracks.individual_local_identifier)
+
+
+def test_read_track_data_compact_chunks_keep_categories(track_csv, monkeypatch):
+    monkeypatch.setattr(ecodata.functions, "_FILTER_CHUNKSIZE", 150)
+    compact = ecodata.read_track_data(track_csv, compact=True, individuals=["animal0", "animal2"])
+
+    assert isinstance(compact.individual_local_identifier.dtype, pd.CategoricalDtype)
+    assert set(compact.individual_local_identifier) == {"animal0", "animal2"}
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_combine_studies(track_csv, tmp_path, max_workers):
+    other_csv = tmp_path / "other_tracks.csv"
+    other = pd.read_csv(track_csv)
+    other["individual-local-identifier"] = "other_" + other["individual-local-identifier"]
+    other.to_csv(other_csv, index=False)
+    in_memory = ecodata.read_track_data(track_csv, compact=True)
+
+    combined = ecodata.combine_studies([track_csv, in_memory, other_csv], max_workers=max_workers, compact=True)
+
+    assert isinstance(combined, gpd.GeoDataFrame)
+    assert combined.crs == in_memory.crs
+    assert len(combined) == 3 * len(in_memory)
+    assert isinstance(combined.individual_local_identifier.dtype, pd.CategoricalDtype)
+    assert combined.individual_local_identifier.nunique() == 6
+    assert (combined.geometry.x.values == combined.location_long.values).all()
+
+
+def test_combine_studies_keeps_categoricals_and_geometries(track_csv):
+    tracks = ecodata.read_track_data(track_csv)
+    first = tracks.iloc[:300].astype({"individual_local_identifier": "category"})
+    # An edited, projected geometry is kept, and reprojected to the CRS of the first study
+    second = tracks.iloc[300:].to_crs(3857)
+    second.geometry = second.geometry.translate(1000, 0)
+
+    combined = ecodata.combine_studies([first, second, track_csv], max_workers=1)
+
+    assert combined.crs == first.crs
+    assert isinstance(combined.individual_local_identifier.dtype, pd.CategoricalDtype)
+    assert combined.individual_local_identifier.tolist() == [*tracks.individual_local_identifier] * 2
+    expected = second.geometry.to_crs(first.crs)
+    np.testing.assert_allclose(combined.geometry.x.iloc[300 : len(tracks)], expected.x)
+    assert not np.allclose(combined.geometry.x.iloc[300 : len(tracks)], second.location_long)
+    assert (combined.geometry.x.values[len(tracks) :] == combined.location_long.values[len(tracks) :]).all()
+
+
+@pytest.mark.parametrize("boundary_shape", ["rectangular", "convex_hull"])
+def test_get_tracks_extent_matches_dissolve(boundary_shape):
+    rng = np.random.default_rng(0)
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(rng.normal(size=20_000), rng.normal(size=20_000)))
+    dissolved = points.dissolve()
+    expected = dissolved.envelope if boundary_shape == "rectangular" else dissolved.convex_hull
+
+    extent = ecodata.get_tracks_extent(points, boundary_shape=boundary_shape)
+
+    assert extent.geometry[0].equals_exact(expected.geometry[0], tolerance=0)
+
+
+def test_subset_data_with_track_points(track_csv, tmp_path):
+    tracks = ecodata.read_track_data(track_csv)
+    xmin, ymin, xmax, ymax = tracks.total_bounds
+    roads = gpd.GeoDataFrame(
+        {"road_id": np.arange(20)},
+        geometry=gpd.GeoSeries.from_wkt(
+            [f"LINESTRING ({x} {ymin - 1}, {x} {ymax + 1})" for x in np.linspace(xmin - 2, xmax + 2, 20)]
+        ),
+        crs="EPSG:4326",
+    )
+    roads.to_file(tmp_path / "roads.geojson")
+
+    result = ecodata.subset_data(tmp_path / "roads.geojson", track_points=track_csv, boundary_type="convex_hull")
+
+    assert result["boundary"].geometry[0].equals(tracks.dissolve().convex_hull.geometry[0])
+    assert 0 < len(result["subset"]) < len(roads)
+
+
+@pytest.mark.parametrize("boundary_type", ["rectangular", "convex_hull", "mask"])
+def test_subset_regions_matches_subset_data(roads_file, tmp_path, boundary_type):
+    regions = gpd.GeoDataFrame(
+        {"area": ["north", "south", "empty"]},
+        geometry=gpd.GeoSeries.from_wkt(
+            [
+                "POLYGON ((-121 55.5, -119 56.5, -118 55.5, -121 55.5))",
+                "POLYGON ((-122 53, -120 54, -121 54.5, -122 53))",
+                "POLYGON ((10 10, 11 10, 11 11, 10 10))",
+            ]
+        ),
+        crs="EPSG:4326",
+    )
+
+    subsets, boundary = ecodata.subset_regions(
+        roads_file, regions, boundary_type=boundary_type, buffer=0.1, names="area", outdir=tmp_path / "out"
+    )
+
+    assert boundary.region.tolist() == ["north", "south", "empty"]
+    assert len(subsets["empty"]) == 0
+    for i, name in enumerate(["north", "south"]):
+        regions.iloc[[i]].to_file(tmp_path / f"{name}.geojson")
+        expected = ecodata.subset_data(
+            roads_file, bounding_geom=tmp_path / f"{name}.geojson", boundary_type=boundary_type, buffer=0.1
+        )
+        assert boundary.geometry[i].equals(expected["boundary"].geometry.iloc[0])
+        assert 0 < len(subsets[name]) < 300
+        assert sorted(subsets[name].road_id) == sorted(expected["subset"].road_id)
+        assert sorted(gpd.read_file(tmp_path / "out" / name / f"{name}.shp").road_id) == sorted(subsets[name].road_id)
+
+
+@pytest.mark.parametrize("name", ["../north", "north/south", ".."])
+def test_subset_regions_rejects_paths_as_names(roads_file, tmp_path, name):
+    regions = gpd.GeoDataFrame(
+        {"area": [name]}, geometry=gpd.GeoSeries.from_wkt(["POLYGON ((-121 55, -119 55, -120 56, -121 55))"]), crs=4326
+    )
+
+    with pytest.raises(ValueError, match="file names"):
+        ecodata.subset_regions(roads_file, regions, names="area", outdir=tmp_path / "out")
+    assert not list(tmp_path.glob("**/*.shp"))
+    # The names are only used as keys if the subsets aren't written out
+    subsets, _ = ecodata.subset_regions(roads_file, regions, names="area")
+    assert list(subsets) == [name]
+
+
+def test_subset_regions_with_track_points(track_csv, roads_file):
+    subsets, boundary = ecodata.subset_regions(roads_file, [track_csv], boundary_type="convex_hull", clip=True)
+    expected = ecodata.subset_data(roads_file, track_points=track_csv, boundary_type="convex_hull", clip=True)
+
+    assert list(subsets) == ["synthetic_tracks"]
+    assert boundary.geometry[0].equals(expected["boundary"].geometry.iloc[0])
+    subset = subsets["synthetic_tracks"].sort_values("road_id", ignore_index=True)
+    assert subset.geom_equals(expected["subset"].sort_values("road_id", ignore_index=True)).all()
+
+
+def test_subset_data_from_vector_cache(roads_file, tmp_path, monkeypatch):
+    monkeypatch.setattr(ecodata.functions, "CACHE_DIR", tmp_path / "cache")
+    bbox = (-120.5, 54.5, -119.5, 55.5)
+    mask = gpd.GeoSeries.from_wkt(["POLYGON ((-121 54, -119 55, -120 56, -121 54))"], crs="EPSG:4326").to_crs(3857)
+    expected = [
+        ecodata.subset_data(roads_file, bbox=bbox)["subset"],
+        ecodata.functions._read_vector_data(roads_file, mask=mask),
+    ]
+    extent, crs = ecodata.get_extent(roads_file), ecodata.get_crs(roads_file)
+
+    monkeypatch.setattr(ecodata.functions, "VECTOR_CACHE_MIN_SIZE", 0)
+    # The metadata is read from the dataset, without converting it
+    assert ecodata.get_extent(roads_file) == extent
+    assert ecodata.get_crs(roads_file) == crs
+    assert not (tmp_path / "cache").exists()
+    cache_path = ecodata.cache_vector_data(roads_file)
+    result = [
+        ecodata.subset_data(roads_file, bbox=bbox)["subset"],
+        ecodata.functions._read_vector_data(roads_file, mask=mask),
+    ]
+
+    assert ecodata.cache_vector_data(roads_file) == cache_path
+    assert 0 < len(result[0]) < len(result[1]) < 300
+    for cached, direct in zip(result, expected):
+        assert cached.columns.tolist() == direct.columns.tolist()
+        assert cached.road_id.tolist() == direct.road_id.tolist()
+        assert cached.geom_equals(direct).all()
+
+    gpd.read_file(roads_file).iloc[:10].to_file(roads_file, driver="GeoJSON")
+    assert ecodata.cache_vector_data(roads_file) != cache_path
+    assert not cache_path.exists()
+
+
+@pytest.mark.parametrize("boundary_shape", ["rectangular", "convex_hull"])
+def test_get_tracks_extent_by_group(track_csv, boundary_shape):
+    tracks = ecodata.read_track_data(track_csv)
+    by = ["individual_local_identifier", "year"]
+
+    extents = ecodata.get_tracks_extent(tracks, boundary_shape=boundary_shape, buffer=0.1, by=by)
+    extents_chunked = ecodata.get_tracks_extent(
+        ecodata.read_track_data(track_csv, chunksize=70), boundary_shape=boundary_shape, buffer=0.1, by=by
+    )
+
+    assert len(extents) == 6
+    assert extents.columns.tolist() == [*by, "geometry"]
+    for row, row_chunked in zip(extents.itertuples(), extents_chunked.itertuples()):
+        group = tracks[
+            (tracks.individual_local_identifier == row.individual_local_identifier)
+            & (pd.to_datetime(tracks.timestamp).dt.year == row.year)
+        ]
+        expected = ecodata.get_tracks_extent(group, boundary_shape=boundary_shape, buffer=0.1)
+        assert row.geometry.equals_exact(expected.geometry[0], tolerance=0)
+        assert row_chunked.geometry.equals(row.geometry)
+
+
+@pytest.mark.parametrize("boundary_shape", ["rectangular", "convex_hull"])
+def test_get_tracks_extent_by_group_of_no_points(track_csv, boundary_shape):
+    tracks = ecodata.read_track_data(track_csv).iloc[:0]
+
+    extents = ecodata.get_tracks_extent(
+        tracks, boundary_shape=boundary_shape, buffer=0.1, by="individual_local_identifier"
+    )
+
+    assert len(extents) == 0
+    assert extents.columns.tolist() == ["individual_local_identifier", "geometry"]
+    assert extents.crs == tracks.crs
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_read_track_data_dask(track_csv, tmp_path, monkeypatch, cache):
+    pytest.importorskip("dask_geopandas")
+    monkeypatch.setattr(ecodata.functions, "CACHE_DIR", tmp_path / "cache")
+    filters = dict(start_time="2010-01-01", individuals=["animal0", "animal2"])
+    expected = ecodata.read_track_data(track_csv, cache=cache, **filters)
+
+    tracks = ecodata.read_track_data(track_csv, cache=cache, dask=True, compact=True, **filters)
+    ref = pd.DataFrame({"deployment_id": [100, 101, 102], "animal_sex": ["f", "m", "f"]})
+    merged = ecodata.merge_tracks_ref(tracks, ref)
+    clipped = ecodata.clip_tracks_timerange(merged, tracks[tracks.timestamp <= "2010-01-10"])
+    extent = ecodata.get_tracks_extent(tracks, boundary_shape="convex_hull")
+
+    assert hasattr(clipped, "npartitions")
+    result = clipped.compute()
+    assert isinstance(result, gpd.GeoDataFrame)
+    assert isinstance(result.individual_local_identifier.dtype, pd.CategoricalDtype)
+    assert sorted(result.event_id) == sorted(expected.event_id[pd.to_datetime(expected.timestamp) <= "2010-01-10"])
+    assert set(result.animal_sex) == {"f"}
+    assert extent.geometry[0].equals(ecodata.get_tracks_extent(expected, boundary_shape="convex_hull").geometry[0])
+
+
+@pytest.mark.parametrize("sort", [False, True])
+def test_clip_tracks_timerange(track_csv, sort):
+    tracks = ecodata.read_track_data(track_csv)
+    if sort:
+        tracks = ecodata.sort_tracks_by_time(tracks)
+    other = tracks[tracks.individual_local_identifier == "animal1"].iloc[20:60]
+    timestamps = pd.to_datetime(tracks.timestamp)
+    other_timestamps = pd.to_datetime(other.timestamp)
+
+    clipped = ecodata.clip_tracks_timerange(tracks, other)
+
+    expected = tracks[(timestamps >= other_timestamps.min()) & (timestamps <= other_timestamps.max())]
+    assert 0 < len(clipped) < len(tracks)
+    assert clipped.index.tolist() == expected.index.tolist()
+
+
+@pytest.mark.parametrize("sort", [False, True])
+def test_clip_tracks_windows(track_csv, sort):
+    tracks = ecodata.read_track_data(track_csv)
+    if sort:
+        tracks = ecodata.sort_tracks_by_time(tracks, by="deployment_id")
+    windows = pd.DataFrame(
+        {
+            "deployment_id": [102, 100, 999],
+            "deploy_on_timestamp": ["2010-01-05 00:00:00.000", None, "2010-01-01 00:00:00.000"],
+            "deploy_off_timestamp": ["2010-01-07 12:00:00.000", "2009-12-25 00:00:00.000", None],
+        }
+    )
+
+    clipped = ecodata.clip_tracks_windows(tracks, windows)
+
+    timestamps = pd.to_datetime(tracks.timestamp)
+    first = tracks[(tracks.deployment_id == 102) & timestamps.between("2010-01-05", "2010-01-07 12:00")]
+    second = tracks[(tracks.deployment_id == 100) & (timestamps <= "2009-12-25")]
+    assert len(first) and len(second)
+    assert clipped.index.tolist() == [*first.index, *second.index]
+
+
+def test_merge_tracks_ref(track_csv):
+    tracks = ecodata.read_track_data(track_csv).set_index("event_id")
+    ref = pd.DataFrame(
+        {
+            "deployment_id": [101, 100, 101],
+            "animal_sex": ["m", "f", "x"],
+            "study_name": ["other", "other", "other"],
+            "animal_mass": [10, 20, 30],
+        }
+    )
+
+    merged = ecodata.merge_tracks_ref(tracks, ref)
+    merged_subset = ecodata.merge_tracks_ref(tracks, ref, columns=["animal_mass"])
+
+    assert isinstance(merged, gpd.GeoDataFrame)
+    assert merged.index.equals(tracks.index)
+    assert merged.columns.tolist() == [*tracks.columns, "animal_sex", "animal_mass"]
+    assert (merged.study_name == tracks.study_name).all()
+    sex = merged.groupby("deployment_id").animal_sex.first()
+    assert sex.loc[100] == "f" and sex.loc[101] == "m" and pd.isna(sex.loc[102])
+    assert merged_subset.columns.tolist() == [*tracks.columns, "animal_mass"]
+    with pytest.raises(KeyError):
+        ecodata.merge_tracks_ref(tracks, ref, columns=["animal_life_stage"])
+
+
+def test_distance_to_features(track_csv, roads_file):
+    tracks = ecodata.read_track_data(track_csv)
+    roads = gpd.read_file(roads_file).set_index("road_id")
+
+    result = ecodata.distance_to_features(tracks, roads_file, columns=["highway"], name="road", chunksize=100)
+    limited = ecodata.distance_to_features(tracks, roads, max_distance=1000, name="road")
+
+    utm = tracks.estimate_utm_crs()
+    expected = gpd.sjoin_nearest(tracks.to_crs(utm), roads.to_crs(utm), distance_col="distance")
+    expected = expected[~expected.index.duplicated()].loc[tracks.index]
+    np.testing.assert_allclose(result.road_distance, expected["distance"])
+    assert (result.road_highway == expected.highway).all()
+    assert (limited.road_index.dropna() == expected.index_right[limited.road_index.notna()]).all()
+    assert limited.road_distance.isna().equals(expected["distance"] > 1000)
+    assert limited.road_highway.isna().equals(expected["distance"] > 1000)
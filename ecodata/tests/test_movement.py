@@ -0,0 +1,323 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import LineString, Point
+
+import ecodata
+
+
+def make_tracks(individuals, timestamps, long, lat):
+    return gpd.GeoDataFrame(
+        {
+            "individual_local_identifier": individuals,
+            "timestamp": timestamps,
+            "location_long": long,
+            "location_lat": lat,
+        },
+        geometry=gpd.points_from_xy(long, lat),
+        crs="EPSG:4326",
+    )
+
+
+def test_movement_metrics():
+    # East along the equator, then a left turn to the north; the points of the second animal are out of order
+    tracks = make_tracks(
+        ["a", "a", "b", "a", "a", "b"],
+        pd.to_datetime("2020-01-01") + pd.to_timedelta([0, 1, 2, 2, 3, 0], unit="h"),
+        [0, 1, 5, 2, 2, 5],
+        [0, 0, 1, 0, 1, 0],
+    )
+
+    metrics = ecodata.movement_metrics(tracks)
+
+    assert metrics.index.tolist() == [0, 1, 3, 4, 5, 2]
+    a = metrics[metrics.individual_local_identifier == "a"]
+    b = metrics[metrics.individual_local_identifier == "b"]
+    np.testing.assert_allclose(a.step_length, [np.nan, 111195.08, 111195.08, 111195.08], rtol=1e-6)
+    np.testing.assert_allclose(a.step_duration, [np.nan, 3600, 3600, 3600])
+    np.testing.assert_allclose(a.speed, a.step_length / 3600)
+    np.testing.assert_allclose(a.heading, [np.nan, 90, 90, 0], atol=1e-9)
+    np.testing.assert_allclose(a.turning_angle, [np.nan, np.nan, 0, -90], atol=1e-9)
+    np.testing.assert_allclose(b.step_length, [np.nan, 111195.08], rtol=1e-6)
+    np.testing.assert_allclose(b.heading, [np.nan, 0], atol=1e-9)
+    assert b.turning_angle.isna().all()
+
+
+def test_movement_metrics_in_parallel(track_csv):
+    tracks = ecodata.read_track_data(track_csv)
+
+    metrics = ecodata.movement_metrics(tracks)
+    metrics_parallel = ecodata.movement_metrics(tracks, max_workers=2)
+
+    pd.testing.assert_frame_equal(metrics, metrics_parallel)
+    assert metrics.groupby("individual_local_identifier").step_length.apply(lambda s: s.isna().sum()).eq(1).all()
+    assert (metrics.speed.dropna() > 0).all()
+
+
+def test_clean_tracks(capsys):
+    # An hourly track moving 0.01 degrees east per fix, with a bad first fix, a missing location, a duplicate
+    # timestamp, a spike, and a fast relocation after which the track carries on
+    long = np.arange(20) * 0.01
+    lat = np.zeros(20)
+    lat[0] = 3
+    lat[5] = 1
+    long[15:] += 5
+    lat[8] = np.nan
+    hours = np.arange(20.0)
+    hours[12] = 11
+    tracks = make_tracks(["a"] * 20, pd.to_datetime("2020-01-01") + pd.to_timedelta(hours, unit="h"), long, lat)
+
+    cleaned, dropped = ecodata.clean_tracks(tracks, max_speed=10, spike_speed=5, return_dropped=True)
+
+    assert "Track Cleaning Report" in capsys.readouterr().out
+    assert dropped.drop_reason.astype(str).to_dict() == {
+        0: "speed",
+        5: "spike",
+        8: "missing_location",
+        12: "duplicate",
+    }
+    assert sorted([*cleaned.index, *dropped.index]) == list(range(20))
+    speed = ecodata.movement_metrics(cleaned).speed
+    assert (speed.drop(15).dropna() < 10).all() and speed[15] > 10
+
+
+def test_clean_tracks_speed_filter_removes_only_outliers():
+    long = np.arange(10) * 0.01
+    lat = np.zeros(10)
+    lat[3] = 2
+    tracks = make_tracks(["a"] * 10, pd.to_datetime("2020-01-01") + pd.to_timedelta(np.arange(10), unit="h"), long, lat)
+
+    cleaned = ecodata.clean_tracks(tracks, max_speed=10, report=False)
+
+    assert cleaned.index.tolist() == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+
+
+def test_clean_tracks_without_filters(track_csv):
+    tracks = ecodata.read_track_data(track_csv)
+
+    cleaned = ecodata.clean_tracks(pd.concat([tracks, tracks.iloc[:10]]), report=False)
+
+    assert sorted(cleaned.index) == sorted(tracks.index)
+
+
+def test_interpolate_tracks():
+    tracks = make_tracks(
+        ["a", "a", "a", "a", "b", "b"],
+        pd.to_datetime("2020-01-01") + pd.to_timedelta([0.5, 2.5, 3, 9, 0, 1], unit="h"),
+        [0, 2, 3, 9, 10, 11],
+        [0, 0, 1, 1, 5, 5],
+    )
+
+    interpolated = ecodata.interpolate_tracks(tracks, freq="1h", max_gap="2h")
+
+    a = interpolated[interpolated.individual_local_identifier == "a"]
+    b = interpolated[interpolated.individual_local_identifier == "b"]
+    assert a.timestamp.dt.hour.tolist() == [1, 2, 3, 9]
+    np.testing.assert_allclose(a.location_long, [0.5, 1.5, 3, 9])
+    np.testing.assert_allclose(a.location_lat, [0, 0, 1, 1])
+    assert b.timestamp.dt.hour.tolist() == [0, 1]
+    np.testing.assert_allclose(b.location_long, [10, 11])
+    assert len(ecodata.interpolate_tracks(tracks, freq="1h")) == 11
+
+
+def test_interpolate_tracks_across_antimeridian():
+    times = pd.to_datetime("2020-01-01") + pd.to_timedelta([0, 4], unit="h")
+    tracks = make_tracks(["a", "a"], times, [179, -179], [0, 0])
+
+    interpolated = ecodata.interpolate_tracks(tracks, freq="1h")
+
+    np.testing.assert_allclose(interpolated.location_long, [179, 179.5, 180, -179.5, -179])
+
+
+def test_interpolate_tracks_matches_numpy(track_csv):
+    tracks = ecodata.read_track_data(track_csv)
+
+    interpolated = ecodata.interpolate_tracks(tracks, freq="45min", columns=["gps_hdop"])
+
+    for individual, group in tracks.groupby("individual_local_identifier"):
+        result = interpolated[interpolated.individual_local_identifier == individual]
+        fix_times = pd.to_datetime(group.timestamp).to_numpy().astype(float)
+        times = result.timestamp.to_numpy().astype(float)
+        assert (result.timestamp.diff().dropna() == pd.Timedelta("45min")).all()
+        np.testing.assert_allclose(result.location_long, np.interp(times, fix_times, group.location_long))
+        np.testing.assert_allclose(result.gps_hdop, np.interp(times, fix_times, group.gps_hdop))
+
+
+def test_simplify_tracks_matches_shapely(track_csv):
+    tracks = ecodata.read_track_data(track_csv)
+    detailed = ecodata.track_detail(tracks)
+
+    for tolerance in (0.001, 0.01, 0.05):
+        simplified = ecodata.simplify_tracks(detailed, tolerance=tolerance)
+        for individual, group in tracks.groupby("individual_local_identifier"):
+            line = LineString(group[["location_long", "location_lat"]].to_numpy())
+            expected = line.simplify(tolerance, preserve_topology=False)
+            result = simplified[simplified.individual_local_identifier == individual]
+            np.testing.assert_array_equal(result[["location_long", "location_lat"]].to_numpy(), expected.coords)
+
+    simplified = ecodata.simplify_tracks(tracks, max_points=50)
+    assert len(simplified) == 50
+    assert simplified.detail.min() >= detailed.detail.drop(simplified.index).max()
+
+
+def test_thin_tracks(track_csv):
+    tracks = ecodata.read_track_data(track_csv)
+
+    thinned = ecodata.thin_tracks(tracks, "1d")
+
+    days = pd.to_datetime(tracks.timestamp).dt.floor("1d")
+    assert len(thinned) == tracks.groupby(["individual_local_identifier", days]).ngroups
+    assert thinned.timestamp.dt.hour.eq(0).all()
+
+
+def test_random_steps():
+    # A correlated random walk with gamma step lengths and von Mises turning angles
+    rng = np.random.default_rng(1)
+    n = 5000
+    step_length = rng.gamma(2, 500, n)
+    heading = np.cumsum(np.degrees(rng.vonmises(0.2, 4, n)))
+    long, lat = np.zeros(n + 1), np.full(n + 1, 45.0)
+    for i in range(n):
+        long[i + 1], lat[i + 1] = ecodata.movement._destination_points(long[i], lat[i], heading[i], step_length[i])
+    tracks = make_tracks(["a"] * (n + 1), pd.date_range("2020-01-01", periods=n + 1, freq="1h"), long, lat)
+
+    distributions = ecodata.fit_step_distributions(tracks)
+    assert distributions["step_length"]["shape"] == pytest.approx(2, rel=0.1)
+    assert distributions["step_length"]["scale"] == pytest.approx(500, rel=0.1)
+    assert distributions["turning_angle"]["mean"] == pytest.approx(np.degrees(0.2), abs=2)
+    assert distributions["turning_angle"]["kappa"] == pytest.approx(4, rel=0.1)
+
+    batches = list(ecodata.random_steps(tracks, n_random=5, batch_size=2000, seed=0))
+    steps = pd.concat(batches)
+
+    assert [len(batch) for batch in batches] == [12000, 12000, 5994]
+    assert steps.groupby("step_id").case.agg(["sum", "size"]).eq([1, 6]).all(axis=None)
+    observed = steps[steps.case]
+    np.testing.assert_allclose(observed[["location_long", "location_lat"]], np.column_stack([long, lat])[2:])
+    # The end points of the random steps match their step lengths and turning angles
+    metrics = ecodata.movement_metrics(tracks)
+    random = steps[~steps.case]
+    previous_heading = metrics.heading.to_numpy()[1:-1][random.step_id]
+    np.testing.assert_allclose(
+        ecodata.movement.haversine(random.start_long, random.start_lat, random.location_long, random.location_lat),
+        random.step_length,
+        rtol=1e-6,
+    )
+    heading = ecodata.movement.bearing(random.start_long, random.start_lat, random.location_long, random.location_lat)
+    np.testing.assert_allclose((heading - previous_heading - random.turning_angle + 180) % 360 - 180, 0, atol=1e-6)
+    assert random.step_length.mean() == pytest.approx(1000, rel=0.05)
+
+
+def test_fit_step_distributions_with_equal_step_lengths():
+    # A track along the equator with steps of exactly 0.01 degrees
+    times = pd.to_datetime("2020-01-01") + pd.to_timedelta(np.arange(4), unit="h")
+    tracks = make_tracks(["a"] * 4, times, [0, 0.01, 0.02, 0.03], [0, 0, 0, 0])
+
+    with pytest.raises(ValueError, match="step lengths are equal"):
+        ecodata.fit_step_distributions(tracks)
+    with pytest.raises(ValueError, match="step lengths are equal"):
+        next(ecodata.random_steps(tracks))
+
+
+def test_detect_encounters():
+    # Two animals that meet twice, the first time across the antimeridian, and a third that passes the first meeting
+    # place a day later
+    times = pd.to_datetime("2020-01-01") + pd.to_timedelta([0, 1, 2, 6, 7, 0, 1, 2, 6, 7, 24], unit="h")
+    long = [179.999, 180, -179.99, 179, 179, -179.9995, -179.9999, 179.9, 179, 170, 180]
+    lat = [0, 0, 0, 1, 1, 0, 0, 0, 1.0005, 1, 0]
+    tracks = make_tracks(["a"] * 5 + ["b"] * 5 + ["c"], times, long, lat)
+
+    contacts = ecodata.detect_encounters(tracks, distance=200, time_window="30min", merge=False)
+    events = ecodata.detect_encounters(tracks, distance=200, time_window="2h")
+
+    assert list(zip(contacts.index_1, contacts.index_2)) == [(0, 5), (1, 6), (3, 8)]
+    first = tracks.loc[contacts.index_1, ["location_long", "location_lat"]].to_numpy().T
+    second = tracks.loc[contacts.index_2, ["location_long", "location_lat"]].to_numpy().T
+    np.testing.assert_allclose(contacts.distance, ecodata.movement.haversine(*first, *second))
+    assert events[["individual_local_identifier_1", "individual_local_identifier_2"]].eq(["a", "b"]).all(axis=None)
+    assert events.start.tolist() == [times[0], times[3]]
+    assert events.end.tolist() == [times[1], times[4]]
+    assert events.contacts.tolist() == [4, 2]
+    assert events.min_distance.iloc[1] == pytest.approx(55.6, abs=0.1)
+
+
+def test_feature_crossings():
+    times = pd.to_datetime("2020-01-01") + pd.to_timedelta([0, 1, 2, 0, 2], unit="h")
+    tracks = make_tracks(["a", "a", "a", "b", "b"], times, [-0.5, 0.5, 0.5, 0.5, -0.5], [0, 0, 1, -0.5, -0.5])
+    features = gpd.GeoDataFrame(
+        {"kind": ["fence", "road", "road"]},
+        index=["f", "r", "far"],
+        geometry=[LineString([(0, -1), (0, 1)]), LineString([(-1, 0.5), (1, 0.5)]), LineString([(5, 5), (6, 6)])],
+        crs="EPSG:4326",
+    )
+
+    crossings, counts = ecodata.feature_crossings(tracks, features.to_crs("EPSG:3857"), name="barrier")
+
+    assert crossings.individual_local_identifier.tolist() == ["a", "a", "b"]
+    assert list(zip(crossings.index_1, crossings.index_2)) == [(0, 1), (1, 2), (3, 4)]
+    assert crossings.barrier_index.tolist() == ["f", "r", "f"]
+    assert crossings.barrier_kind.tolist() == ["fence", "road", "fence"]
+    expected_times = pd.to_datetime("2020-01-01") + pd.to_timedelta([0.5, 1.5, 1], unit="h")
+    assert (crossings.timestamp - expected_times).abs().max() < pd.Timedelta("1ms")
+    np.testing.assert_allclose(crossings.location_long, [0, 0.5, 0], atol=1e-9)
+    assert counts.crossings.tolist() == [2, 1, 0]
+    assert counts.individuals.tolist() == [2, 1, 0]
+
+
+def test_home_ranges_mcp(track_csv):
+    tracks = ecodata.read_track_data(track_csv)
+
+    home_ranges = ecodata.home_ranges(tracks, method="mcp", levels=[50, 100])
+
+    utm = tracks.estimate_utm_crs()
+    hulls = tracks.to_crs(utm).dissolve("individual_local_identifier").convex_hull
+    full = home_ranges[home_ranges.level == 100].set_index("individual_local_identifier")
+    np.testing.assert_allclose(full.area_km2 * 1e6, hulls.area[full.index])
+    core = home_ranges[home_ranges.level == 50].set_index("individual_local_identifier")
+    assert (core.area_km2 < full.area_km2).all()
+    assert home_ranges.crs == "EPSG:4326"
+
+
+def test_home_ranges_kde():
+    rng = np.random.default_rng(0)
+    n = 5000
+    long = np.concatenate([rng.normal(10, 0.02, n), rng.normal(11, 0.04, n)])
+    lat = np.concatenate([rng.normal(45, 0.02, n), rng.normal(45, 0.04, n)])
+    tracks = make_tracks(np.repeat(["a", "b"], n), pd.Timestamp("2020-01-01"), long, lat)
+
+    home_ranges = ecodata.home_ranges(tracks, levels=[50, 95], max_workers=1)
+
+    # Compare with the isopleths of the bivariate normal distributions, which are a bit smaller than the smoothed KDE
+    sigma = np.array([0.02, 0.04]) * 111_200 * np.sqrt(np.cos(np.radians(45)))
+    for level in (50, 95):
+        expected = np.pi * sigma**2 * -2 * np.log(1 - level / 100) / 1e6
+        area = home_ranges[home_ranges.level == level].area_km2.to_numpy()
+        assert (area > expected).all() and (area < 1.2 * expected).all()
+    core, full = home_ranges.geometry.iloc[0], home_ranges.geometry.iloc[1]
+    assert full.contains(core)
+    assert full.contains(Point(10, 45))
+
+    parallel = ecodata.home_ranges(tracks, levels=[50, 95], max_workers=2)
+    assert parallel.geom_equals(home_ranges).all()
+
+
+def test_home_ranges_kde_with_different_scales():
+    # A wide-ranging individual doesn't coarsen the grid of an individual with a small home range
+    rng = np.random.default_rng(0)
+    n = 5000
+    long = np.concatenate([rng.normal(10, 0.001, n), rng.normal(10, 1, n)])
+    lat = np.concatenate([rng.normal(45, 0.001, n), rng.normal(45, 1, n)])
+    tracks = make_tracks(np.repeat(["a", "b"], n), pd.Timestamp("2020-01-01"), long, lat)
+
+    home_ranges = ecodata.home_ranges(tracks, levels=[95], max_workers=1)
+
+    sigma = 0.001 * 111_200 * np.sqrt(np.cos(np.radians(45)))
+    expected = np.pi * sigma**2 * -2 * np.log(1 - 0.95) / 1e6
+    area = home_ranges.area_km2.iloc[0]
+    assert expected < area < 1.2 * expected
+    # On a grid shared with the wide-ranging individual, the small home range is only resolved by a few cells
+    shared = ecodata.home_ranges(tracks, levels=[95], max_workers=1, grid="shared")
+    assert shared.area_km2.iloc[0] > 1.2 * expected
+    with pytest.raises(ValueError, match="grid must be"):
+        ecodata.home_ranges(tracks, grid="common")
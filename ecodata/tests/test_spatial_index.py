@@ -0,0 +1,61 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+import ecodata
+from ecodata.spatial_index import PointIndex
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    x = rng.normal(0, 1, 5000)
+    y = rng.normal(0, 0.5, 5000)
+    x[::100] = np.nan
+    return x, y
+
+
+def test_point_index_queries_match_brute_force(points, tmp_path):
+    x, y = points
+    index = PointIndex(x, y)
+    index.save(tmp_path / "index.npz")
+    loaded = PointIndex.load(tmp_path / "index.npz")
+
+    bbox = (-0.5, -0.2, 1.2, 0.7)
+    in_bbox = np.flatnonzero((x >= bbox[0]) & (x <= bbox[2]) & (y >= bbox[1]) & (y <= bbox[3]))
+    polygon = Point(0.3, 0.1).buffer(0.8)
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    in_polygon = valid[gpd.GeoSeries(gpd.points_from_xy(x[valid], y[valid])).intersects(polygon).to_numpy()]
+
+    for idx in (index, loaded):
+        np.testing.assert_array_equal(idx.query_bbox(bbox), in_bbox)
+        np.testing.assert_array_equal(idx.query_polygon(polygon), in_polygon)
+        assert len(idx.query_bbox((10, 10, 11, 11))) == 0
+
+
+def test_point_index_nearest(points):
+    x, y = points
+    index = PointIndex(x, y)
+    queries = np.array([[0, 0], [3, -2], [-10, 10], [0.1, 0.2], [np.nan, 0]])
+
+    positions, distances = index.nearest(queries[:, 0], queries[:, 1], k=5)
+
+    assert (positions[-1] == -1).all() and np.isinf(distances[-1]).all()
+    for (qx, qy), pos, dist in zip(queries[:-1], positions, distances):
+        brute = np.hypot(x - qx, y - qy)
+        expected = np.argsort(np.where(np.isnan(brute), np.inf, brute))[:5]
+        np.testing.assert_array_equal(pos, expected)
+        np.testing.assert_allclose(dist, brute[expected])
+
+
+def test_track_index_is_saved_with_cache(track_csv, tmp_path, monkeypatch):
+    monkeypatch.setattr(ecodata.functions, "CACHE_DIR", tmp_path / "cache")
+    index = ecodata.track_index(track_csv)
+    tracks = ecodata.read_track_data(track_csv, cache=True)
+    bbox = (-120.1, 54.9, -119.9, 55.1)
+
+    assert (ecodata.cache_track_data(track_csv) / "_point_index.npz").exists()
+    selected = tracks.iloc[ecodata.track_index(track_csv).query_bbox(bbox)]
+    assert len(selected) == len(tracks.cx[bbox[0] : bbox[2], bbox[1] : bbox[3]]) > 0
+    assert len(index) == len(tracks)
@@ -0,0 +1,241 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import ecodata
+
+
+@pytest.fixture
+def grid():
+    time = pd.date_range("2020-01-01", periods=48, freq="1h")
+    latitude = np.arange(60, 40, -0.5)
+    longitude = np.arange(0, 360, 0.5)
+    hours = np.arange(48)[:, None, None]
+    t2m = 0.1 * hours + 2 * latitude[None, :, None] + 0.01 * longitude[None, None, :]
+    return xr.Dataset(
+        {"t2m": (("time", "latitude", "longitude"), t2m)},
+        coords={"time": time, "latitude": latitude, "longitude": longitude},
+    )
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    n = 500
+    # Keep away from the seam of the longitude grid, where the test field is discontinuous
+    long = rng.uniform(1, 179, n) * rng.choice([-1, 1], n)
+    lat = rng.uniform(41, 59, n)
+    timestamp = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.uniform(0, 47, n), unit="h")
+    return gpd.GeoDataFrame(
+        {"timestamp": timestamp, "location_long": long, "location_lat": lat},
+        geometry=gpd.points_from_xy(long, lat),
+        crs="EPSG:4326",
+    )
+
+
+@pytest.mark.parametrize("storage", ["memory", "dask", "netcdf"])
+def test_annotate_tracks_linear(grid, points, storage, tmp_path):
+    if storage == "dask":
+        grid = grid.chunk({"time": 10, "latitude": 15})
+    elif storage == "netcdf":
+        grid.to_netcdf(tmp_path / "grid.nc", encoding={"t2m": {"chunksizes": (12, 20, 90)}})
+        grid = xr.open_dataset(tmp_path / "grid.nc")
+
+    annotated = ecodata.annotate_tracks(points, grid, method="bilinear", time_method="linear")
+
+    # A lazily opened variable is read in windows, without loading all of it
+    assert storage != "netcdf" or not grid.t2m.variable._in_memory
+
+    hours = (points.timestamp - pd.Timestamp("2020-01-01")) / pd.Timedelta("1h")
+    expected = 0.1 * hours + 2 * points.location_lat + 0.01 * (points.location_long % 360)
+    np.testing.assert_allclose(annotated.t2m, expected)
+
+
+def test_annotate_tracks_nearest(grid, points):
+    points.loc[0, "location_lat"] = 30
+    points.loc[1, "timestamp"] = pd.Timestamp("2021-01-01")
+
+    annotated = ecodata.annotate_tracks(points, grid.chunk({"time": 7}), "t2m")
+
+    expected = grid.t2m.sel(
+        time=xr.DataArray(points.timestamp.to_numpy()[2:]),
+        latitude=xr.DataArray(points.location_lat.to_numpy()[2:]),
+        longitude=xr.DataArray(points.location_long.to_numpy()[2:] % 360),
+        method="nearest",
+    )
+    assert annotated.t2m[:2].isna().all()
+    np.testing.assert_allclose(annotated.t2m[2:], expected)
+
+
+def test_annotate_tracks_across_longitude_seam(grid, points):
+    points = points.iloc[:2].copy()
+    points["location_long"] = [-0.25, 179.9]
+    points["geometry"] = gpd.points_from_xy(points.location_long, points.location_lat)
+
+    annotated = ecodata.annotate_tracks(points, grid.isel(time=0), method="bilinear")
+
+    at_seam = grid.t2m.isel(time=0).interp(latitude=points.location_lat.iloc[0], longitude=[359.5, 0]).mean()
+    np.testing.assert_allclose(annotated.t2m.iloc[0], at_seam)
+    assert annotated.t2m.notna().all()
+
+
+def test_annotate_steps():
+    longitude = np.arange(0.25, 20, 0.5)
+    latitude = np.arange(-9.75, 10, 0.5)
+    time = pd.date_range("2020-01-01", periods=24, freq="1h")
+    stripe = ((longitude >= 10) & (longitude < 11)).astype(float)
+    ds = xr.Dataset(
+        {
+            "stripe": (("latitude", "longitude"), np.broadcast_to(stripe, (len(latitude), len(longitude)))),
+            "hours": (("time", "latitude", "longitude"), np.broadcast_to(np.arange(24.0)[:, None, None], (24, 40, 40))),
+        },
+        coords={"time": time, "latitude": latitude, "longitude": longitude},
+    )
+    long, lat = [9.9, 11.9, 11.9, 5], [0, 0, 2, 0]
+    tracks = gpd.GeoDataFrame(
+        {
+            "individual_local_identifier": ["a", "a", "a", "b"],
+            "timestamp": time[[0, 10, 20, 0]],
+            "location_long": long,
+            "location_lat": lat,
+        },
+        geometry=gpd.points_from_xy(long, lat),
+        crs="EPSG:4326",
+    )
+
+    stripe_steps = ecodata.annotate_steps(tracks, ds, "stripe", threshold=0.5)
+    hour_steps = ecodata.annotate_steps(tracks, ds.chunk({"time": 5}), "hours", time_method="linear")
+
+    np.testing.assert_allclose(stripe_steps.stripe_step_frac_above, [np.nan, 0.5, 0, np.nan], atol=0.07)
+    np.testing.assert_allclose(stripe_steps.stripe_step_max, [np.nan, 1, 0, np.nan])
+    np.testing.assert_allclose(stripe_steps.stripe_step_min, [np.nan, 0, 0, np.nan])
+    np.testing.assert_allclose(hour_steps.hours_step_mean, [np.nan, 5, 15, np.nan])
+    np.testing.assert_allclose(hour_steps.hours_step_max, [np.nan, 10, 20, np.nan])
+
+
+def test_annotate_steps_on_single_cell_grid():
+    time = pd.date_range("2020-01-01", periods=24, freq="1h")
+    ds = xr.Dataset(
+        {"hours": (("time", "latitude", "longitude"), np.arange(24.0)[:, None, None])},
+        coords={"time": time, "latitude": [0.0], "longitude": [10.0]},
+    )
+    tracks = gpd.GeoDataFrame(
+        {"timestamp": time[[0, 10, 20]], "location_long": [10.0] * 3, "location_lat": [0.0] * 3},
+        geometry=gpd.points_from_xy([10.0] * 3, [0.0] * 3),
+        crs="EPSG:4326",
+    )
+
+    steps = ecodata.annotate_steps(tracks, ds, "hours", time_method="linear", by=None)
+
+    np.testing.assert_allclose(steps.hours_step_mean, [np.nan, 5, 15])
+
+
+def test_annotate_random_steps(grid, tmp_path):
+    n = 200
+    long = np.linspace(10, 12, n) + np.sin(np.arange(n)) * 0.05
+    lat = np.linspace(45, 47, n)
+    tracks = gpd.GeoDataFrame(
+        {
+            "individual_local_identifier": np.repeat(["a", "b"], n // 2),
+            "timestamp": np.tile(pd.date_range("2020-01-01", periods=n // 2, freq="20min"), 2),
+            "location_long": long,
+            "location_lat": lat,
+        },
+        geometry=gpd.points_from_xy(long, lat),
+        crs="EPSG:4326",
+    )
+
+    fileout = ecodata.annotate_random_steps(
+        tracks, grid.chunk({"time": 12}), tmp_path / "steps", n_random=3, batch_size=50, seed=0
+    )
+
+    assert len(list(fileout.glob("part-*.parquet"))) == 4
+    steps = pd.read_parquet(fileout)
+    assert len(steps) == 4 * 2 * (n // 2 - 2)
+    expected = ecodata.annotate_tracks(steps.drop(columns="t2m"), grid)
+    np.testing.assert_array_equal(steps.t2m, expected.t2m)
+    assert steps.t2m.notna().all()
+
+
+def test_track_occupancy(grid, points):
+    points["individual_local_identifier"] = "a"
+    points.loc[0, "location_long"] = -0.1
+
+    occupancy = ecodata.track_occupancy(points, grid)
+
+    hours = (points.timestamp - pd.Timestamp("2020-01-01")) // pd.Timedelta("1h")
+    lat_idx = np.round((60 - points.location_lat) / 0.5).astype(int)
+    lon_idx = np.round((points.location_long % 360) / 0.5).astype(int) % 720
+    expected = np.zeros(grid.t2m.shape, dtype=int)
+    np.add.at(expected, (hours, lat_idx, lon_idx), 1)
+    assert occupancy.occupancy.dims == grid.t2m.dims
+    np.testing.assert_array_equal(occupancy.occupancy, expected)
+    xr.testing.assert_equal(occupancy.latitude, grid.latitude)
+
+    # Chunked and dask input, and daily bins that can be summarized like the dataset
+    chunked = ecodata.track_occupancy((points.iloc[i : i + 100] for i in range(0, len(points), 100)), grid)
+    xr.testing.assert_equal(chunked, occupancy)
+    dask_geopandas = pytest.importorskip("dask_geopandas")
+    daily = ecodata.track_occupancy(dask_geopandas.from_geopandas(points, npartitions=5), grid, freq="1D")
+    np.testing.assert_array_equal(daily.occupancy, expected.reshape(2, 24, *expected.shape[1:]).sum(axis=1))
+    assert ecodata.coarsen_dataset(daily, {"latitude": 4, "longitude": 4}).occupancy.sum() > 0
+
+
+def test_track_occupancy_duration(grid):
+    tracks = gpd.GeoDataFrame(
+        {
+            "individual_local_identifier": ["a", "a", "a", "b", "b"],
+            "timestamp": pd.to_datetime("2020-01-01") + pd.to_timedelta([0, 0.5, 5, 1, 1.25], unit="h"),
+            "location_long": [10, 10, 11, 10, 10],
+            "location_lat": [50, 50, 50, 50, 50],
+        },
+        geometry=gpd.points_from_xy([10, 10, 11, 10, 10], [50] * 5),
+        crs="EPSG:4326",
+    )
+
+    occupancy = ecodata.track_occupancy(tracks, grid, statistic="duration", max_gap="2h").occupancy
+
+    assert occupancy.attrs["units"] == "s"
+    assert occupancy.sum() == 2700
+    assert occupancy.sel(latitude=50, longitude=10, time="2020-01-01T00").item() == 1800
+    assert occupancy.sel(latitude=50, longitude=10, time="2020-01-01T01").item() == 900
+
+
+def test_track_occupancy_duration_in_chunks(grid):
+    times = pd.to_datetime("2020-01-01") + pd.to_timedelta([0, 0.5, 1, 1.5, 1, 1.25, 2], unit="h")
+    tracks = pd.DataFrame(
+        {
+            "individual_local_identifier": ["a", "a", "a", "a", "b", "b", "b"],
+            "timestamp": times.strftime("%Y-%m-%d %H:%M:%S.000"),
+            "location_long": [10, 10, 11, 11, 10, 10, 11],
+            "location_lat": [50] * 7,
+        }
+    )
+
+    expected = ecodata.track_occupancy(tracks, grid, statistic="duration")
+    # The steps of both individuals cross the chunk boundaries
+    chunks = (tracks.iloc[i : i + 2] for i in range(0, len(tracks), 2))
+    occupancy = ecodata.track_occupancy(chunks, grid, statistic="duration")
+
+    xr.testing.assert_equal(occupancy, expected)
+    assert occupancy.occupancy.sum() == 3 * 1800 + 900 + 2700
+
+
+def test_track_occupancy_rejects_unsorted_chunks_and_calendar_freq(grid):
+    times = pd.to_datetime("2020-01-01") + pd.to_timedelta([0, 0.5, 1, 1.5], unit="h")
+    tracks = pd.DataFrame(
+        {
+            "individual_local_identifier": ["a"] * 4,
+            "timestamp": times.strftime("%Y-%m-%d %H:%M:%S.000"),
+            "location_long": [10, 10, 11, 11],
+            "location_lat": [50] * 4,
+        }
+    )
+
+    chunks = (tracks.iloc[rows] for rows in ([2, 3], [0, 1]))
+    with pytest.raises(ValueError, match="chunks must be sorted"):
+        ecodata.track_occupancy(chunks, grid, statistic="duration")
+    with pytest.raises(ValueError, match="fixed length"):
+        ecodata.track_occupancy(tracks, grid, freq="MS")
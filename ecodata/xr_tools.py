@@ -11,6 +11,25 @@ import xarray as xr
 from geocube.api.core import make_geocube
 from pyproj.crs import CRS
 
+from ecodata.functions import (
+    EARTH_RADIUS,
+    _great_circle_points,
+    _is_dask_frame,
+    _parse_timestamps,
+    _sorted_tracks,
+    _track_lonlat,
+    _track_seconds,
+    _track_times,
+    haversine,
+)
+
+# Length along each dimension of the blocks that _sample_grid reads gridded variables in, for variables without dask
+# chunks or on-disk chunk sizes
+_SAMPLE_BLOCK_SIZE = 256
+
+# Number of chunks of track points whose occupied cells are merged at a time by track_occupancy
+_OCCUPANCY_MERGE_PARTS = 16
+
 
 def detect_varnames(ds):
     matched_vars = dict(timevar=None, latvar=None, lonvar=None)
@@ -460,4 +479,665 @@ def set_time_encoding_modis(ds):
     """
     modis_encoding = {'units': 'days since 2000-01-01', 'calendar': 'julian'}
     for key in modis_encoding:
-        ds.time.encoding[key] = modis_encoding[key]
\ No newline at end of file
+        ds.time.encoding[key] = modis_encoding[key]
+
+
+def annotate_tracks(
+    tracks, ds, variables=None, method="nearest", time_method="nearest", lonvar=None, latvar=None, timevar=None
+):
+    """
+    Annotate track points with the values of gridded dataset variables at their location and time.
+
+    The points are sampled with vectorized indexing. For datasets backed by dask, the points are grouped by the time
+    chunk of the dataset that they fall in, and only the part of each chunk that covers the points is loaded, so
+    large datasets (e.g. multi-year ERA5) are never loaded as a whole.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``ecodata.read_track_data``. Must include 'timestamp' if any of the variables have a
+        time dimension.
+    ds : xarray.Dataset
+        Gridded dataset, with 1-D latitude, longitude and (optionally) time coordinates. The variables must not have
+        other dimensions.
+    variables : str or list of str, optional
+        Variables to sample, by default all variables of the dataset
+    method : str, optional
+        Spatial interpolation, either 'nearest' or 'bilinear', by default 'nearest'
+    time_method : str, optional
+        Time interpolation, either 'nearest' or 'linear', by default 'nearest'
+    lonvar : str, optional
+        Label of the longitude coordinate, by default detected from the dataset
+    latvar : str, optional
+        Label of the latitude coordinate, by default detected from the dataset
+    timevar : str, optional
+        Label of the time coordinate, by default detected from the dataset
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Track points with a column for each variable. Values are missing for points outside of the dataset (further
+        than half of a grid cell from its edge).
+    """
+    if method not in ("nearest", "bilinear"):
+        raise ValueError(f"annotate_tracks: method must be 'nearest' or 'bilinear', not {method!r}")
+    if time_method not in ("nearest", "linear"):
+        raise ValueError(f"annotate_tracks: time_method must be 'nearest' or 'linear', not {time_method!r}")
+
+    timevar, latvar, lonvar = _grid_varnames(ds, timevar, latvar, lonvar)
+    if variables is None:
+        variables = list(ds.data_vars)
+    elif isinstance(variables, str):
+        variables = [variables]
+
+    lon, lat = _track_lonlat(tracks)
+    points = {lonvar: _wrap_longitudes(lon, ds[lonvar].values), latvar: lat}
+    if timevar is not None and any(timevar in ds[var].dims for var in variables):
+        times = _track_times(tracks)
+        points[timevar] = np.where(np.isnat(times), np.nan, times.view(np.int64))
+
+    annotated = tracks.copy(deep=False)
+    for var in variables:
+        annotated[var] = _sample_grid(ds[var], points, method, time_method, timevar, lonvar)
+    return annotated
+
+
+def _grid_varnames(ds, timevar=None, latvar=None, lonvar=None):
+    """
+    Labels of the time, latitude and longitude coordinates of a dataset, detected if they aren't specified.
+    """
+    matched_vars, _, _ = detect_varnames(ds)
+    timevar = timevar or matched_vars["timevar"]
+    latvar = latvar or matched_vars["latvar"]
+    lonvar = lonvar or matched_vars["lonvar"]
+    if latvar is None or lonvar is None:
+        raise ValueError("Latitude and longitude coordinates could not be detected. Specify latvar and lonvar.")
+    return timevar, latvar, lonvar
+
+
+def _wrap_longitudes(lon, grid_lon):
+    """
+    Wrap longitudes in [-180, 180) to [0, 360) if the grid uses 0-360 longitudes.
+    """
+    if np.nanmax(grid_lon) > 180:
+        return np.mod(lon, 360)
+    return lon
+
+
+def _grid_positions(coord, values, linear, periodic=False):
+    """
+    Positions of values along a 1-D grid coordinate, as the indices of the grid points on either side of each value
+    and the weight of the second one. Values further than half of a grid step outside of the grid get index -1.
+
+    If ``periodic`` is True and the coordinate covers 360 degrees of longitude, values between the last and first
+    grid points are interpolated across the seam.
+    """
+    coord = np.asarray(coord)
+    if np.issubdtype(coord.dtype, np.datetime64):
+        coord = coord.astype("datetime64[ns]").view(np.int64)
+    coord = coord.astype(float)
+    n = len(coord)
+    descending = n > 1 and coord[0] > coord[-1]
+    if descending:
+        coord = coord[::-1]
+
+    if periodic and n > 1 and np.isclose(coord[-1] - coord[0] + (coord[-1] - coord[0]) / (n - 1), 360):
+        values = np.mod(values - coord[0], 360) + coord[0]
+        coord = np.append(coord, coord[0] + 360)
+    if len(coord) > 1:
+        half_step = (coord[-1] - coord[0]) / (len(coord) - 1) / 2
+        valid = (values >= coord[0] - half_step) & (values <= coord[-1] + half_step)
+    else:
+        # A single grid point only matches values at that point, up to rounding errors
+        valid = np.isclose(values, coord[0], rtol=1e-12, atol=1e-9)
+    upper = np.clip(np.searchsorted(coord, values), 1, max(len(coord) - 1, 1))
+    lower = upper - 1
+    if len(coord) == 1:
+        upper = lower
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = np.clip((values - coord[lower]) / (coord[upper] - coord[lower]), 0, 1)
+    weight[upper == lower] = 0
+    if not linear:
+        lower = np.where(weight > 0.5, upper, lower)
+        upper, weight = lower, np.zeros(len(values))
+
+    # Map positions on the seam back to the first grid point
+    lower, upper = lower % n, upper % n
+    if descending:
+        lower, upper = n - 1 - lower, n - 1 - upper
+    lower[~valid] = -1
+    upper[~valid] = -1
+    return lower, upper, weight
+
+
+def _sample_grid(da, points, method, time_method, timevar, lonvar):
+    """
+    Values of a data array at points given as arrays of coordinates for each of its dimensions.
+    """
+    if set(da.dims) - set(points):
+        raise ValueError(f"Variable {da.name} has dimensions that can't be matched to the track points: {da.dims}")
+
+    # Indices of the surrounding grid points and their weights, for each dimension
+    dims = list(da.dims)
+    positions = []
+    for dim in dims:
+        linear = time_method == "linear" if dim == timevar else method == "bilinear"
+        positions.append(_grid_positions(da[dim].values, points[dim], linear, periodic=dim == lonvar))
+    valid = np.all([lower >= 0 for lower, _, _ in positions], axis=0)
+    result = np.full(len(valid), np.nan)
+
+    # Group the points by the block of the array that they fall in (the dask chunks, or the on-disk chunks of a
+    # lazily loaded variable), along all dimensions, so that only one block at a time is loaded
+    if da.chunks is not None:
+        chunks = da.chunks
+    else:
+        sizes = da.encoding.get("chunksizes") or [_SAMPLE_BLOCK_SIZE] * len(dims)
+        chunks = [[size] * -(-length // size) for size, length in zip(sizes, da.shape)]
+    block_keys = [
+        np.clip(np.searchsorted(np.cumsum(dim_chunks)[:-1], lower, side="right"), 0, len(dim_chunks) - 1)
+        for dim_chunks, (lower, _, _) in zip(chunks, positions)
+    ]
+    block_ids = np.ravel_multi_index(block_keys, [len(dim_chunks) for dim_chunks in chunks])
+    block_ids = np.where(valid, block_ids, -1)
+    order = np.argsort(block_ids, kind="stable")
+    order = order[block_ids[order] >= 0]
+    splits = np.flatnonzero(np.diff(block_ids[order])) + 1
+    blocks = np.split(order, splits) if len(order) else []
+
+    for idx in blocks:
+        lowers = [lower[idx] for lower, _, _ in positions]
+        uppers = [upper[idx] for _, upper, _ in positions]
+
+        # Only load the part of the array that covers these points
+        starts = [min(lower.min(), upper.min()) for lower, upper in zip(lowers, uppers)]
+        stops = [max(lower.max(), upper.max()) + 1 for lower, upper in zip(lowers, uppers)]
+        values = da.isel({dim: slice(start, stop) for dim, start, stop in zip(dims, starts, stops)}).values
+        lowers = [lower - start for lower, start in zip(lowers, starts)]
+        uppers = [upper - start for upper, start in zip(uppers, starts)]
+
+        # Weighted sum over the corners of the grid cell around each point
+        sample = np.zeros(len(idx))
+        for corner in np.ndindex(*([2] * len(dims))):
+            corner_idx, corner_weight = [], np.ones(len(idx))
+            for dim_upper, lower, upper, (_, _, weight) in zip(corner, lowers, uppers, positions):
+                corner_idx.append(upper if dim_upper else lower)
+                corner_weight = corner_weight * (weight[idx] if dim_upper else 1 - weight[idx])
+            if not corner_weight.any():
+                continue
+            corner_values = values[tuple(corner_idx)]
+            sample += np.where(corner_weight > 0, corner_weight * corner_values, 0)
+            sample[(corner_weight > 0) & np.isnan(corner_values)] = np.nan
+        result[idx] = sample
+    return result
+
+
+def annotate_steps(
+    tracks,
+    ds,
+    variable,
+    threshold=None,
+    method="nearest",
+    time_method="nearest",
+    by="individual_local_identifier",
+    samples_per_cell=4,
+    lonvar=None,
+    latvar=None,
+    timevar=None,
+):
+    """
+    Annotate the steps of tracks with statistics of a gridded dataset variable along the path of each step.
+
+    The step of a point is the great-circle segment from the previous point of the same group (e.g. individual) to
+    the point. Each step is sampled at ``samples_per_cell`` points per grid cell length, at times interpolated
+    between the times of its two fixes. The samples of all steps are generated and sampled together, and then
+    reduced to the statistics of each step, so the statistics are weighted by the length of the step in each cell.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``ecodata.read_track_data``. Must include 'timestamp'.
+    ds : xarray.Dataset
+        Gridded dataset, e.g. subset with ``select_spatial``. Grid cells with missing values are left out of the
+        statistics.
+    variable : str
+        Variable to sample
+    threshold : float, optional
+        If specified, the fraction of each step where the variable is above this value is also computed. By default
+        None.
+    method : str, optional
+        Spatial interpolation, either 'nearest' or 'bilinear', by default 'nearest'
+    time_method : str, optional
+        Time interpolation, either 'nearest' or 'linear', by default 'nearest'
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, by default
+        "individual_local_identifier". If None, all points are treated as one track.
+    samples_per_cell : int, optional
+        Number of samples per grid cell length along each step, by default 4
+    lonvar : str, optional
+        Label of the longitude coordinate, by default detected from the dataset
+    latvar : str, optional
+        Label of the latitude coordinate, by default detected from the dataset
+    timevar : str, optional
+        Label of the time coordinate, by default detected from the dataset
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Track points sorted by group and timestamp, with columns ``<variable>_step_mean``, ``<variable>_step_min`` and
+        ``<variable>_step_max``, and ``<variable>_step_frac_above`` if ``threshold`` is specified. The statistics are
+        missing for the first point of each group, and for steps that are entirely outside of the dataset.
+    """
+    if method not in ("nearest", "bilinear"):
+        raise ValueError(f"annotate_steps: method must be 'nearest' or 'bilinear', not {method!r}")
+    if time_method not in ("nearest", "linear"):
+        raise ValueError(f"annotate_steps: time_method must be 'nearest' or 'linear', not {time_method!r}")
+    timevar, latvar, lonvar = _grid_varnames(ds, timevar, latvar, lonvar)
+    da = ds[variable]
+
+    tracks, offsets = _sorted_tracks(tracks, by)
+    lon, lat = _track_lonlat(tracks)
+    seconds = _track_seconds(tracks)
+
+    # Steps end at every point except the first point of each group
+    first = np.zeros(len(tracks), dtype=bool)
+    first[offsets] = True
+    ends = np.flatnonzero(~first)
+    located = np.isfinite(lon) & np.isfinite(lat)
+    ends = ends[located[ends] & located[ends - 1]]
+    starts = ends - 1
+
+    # Number of samples along each step, from its length in grid cells
+    # A grid with a single cell has no cell size, and the steps are sampled at their ends only
+    cell_size = min(
+        (np.abs(np.diff(ds[dim].values)).min() for dim in (latvar, lonvar) if ds[dim].size > 1), default=np.inf
+    )
+    length = np.degrees(haversine(lon[starts], lat[starts], lon[ends], lat[ends]) / EARTH_RADIUS)
+    nsamples = np.ceil(length / cell_size * samples_per_cell).astype(np.int64) + 1
+    nsamples = np.maximum(nsamples, 2)
+    sample_steps = np.repeat(np.arange(len(ends)), nsamples)
+    sample_offsets = np.cumsum(nsamples) - nsamples
+    fraction = (np.arange(nsamples.sum()) - sample_offsets[sample_steps]) / (nsamples[sample_steps] - 1)
+
+    sample_lon, sample_lat = _great_circle_points(
+        lon[starts], lat[starts], lon[ends], lat[ends], fraction, sample_steps
+    )
+    points = {lonvar: _wrap_longitudes(sample_lon, ds[lonvar].values), latvar: sample_lat}
+    if timevar in da.dims:
+        start_times, durations = seconds[starts], seconds[ends] - seconds[starts]
+        points[timevar] = (start_times[sample_steps] + fraction * durations[sample_steps]) * 1e9
+    values = _sample_grid(da, points, method, time_method, timevar, lonvar)
+
+    # Reduce the samples of each step
+    finite = np.isfinite(values)
+    count = np.add.reduceat(finite, sample_offsets) if len(ends) else np.zeros(0)
+    stats = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stats["mean"] = _reduce_steps(np.add, np.where(finite, values, 0), sample_offsets) / count
+        stats["min"] = _reduce_steps(np.minimum, np.where(finite, values, np.inf), sample_offsets)
+        stats["max"] = _reduce_steps(np.maximum, np.where(finite, values, -np.inf), sample_offsets)
+        if threshold is not None:
+            stats["frac_above"] = _reduce_steps(np.add, finite & (values > threshold), sample_offsets) / count
+
+    annotated = tracks.copy(deep=False)
+    for stat, step_values in stats.items():
+        column = np.full(len(tracks), np.nan)
+        column[ends] = np.where(count > 0, step_values, np.nan)
+        annotated[f"{variable}_step_{stat}"] = column
+    return annotated
+
+
+def _reduce_steps(ufunc, values, offsets):
+    """
+    Reduce consecutive runs of values starting at ``offsets`` with a ufunc (e.g. ``np.add``).
+    """
+    if not len(offsets):
+        return np.zeros(0)
+    return ufunc.reduceat(values, offsets).astype(float)
+
+
+def annotate_random_steps(
+    tracks,
+    ds,
+    fileout,
+    n_random=10,
+    variables=None,
+    method="nearest",
+    time_method="nearest",
+    by="individual_local_identifier",
+    distributions=None,
+    batch_size=100_000,
+    seed=None,
+    lonvar=None,
+    latvar=None,
+    timevar=None,
+):
+    """
+    Generate random available steps for a step-selection analysis, annotate them and write them to disk in batches.
+
+    The observed and random steps are generated in batches with ``ecodata.random_steps``, the end point of each step
+    is annotated with ``annotate_tracks``, and each batch is written to its own Parquet file as soon as it is
+    annotated. Only one batch is held in memory at a time, so the output can be much larger than memory. The steps are
+    written without point geometries, which are slow to create and aren't needed for fitting step-selection models.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame
+        Track points, e.g. from ``ecodata.read_track_data``. Must include 'timestamp'.
+    ds : xarray.Dataset
+        Gridded dataset, with 1-D latitude, longitude and (optionally) time coordinates
+    fileout : str or pathlib.Path
+        Output directory. The batches are written to ``part-<n>.parquet`` files in the directory, replacing any
+        existing parts. The directory can be read with ``pandas.read_parquet`` or ``dask.dataframe.read_parquet``.
+    n_random : int, optional
+        Number of random steps per observed step, by default 10
+    variables : str or list of str, optional
+        Variables to sample, by default all variables of the dataset
+    method : str, optional
+        Spatial interpolation, either 'nearest' or 'bilinear', by default 'nearest'
+    time_method : str, optional
+        Time interpolation, either 'nearest' or 'linear', by default 'nearest'
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, by default
+        "individual_local_identifier". If None, all points are treated as one track.
+    distributions : dict, optional
+        Step length and turning angle distributions, as returned by ``ecodata.fit_step_distributions``. By default
+        fitted to the tracks.
+    batch_size : int, optional
+        Number of observed steps per batch, by default 100,000
+    seed : int or numpy.random.Generator, optional
+        Seed for the random number generator, by default None
+    lonvar : str, optional
+        Label of the longitude coordinate, by default detected from the dataset
+    latvar : str, optional
+        Label of the latitude coordinate, by default detected from the dataset
+    timevar : str, optional
+        Label of the time coordinate, by default detected from the dataset
+
+    Returns
+    -------
+    pathlib.Path
+        Path of the output directory
+    """
+    from ecodata.movement import random_steps
+
+    fileout = Path(fileout)
+    fileout.mkdir(parents=True, exist_ok=True)
+    for part in fileout.glob("part-*.parquet"):
+        part.unlink()
+
+    batches = random_steps(
+        tracks,
+        n_random=n_random,
+        by=by,
+        distributions=distributions,
+        batch_size=batch_size,
+        seed=seed,
+        geometry=False,
+    )
+    for i, steps in enumerate(batches):
+        annotated = annotate_tracks(
+            steps,
+            ds,
+            variables=variables,
+            method=method,
+            time_method=time_method,
+            lonvar=lonvar,
+            latvar=latvar,
+            timevar=timevar,
+        )
+        annotated.to_parquet(fileout / f"part-{i:05d}.parquet", index=False)
+    return fileout
+
+
+def track_occupancy(
+    tracks,
+    ds,
+    statistic="count",
+    freq=None,
+    by="individual_local_identifier",
+    max_gap=None,
+    name="occupancy",
+    lonvar=None,
+    latvar=None,
+    timevar=None,
+):
+    """
+    Rasterize track points into a space-time cube of fix counts or durations on the grid of a dataset.
+
+    Each fix is binned to the grid cell that it falls in (the nearest grid point, as for ``annotate_tracks``) and to
+    its time bin. Each chunk of fixes is reduced to its occupied cells and their counts or durations, which are merged,
+    and the dense cube is only built once at the end. The result has the coordinates of the dataset, so it can be
+    combined with it, or summarized with ``groupby_multi_time`` and ``coarsen_dataset``.
+
+    Parameters
+    ----------
+    tracks : geopandas.GeoDataFrame, dask_geopandas.GeoDataFrame, or iterable of GeoDataFrames
+        Track points, e.g. from ``ecodata.read_track_data``. Must include 'timestamp'. An iterable of chunks (as
+        returned by ``read_track_data`` with ``chunksize``) is aggregated one chunk at a time. For a dask-geopandas
+        GeoDataFrame (e.g. from ``read_track_data`` with ``dask=True``), the partitions are aggregated in parallel and
+        their occupied cells are merged in a tree reduction.
+    ds : xarray.Dataset
+        Dataset with 1-D latitude, longitude and (optionally) time coordinates, defining the grid of the cube. The time
+        coordinate gives the start of each time bin, and the last bin is as long as the one before it.
+    statistic : str, optional
+        Either 'count' (the number of fixes) or 'duration' (the time from each fix to the next fix of the same
+        individual, in seconds, credited to the cell and time bin of the fix). By default 'count'.
+    freq : str or pandas.Timedelta, optional
+        Fixed length of the time bins (e.g. "1D", but not calendar frequencies like "MS" or "W"), instead of the time
+        coordinate of the dataset. The bins span the
+        time range of the dataset, or the time range of the tracks if the dataset has no time coordinate (which isn't
+        supported for iterables of chunks). By default None.
+    by : str, optional
+        Column identifying the individual (or deployment, etc.) of each point, for durations. By default
+        "individual_local_identifier". For an iterable of chunks, the last fix of each individual is carried over to
+        the next chunk, so all steps are counted. The chunks must then be sorted by individual and timestamp, as in
+        a Movebank export: no fix of an individual can be earlier than its fixes in the previous chunks, or a
+        ValueError is raised. Durations are computed within each partition of a dask-geopandas GeoDataFrame, so for
+        track data read from the cache (with a part file per individual, year and converted csv chunk), the steps
+        across the turn of each year and across the csv chunks are missed.
+    max_gap : str or pandas.Timedelta, optional
+        For durations, steps longer than this are not counted. By default None.
+    name : str, optional
+        Name of the output variable, by default "occupancy"
+    lonvar : str, optional
+        Label of the longitude coordinate, by default detected from the dataset
+    latvar : str, optional
+        Label of the latitude coordinate, by default detected from the dataset
+    timevar : str, optional
+        Label of the time coordinate, by default detected from the dataset
+
+    Returns
+    -------
+    xarray.Dataset
+        Dataset with the variable ``name``, with dimensions (time, latitude, longitude), or (latitude, longitude) if
+        there are no time bins. Fixes outside of the grid or the time bins are not counted.
+    """
+    if statistic not in ("count", "duration"):
+        raise ValueError(f"track_occupancy: statistic must be 'count' or 'duration', not {statistic!r}")
+    timevar, latvar, lonvar = _grid_varnames(ds, timevar, latvar, lonvar)
+    max_gap = pd.to_timedelta(max_gap).total_seconds() if max_gap is not None else None
+    if freq is not None and not isinstance(pd.tseries.frequencies.to_offset(freq), pd.offsets.Tick):
+        raise ValueError(f"track_occupancy: freq must be a fixed length of time (e.g. '1D' or '6h'), not {freq!r}")
+
+    # Time bin edges
+    if freq is not None:
+        if timevar in ds.dims:
+            start, end = ds[timevar].values.min(), ds[timevar].values.max()
+        elif isinstance(tracks, pd.DataFrame) or _is_dask_frame(tracks):
+            start, end = _occupancy_time_range(tracks)
+        else:
+            raise ValueError("track_occupancy: freq needs a dataset with a time coordinate for chunked tracks")
+        labels = pd.date_range(pd.Timestamp(start).floor(freq), end, freq=freq)
+        time_edges = np.append(labels.values, (labels[-1] + pd.to_timedelta(freq)).to_datetime64())
+    elif timevar in ds.dims:
+        labels = ds[timevar].values.astype("datetime64[ns]")
+        step = labels[-1] - labels[-2] if len(labels) > 1 else np.timedelta64(1, "D")
+        time_edges = np.append(labels, labels[-1] + step)
+    else:
+        labels = time_edges = None
+    grid = (ds[latvar].values, ds[lonvar].values, time_edges, statistic, by, max_gap)
+
+    # Each chunk or partition is reduced to the occupied cells only, and the dense cube is built once at the end
+    if _is_dask_frame(tracks):
+        import dask
+
+        parts = [dask.delayed(_occupancy_counts)(partition, *grid) for partition in tracks.to_delayed()]
+        # Merge the occupied cells of the partitions in pairs
+        while len(parts) > 1:
+            pairs = [dask.delayed(_merge_occupancy)([a, b]) for a, b in zip(parts[::2], parts[1::2])]
+            parts = pairs + parts[len(pairs) * 2 :]
+        cells, sums = parts[0].compute()[:2]
+    elif isinstance(tracks, pd.DataFrame):
+        cells, sums, _ = _occupancy_counts(tracks, *grid)
+    else:
+        # The last fix of each individual is carried over to the next chunk, so that the steps between chunks are
+        # counted
+        parts, last_fixes = [], None
+        for chunk in tracks:
+            cells, sums, last_fixes = _occupancy_counts(chunk, *grid, carry=last_fixes)
+            parts.append((cells, sums))
+            if len(parts) >= _OCCUPANCY_MERGE_PARTS:
+                parts = [_merge_occupancy(parts)]
+        if not parts:
+            raise ValueError("track_occupancy: no track points were given.")
+        cells, sums = _merge_occupancy(parts)
+
+    size = len(ds[latvar]) * len(ds[lonvar]) * (len(labels) if labels is not None else 1)
+    counts = np.bincount(cells, weights=sums, minlength=size)
+
+    dims = [latvar, lonvar]
+    coords = {latvar: ds[latvar], lonvar: ds[lonvar]}
+    shape = [len(ds[latvar]), len(ds[lonvar])]
+    if labels is not None:
+        dims.insert(0, timevar)
+        coords[timevar] = labels
+        shape.insert(0, len(labels))
+    if statistic == "count":
+        counts = counts.astype(np.int64)
+    attrs = {"long_name": "Number of fixes"} if statistic == "count" else {"long_name": "Time spent", "units": "s"}
+    return xr.Dataset({name: (dims, counts.reshape(shape), attrs)}, coords=coords)
+
+
+def _occupancy_counts(tracks, lat_coord, lon_coord, time_edges, statistic, by, max_gap, carry=None):
+    """
+    Occupied cells of the flattened occupancy cube of a chunk of track points, and their counts or durations, for
+    ``track_occupancy``.
+
+    For durations, ``carry`` holds the last fixes of the individuals in the previous chunk, whose steps end in this
+    chunk. The last fix of each individual in this chunk is returned, to be carried over to the next chunk.
+    """
+    weights = last_fixes = None
+    if statistic == "duration":
+        if carry is not None and len(carry):
+            tracks = tracks.assign(timestamp=_parse_timestamps(tracks["timestamp"]))
+            _check_chunk_order(tracks, carry, by)
+            tracks = pd.concat([carry, tracks])
+        if not len(tracks):
+            return np.zeros(0, dtype=np.int64), np.zeros(0), carry
+        tracks, offsets = _sorted_tracks(tracks, by if by in tracks.columns else None)
+        seconds = _track_seconds(tracks)
+        weights = np.zeros(len(tracks))
+        weights[:-1] = np.diff(seconds)
+        # The last point of each group has no next step (yet)
+        group_ends = np.append(offsets[1:] - 1, len(tracks) - 1)
+        weights[group_ends] = 0
+        weights[~np.isfinite(weights) | (weights < 0)] = 0
+        if max_gap is not None:
+            weights[weights > max_gap] = 0
+        last_fixes = tracks.iloc[group_ends]
+    elif not len(tracks):
+        return np.zeros(0, dtype=np.int64), np.zeros(0), None
+
+    lon, lat = _track_lonlat(tracks)
+    ilat = _grid_cells(lat_coord, lat)
+    ilon = _grid_cells(lon_coord, _wrap_longitudes(lon, lon_coord), periodic=True)
+    valid = (ilat >= 0) & (ilon >= 0)
+    index = ilat * len(lon_coord) + ilon
+    if time_edges is not None:
+        times = _track_times(tracks)
+        itime = _time_bins(time_edges, times)
+        valid &= ~np.isnat(times) & (itime >= 0) & (itime < len(time_edges) - 1)
+        index += itime * len(lat_coord) * len(lon_coord)
+
+    cells, inverse = np.unique(index[valid], return_inverse=True)
+    sums = np.bincount(inverse, weights=weights[valid] if weights is not None else None, minlength=len(cells))
+    return cells, sums.astype(float), last_fixes
+
+
+def _check_chunk_order(tracks, carry, by):
+    """
+    Check that no fix of a chunk of track points is earlier than the last fix of its individual in the previous
+    chunks, for the durations of ``track_occupancy``.
+    """
+    if by in tracks.columns:
+        last_times = pd.Series(_track_times(carry), index=carry[by].to_numpy())
+        previous = last_times.reindex(tracks[by].to_numpy()).to_numpy()
+    else:
+        previous = np.repeat(_track_times(carry)[-1:], len(tracks))
+    if np.any(_track_times(tracks) < previous):
+        raise ValueError("track_occupancy: chunks must be sorted by individual and timestamp")
+
+
+def _merge_occupancy(parts):
+    """
+    Merge the occupied cells and their counts or durations of several chunks of track points.
+    """
+    cells, inverse = np.unique(np.concatenate([part[0] for part in parts]), return_inverse=True)
+    sums = np.bincount(inverse, weights=np.concatenate([part[1] for part in parts]), minlength=len(cells))
+    return cells, sums
+
+
+def _grid_cells(coord, values, periodic=False):
+    """
+    Index of the nearest grid point to each value (as in ``_grid_positions``), or -1 for values outside of the grid.
+
+    Regularly spaced coordinates are binned arithmetically, which is much faster than searching the coordinates.
+    """
+    n = len(coord)
+    step = (coord[-1] - coord[0]) / (n - 1) if n > 1 else 0
+    if n < 2 or not np.allclose(np.diff(coord), step):
+        return _grid_positions(coord, values, linear=False, periodic=periodic)[0]
+
+    with np.errstate(invalid="ignore"):
+        position = (values - coord[0]) / step
+        if periodic and np.isclose(abs(step) * n, 360):
+            # Global longitudes: positions past the last grid point wrap around to the first one
+            cells = np.mod(np.ceil(np.mod(position, n) - 0.5), n)
+            valid = np.isfinite(position)
+        else:
+            cells = np.clip(np.ceil(position - 0.5), 0, n - 1)
+            valid = (position >= -0.5) & (position <= n - 0.5)
+    return np.where(valid, cells, -1).astype(np.int64)
+
+
+def _time_bins(edges, times):
+    """
+    Index of the time bin of each time, from the bin edges. Regular bins are computed arithmetically.
+    """
+    edges = edges.view(np.int64)
+    times = times.view(np.int64)
+    steps = np.diff(edges)
+    if len(steps) and np.all(steps == steps[0]):
+        return np.where(times >= edges[0], (times - edges[0]) // steps[0], -1)
+    return np.searchsorted(edges, times, side="right") - 1
+
+
+def _occupancy_time_range(tracks):
+    """
+    First and last timestamp of track points, computing the partitions of dask frames in parallel.
+    """
+    def time_range(partition):
+        times = _track_times(partition)
+        times = times[~np.isnat(times)]
+        return (times.min(), times.max()) if len(times) else None
+
+    if _is_dask_frame(tracks):
+        import dask
+
+        ranges = dask.compute(*[dask.delayed(time_range)(partition) for partition in tracks.to_delayed()])
+    else:
+        ranges = [time_range(tracks)]
+    ranges = [r for r in ranges if r is not None]
+    if not ranges:
+        raise ValueError("track_occupancy: tracks have no timestamps.")
+    return min(r[0] for r in ranges), max(r[1] for r in ranges)